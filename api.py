@@ -0,0 +1,303 @@
+# api.py
+"""
+API HTTP (JSON) para los equipos que no necesitan la interfaz: las tablets de
+interior mina y el exportador del SCADA de planta. Usa la misma lógica que las
+pantallas (preparar_parte del formulario, las consultas del Dashboard), el mismo
+pool de conexiones y los mismos usuarios (HTTP Basic contra la tabla usuarios).
+
+    POST /partes              varios partes en UNA transacción (admin / digitador)
+    GET  /kpis                totales del periodo      ?desde=&hasta=[&labor=&guardia=]
+    GET  /kpis/labores        avance, mineral y gasto por labor (mismos filtros)
+    GET  /kpis/tendencia      curvas por día / semana / mes (mismos filtros)
+    GET  /salud               sin autenticación (balanceador / monitoreo)
+
+Uso:
+    uvicorn api:app --host 0.0.0.0 --port 8502
+    CORE_DATABASE_URL=postgresql://postgres@localhost/core_pruebas uvicorn api:app   # BD de pruebas
+
+Ejemplo:
+    curl -u digitador:clave -H "Idempotency-Key: scada-20261018-0600" -d '{"partes": [
+      {"fecha": "2026-10-18", "guardia": "Día", "labor": "GA-120", "avance": 2.4,
+       "consumos": {"Dinamita 65%": 120, "Fulminante N8": 40}}]}' http://localhost:8502/partes
+"""
+import base64
+import hashlib
+import json
+import math
+import threading
+import time
+from datetime import date, datetime
+from functools import wraps
+
+from psycopg2 import Error as ErrorBD
+from psycopg2.errors import UniqueViolation
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from database import ERRORES_CONEXION, config, ejecutar_lote, estadisticas_pool, run_query
+from modules import datos_dashboard as datos
+from modules.auth import login_user
+from modules.catalogos import get_catalogo
+from modules.cola_partes import SQL_RECIBIDO
+from modules.importacion import GUARDIAS
+from modules.registro import SQL_INSERT_CONSUMO, preparar_parte
+
+CFG = config("api")
+# Partes por pedido: un POST es una transacción, no una importación masiva
+MAX_PARTES = int(CFG.get("max_partes", 500))
+# bcrypt cuesta ~0,25 s: credenciales ya verificadas se aceptan sin repetirlo por un
+# rato, pero cada pedido confirma contra usuarios que la cuenta sigue activa y con la
+# misma clave (un SELECT por id, mucho más barato que bcrypt)
+TTL_CREDENCIALES = float(CFG.get("ttl_credenciales", 60))
+MAX_CREDENCIALES = int(CFG.get("max_credenciales", 1000))
+SQL_USUARIO_VIGENTE = "SELECT rol, password_hash FROM usuarios WHERE id = %s AND estado = 1"
+ROLES_ESCRITURA = ('admin', 'digitador')
+
+
+class Respuesta(JSONResponse):
+    """JSON con fechas en ISO y NaN como null"""
+
+    def render(self, content):
+        return json.dumps(content, ensure_ascii=False, default=_a_json, separators=(",", ":")).encode()
+
+
+def _a_json(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if hasattr(valor, 'item'):  # escalares de numpy
+        return valor.item()
+    raise TypeError(f"{type(valor).__name__} no es serializable")
+
+
+def _registros(df):
+    """DataFrame -> lista de dicts (categorías como texto, NaN como None)"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def error(estado, mensaje, **extra):
+    return Respuesta({'error': mensaje, **extra}, status_code=estado)
+
+
+# --- Autenticación ---
+
+_verificadas = {}  # huella de usuario:clave -> (usuario, password_hash, vence)
+_lock_verificadas = threading.Lock()
+
+
+def _vigente(usuario_id):
+    """(rol, password_hash) si la cuenta sigue activa, si no None"""
+    res = run_query(SQL_USUARIO_VIGENTE, (usuario_id,), cache=False)
+    return (res[0]['rol'], bytes(res[0]['password_hash'])) if res else None
+
+
+def _recordar(huella, datos_usuario, password_hash):
+    ahora = time.monotonic()
+    with _lock_verificadas:
+        for clave in [k for k, (_, _, vence) in _verificadas.items() if vence <= ahora]:
+            del _verificadas[clave]
+        while len(_verificadas) >= MAX_CREDENCIALES:
+            del _verificadas[next(iter(_verificadas))]  # la más antigua
+        _verificadas[huella] = (datos_usuario, password_hash, ahora + TTL_CREDENCIALES)
+
+
+def autenticar(cabecera):
+    """Usuario de la cabecera 'Authorization: Basic ...' (None si no es válida)"""
+    if not cabecera or not cabecera.startswith("Basic "):
+        return None
+    try:
+        usuario, _, password = base64.b64decode(cabecera[6:]).decode().partition(":")
+    except ValueError:
+        return None
+    huella = hashlib.sha256(f"{usuario}\0{password}".encode()).digest()
+    with _lock_verificadas:
+        guardado = _verificadas.pop(huella, None)
+    if guardado and guardado[2] > time.monotonic():
+        datos_usuario, password_hash, vence = guardado
+        vigente = _vigente(datos_usuario['id'])
+        # Desactivado o con otra clave: queda fuera del cache y pasa por bcrypt
+        if vigente is not None and vigente[1] == password_hash:
+            datos_usuario = {**datos_usuario, 'rol': vigente[0]}
+            with _lock_verificadas:
+                _verificadas[huella] = (datos_usuario, password_hash, vence)
+            return datos_usuario
+    datos_usuario = login_user(usuario, password)
+    if datos_usuario is None:
+        return None
+    # login_user puede leer usuarios del cache de consultas: el estado se confirma en la BD
+    vigente = _vigente(datos_usuario['id'])
+    if vigente is None:
+        return None
+    _recordar(huella, datos_usuario, vigente[1])
+    return datos_usuario
+
+
+def protegido(*roles):
+    """Exige credenciales válidas (y uno de `roles`, si se indican)"""
+    def decorador(endpoint):
+        @wraps(endpoint)
+        async def envoltura(request):
+            usuario = await run_in_threadpool(autenticar, request.headers.get("authorization"))
+            if usuario is None:
+                return Respuesta({'error': "credenciales inválidas"}, status_code=401,
+                                 headers={'WWW-Authenticate': 'Basic realm="CORE"'})
+            if roles and usuario['rol'] not in roles:
+                return error(403, f"el rol {usuario['rol']} no puede usar este recurso")
+            request.state.usuario = usuario
+            return await endpoint(request)
+        return envoltura
+    return decorador
+
+
+# --- Partes ---
+
+def filas_parte(parte, catalogo, usuario_id, hoy):
+    """Un parte del JSON -> filas de consumo_diario, con las mismas reglas que el formulario"""
+    fecha = date.fromisoformat(str(parte.get('fecha', '')))
+    if fecha > hoy:
+        raise ValueError("fecha futura")
+    guardia = str(parte.get('guardia', '')).strip()
+    guardia = GUARDIAS.get(guardia.lower(), guardia)
+    if guardia not in GUARDIAS.values():
+        raise ValueError("guardia: use 'Día' o 'Noche'")
+    frente = catalogo.frente_por_codigo(str(parte.get('labor', '')).strip().upper())
+    if frente is None or frente['estado'] != 'ACTIVO':
+        raise ValueError(f"labor {parte.get('labor')!r} no existe o no está activa")
+
+    # Insumos por id o por nombre (solo activos, como en el formulario)
+    por_nombre = {i['nombre'].strip().lower(): i['id'] for i in catalogo.insumos_activos}
+    activos = {i['id'] for i in catalogo.insumos_activos}
+    consumos = {}
+    for insumo, cantidad in (parte.get('consumos') or {}).items():
+        iid = int(insumo) if str(insumo).isdigit() else por_nombre.get(str(insumo).strip().lower())
+        if iid not in activos:
+            raise ValueError(f"insumo {insumo!r} no existe o no está activo")
+        consumos[iid] = float(cantidad)
+    avance = float(parte.get('avance') or 0)
+    mineral = float(parte.get('mineral_tm') or 0)
+    # float() acepta "NaN" e "Infinity" (y el JSON también): NaN pasaría el chequeo de negativos
+    if not all(math.isfinite(v) for v in (avance, mineral, *consumos.values())):
+        raise ValueError("cantidades, avance y mineral deben ser números finitos")
+    if min([avance, mineral, *consumos.values()]) < 0:
+        raise ValueError("cantidades, avance y mineral no pueden ser negativos")
+
+    filas = preparar_parte(fecha, guardia, frente['id'], consumos, avance, mineral,
+                           catalogo.insumos_por_id, usuario_id)
+    if not filas:
+        raise ValueError("parte vacío: sin consumos, avance ni mineral")
+    return filas
+
+
+def guardar_partes(partes, usuario_id, clave=None):
+    """Valida todos los partes y los escribe juntos (todo o nada). Devuelve (estado, cuerpo)."""
+    catalogo = get_catalogo()
+    if catalogo is None:
+        return 503, {'error': "catálogo no disponible (sin conexión con la base de datos)"}
+    hoy = date.today()
+    filas, errores = [], []
+    for n, parte in enumerate(partes):
+        try:
+            filas.extend(filas_parte(parte, catalogo, usuario_id, hoy))
+        except (ValueError, TypeError, AttributeError) as e:
+            errores.append({'parte': n, 'error': str(e)})
+    if errores:
+        return 422, {'error': "partes inválidos (no se guardó ninguno)", 'errores': errores}
+
+    sentencias = [(SQL_INSERT_CONSUMO, filas)]
+    if clave:
+        # Misma tabla de idempotencia que la cola local: un reintento no duplica
+        sentencias.insert(0, (SQL_RECIBIDO, [("api:" + clave, len(filas), datetime.now().astimezone())]))
+    try:
+        ejecutar_lote(sentencias)
+    except UniqueViolation:
+        return 200, {'partes': len(partes), 'registros': 0, 'duplicado': True}
+    except ERRORES_CONEXION as e:
+        return 503, {'error': f"sin conexión con la base de datos: {e}"}
+    except ErrorBD as e:
+        return 422, {'error': f"la base de datos rechazó los partes: {e}"}
+    return 201, {'partes': len(partes), 'registros': len(filas), 'duplicado': False}
+
+
+@protegido(*ROLES_ESCRITURA)
+async def post_partes(request):
+    try:
+        cuerpo = await request.json()
+    except ValueError:
+        return error(400, "el cuerpo no es JSON válido")
+    partes = cuerpo.get('partes') if isinstance(cuerpo, dict) else cuerpo
+    if not isinstance(partes, list) or not partes:
+        return error(400, "se espera {\"partes\": [...]} con al menos un parte")
+    if len(partes) > MAX_PARTES:
+        return error(413, f"máximo {MAX_PARTES} partes por pedido")
+    estado, contenido = await run_in_threadpool(
+        guardar_partes, partes, request.state.usuario['id'], request.headers.get("idempotency-key"))
+    return Respuesta(contenido, status_code=estado)
+
+
+# --- KPIs ---
+
+def _filtros(request):
+    """(desde, hasta, labor, guardia) de la query string"""
+    q = request.query_params
+    desde = date.fromisoformat(q['desde'])
+    hasta = date.fromisoformat(q['hasta'])
+    if hasta < desde:
+        raise ValueError("hasta es anterior a desde")
+    return desde, hasta, q.get('labor', 'TODOS'), q.get('guardia', 'TODOS')
+
+
+def consulta_kpis(funcion):
+    """
+    GET con los filtros del Dashboard: valida la query string y corre la consulta en
+    un hilo. `funcion` devuelve None si la BD falló: 503, no un periodo vacío.
+    """
+    @protegido()
+    @wraps(funcion)
+    async def endpoint(request):
+        try:
+            filtros = _filtros(request)
+        except KeyError as e:
+            return error(400, f"falta el parámetro {e.args[0]} (AAAA-MM-DD)")
+        except ValueError as e:
+            return error(400, f"parámetro inválido: {e}")
+        contenido = await run_in_threadpool(funcion, *filtros)
+        if contenido is None:
+            return error(503, "sin conexión con la base de datos")
+        return Respuesta(contenido)
+    return endpoint
+
+
+@consulta_kpis
+def get_kpis(desde, hasta, labor, guardia):
+    totales = datos.kpis(desde, hasta, labor, guardia)
+    if totales is None:
+        return None
+    return {'desde': desde, 'hasta': hasta, 'labor': labor, 'guardia': guardia, **totales}
+
+
+@consulta_kpis
+def get_labores(desde, hasta, labor, guardia):
+    df = datos.resumen_por_labor(desde, hasta, labor, guardia)
+    return _registros(df) if df is not None else None
+
+
+@consulta_kpis
+def get_tendencia(desde, hasta, labor, guardia):
+    grano = datos.grano_para(desde, hasta)
+    df = datos.tendencia(desde, hasta, labor, guardia, grano)
+    return {'grano': grano, 'periodos': _registros(df)} if df is not None else None
+
+
+async def get_salud(request):
+    ok = await run_in_threadpool(run_query, "SELECT 1 AS ok", None, False)
+    return Respuesta({'bd': ok is not None, 'pool': estadisticas_pool()}, status_code=200 if ok else 503)
+
+
+app = Starlette(routes=[
+    Route("/partes", post_partes, methods=["POST"]),
+    Route("/kpis", get_kpis),
+    Route("/kpis/labores", get_labores),
+    Route("/kpis/tendencia", get_tendencia),
+    Route("/salud", get_salud),
+])
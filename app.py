@@ -8,19 +8,35 @@ st.set_page_config(
     layout="wide"
 )
 
-# Importamos los módulos
-from modules.auth import show_login_screen, check_admin_exists, show_users_manager
-from modules.dashboard import show_dashboard
-# Importamos registro para que el Admin pueda usarlo también
-from modules.registro import show_registro 
+# Solo lo necesario para el login; las pantallas se importan al elegirlas (ver PAGINAS)
+import importlib
+from modules.auth import show_login_screen
+from modules.arranque import arrancar
 
-try:
-    from modules.maestros import show_maestros
-except ImportError:
-    pass
+# Menú -> (módulo, función). Cada pantalla y sus dependencias pesadas (pandas,
+# altair, openpyxl...) se cargan la primera vez que alguien la abre en este
+# proceso: el login y los roles que nunca ven una pantalla no pagan su importación.
+PAGINAS = {
+    "📊 Dashboard": ("modules.dashboard", "show_dashboard"),
+    "📝 Registros": ("modules.registro", "show_registro"),
+    "⚙️ Parámetros": ("modules.maestros", "show_maestros"),
+    "📥 Importar": ("modules.importacion", "show_importacion"),
+    "👤 Usuarios": ("modules.auth", "show_users_manager"),
+    "⏱️ Rendimiento": ("modules.rendimiento", "show_rendimiento"),
+}
+
+def mostrar_pagina(menu):
+    modulo, funcion = PAGINAS[menu]
+    try:
+        pantalla = getattr(importlib.import_module(modulo), funcion)
+    except ImportError as e:
+        st.error(f"❌ No se pudo cargar {menu}: {e}")
+        return
+    pantalla()
 
 def main():
-    check_admin_exists()
+    # Admin inicial, versión del esquema y catálogo: una sola vez por proceso
+    estado = arrancar()
     
     if 'authenticated' not in st.session_state:
         st.session_state['authenticated'] = False
@@ -39,6 +55,9 @@ def main():
             st.title(f"Hola, {nombre_mostrar}")
             
             st.write(f"Rol: **{st.session_state.get('rol', 'N/A').upper()}**")
+            if st.session_state.get('rol') == 'admin' and estado['migraciones_pendientes']:
+                st.warning(f"⚠️ Migraciones pendientes: {', '.join(estado['migraciones_pendientes'])}. "
+                           "Ejecute `python migraciones.py aplicar`.")
             st.divider()
             
             # DEFINICIÓN DEL MENÚ SEGÚN EL ROL
@@ -46,7 +65,7 @@ def main():
             
             if rol == 'admin':
                 # EL ADMIN AHORA TIENE ACCESO A TODO
-                opciones = ["📊 Dashboard", "📝 Registros", "⚙️ Parámetros", "👤 Usuarios"]
+                opciones = ["📊 Dashboard", "📝 Registros", "⚙️ Parámetros", "📥 Importar", "👤 Usuarios", "⏱️ Rendimiento"]
             elif rol == 'digitador':
                 opciones = ["📝 Registros", "📊 Dashboard"]
             else:
@@ -60,17 +79,7 @@ def main():
                 st.rerun()
 
         # --- MOSTRAR PANTALLAS ---
-        if menu == "📊 Dashboard":
-            show_dashboard()
-            
-        elif menu == "📝 Registros":
-            show_registro()
-            
-        elif menu == "⚙️ Parámetros":
-            show_maestros()
-            
-        elif menu == "👤 Usuarios":
-            show_users_manager()
+        mostrar_pagina(menu)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,9 @@
+# benchmarks/__init__.py
+"""
+Benchmarks de CORE contra un PostgreSQL local con datos sintéticos.
+
+    python -m benchmarks correr --dsn postgresql://postgres@localhost/core_bench --filas 100000
+    python -m benchmarks comparar resultados/antes.json resultados/despues.json
+
+¡Usar siempre una base de datos dedicada! El generador vacía las tablas.
+"""
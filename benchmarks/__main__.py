@@ -0,0 +1,211 @@
+# benchmarks/__main__.py
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+from pathlib import Path
+
+CARPETA_RESULTADOS = Path(__file__).parent / "resultados"
+
+
+def medir(nombre, correr, repeticiones, memoria):
+    """Latencia (mediana/mín/máx), pico de memoria y filas por segundo de un caso"""
+    from database import limpiar_cache
+
+    tiempos = []
+    filas = 0
+    for _ in range(repeticiones):
+        limpiar_cache()
+        inicio = time.perf_counter()
+        filas = correr() or 0
+        tiempos.append(time.perf_counter() - inicio)
+
+    pico = None
+    if memoria:
+        # Corrida aparte: tracemalloc altera los tiempos
+        limpiar_cache()
+        tracemalloc.start()
+        correr()
+        pico = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+    mediana = statistics.median(tiempos)
+    resultado = {
+        "caso": nombre,
+        "repeticiones": repeticiones,
+        "latencia_s": {"mediana": mediana, "min": min(tiempos), "max": max(tiempos)},
+        "memoria_pico_mb": pico,
+        "filas": filas,
+        "filas_por_s": filas / mediana if mediana > 0 else None,
+    }
+    pico_txt = f"{pico:8.1f} MB" if pico is not None else "       - "
+    print(f"  {nombre:<22} {mediana:9.3f} s  {pico_txt}  {filas:>10,} filas")
+    return resultado
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except Exception:
+        return "desconocido"
+
+
+def correr(args):
+    from benchmarks import casos, generador
+    from modules import datos_dashboard as datos
+
+    if not generador.crear_esquema():
+        print("❌ No se pudo crear el esquema")
+        return 1
+    if not args.no_regenerar:
+        print(f"🧪 Generando {args.filas:,} filas sintéticas (semilla {args.semilla})...")
+        inicio = time.perf_counter()
+        datos_generados = generador.poblar(args.filas, args.semilla, args.labores, args.insumos)
+        datos_generados["segundos_carga"] = time.perf_counter() - inicio
+        print(f"   listo en {datos_generados['segundos_carga']:.1f} s ({datos_generados['desde']} → {datos_generados['hasta']})")
+    else:
+        datos_generados = None
+
+    hoy = date.today()
+    desde_excel = casos.rango_para_filas(args.filas_excel)
+    df_excel = datos.detalle(desde_excel, hoy)
+    agrupado_excel = datos.resumen_por_labor(desde_excel, hoy)
+
+    # Cola local en un archivo temporal: se mide la confirmación, no el envío
+    from modules.cola_partes import ColaPartes
+    carpeta_cola = tempfile.mkdtemp(prefix="core_bench_cola_")
+    cola = ColaPartes(os.path.join(carpeta_cola, "cola.sqlite"))
+
+    print("⏱️  Midiendo...")
+    r, m = args.repeticiones, not args.sin_memoria
+    resultados = [
+        medir("dashboard_agregados", casos.caso_dashboard(date.min, hoy), r, m),
+        medir("detalle_exportacion", casos.caso_detalle(desde_excel, hoy), r, m),
+        medir("excel_reportes", casos.caso_excel_reportes(df_excel, agrupado_excel), r, m),
+        medir("excel_exportacion", casos.caso_excel_exportacion(df_excel, agrupado_excel), r, m),
+        medir("registro_guardado", casos.caso_guardado(), r, m),
+        medir("registro_cola_local", casos.caso_guardado_cola(cola), r, m),
+        medir("historial", casos.caso_historial(), r, m),
+    ]
+    shutil.rmtree(carpeta_cola, ignore_errors=True)
+
+    salida = Path(args.salida) if args.salida else (
+        CARPETA_RESULTADOS / f"{datetime.now():%Y%m%d_%H%M%S}_{commit_actual()}.json"
+    )
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    salida.write_text(json.dumps({
+        "commit": commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("dsn", "comando")},
+        "datos": datos_generados,
+        "resultados": resultados,
+    }, indent=2, ensure_ascii=False))
+    print(f"💾 Resultados en {salida}")
+    return 0
+
+
+def arranque(args):
+    """Arranque en frío: import del login (estilo -X importtime), primer render y cada pantalla"""
+    from benchmarks import arranque as a
+    sys.path.insert(0, str(a.RAIZ))
+    from app import PAGINAS
+
+    r = args.repeticiones
+    print("⏱️  Midiendo el arranque (cada corrida es un intérprete nuevo)...")
+    detalle = a.importtime(top=args.top)
+    resultados = [a.medir_importacion(r), a.medir_primer_render(r, args.dsn), *a.medir_paginas(PAGINAS, r)]
+    for res in resultados:
+        extra = ", ".join(res.get("paquetes_nuevos") or res.get("pesados") or [])
+        print(f"  {res['caso']:<22} {res['latencia_s']['mediana']:9.3f} s  {extra}")
+    if resultados[1]["errores"]:
+        print(f"  ⚠️ el login mostró errores: {resultados[1]['errores'][0][:120]}")
+
+    print(f"🐢 Lo más lento al importar app.py ({detalle['segundos']:.3f} s):")
+    for m in detalle["mas_lentos"]:
+        print(f"  {m['paquete']:<30} {m['segundos']:7.3f} s")
+    if detalle["pesados"]:
+        print(f"  ⚠️ el login carga {', '.join(detalle['pesados'])}: deberían importarse con su pantalla")
+
+    salida = Path(args.salida) if args.salida else (
+        CARPETA_RESULTADOS / f"arranque_{datetime.now():%Y%m%d_%H%M%S}_{commit_actual()}.json"
+    )
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    salida.write_text(json.dumps({
+        "commit": commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "importtime": detalle,
+        "resultados": resultados,
+    }, indent=2, ensure_ascii=False))
+    print(f"💾 Resultados en {salida}")
+    return 1 if detalle["pesados"] else 0
+
+
+def comparar(args):
+    """Compara dos corridas caso por caso (latencia mediana y memoria)"""
+    base = {r["caso"]: r for r in json.loads(Path(args.base).read_text())["resultados"]}
+    nuevo = {r["caso"]: r for r in json.loads(Path(args.nuevo).read_text())["resultados"]}
+    regresiones = 0
+    print(f"{'caso':<22} {'base (s)':>10} {'nuevo (s)':>10} {'cambio':>8}")
+    for caso in [c for c in base if c in nuevo]:
+        a = base[caso]["latencia_s"]["mediana"]
+        b = nuevo[caso]["latencia_s"]["mediana"]
+        cambio = (b - a) / a * 100 if a else 0.0
+        marca = ""
+        if cambio > args.tolerancia:
+            marca = "  ⚠️ regresión"
+            regresiones += 1
+        print(f"{caso:<22} {a:10.3f} {b:10.3f} {cambio:+7.1f}%{marca}")
+    return 1 if regresiones else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks de CORE")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_run = sub.add_parser("correr", help="Genera datos sintéticos y mide los caminos críticos")
+    p_run.add_argument("--dsn", required=True, help="PostgreSQL DEDICADO para benchmarks (se vacía)")
+    p_run.add_argument("--filas", type=int, default=100_000, help="filas de costos a generar (10k a 5M)")
+    p_run.add_argument("--semilla", type=int, default=42)
+    p_run.add_argument("--labores", type=int, default=300)
+    p_run.add_argument("--insumos", type=int, default=400)
+    p_run.add_argument("--filas-excel", type=int, default=50_000, help="filas de detalle para los reportes Excel")
+    p_run.add_argument("--repeticiones", type=int, default=3)
+    p_run.add_argument("--sin-memoria", action="store_true", help="no medir el pico de memoria")
+    p_run.add_argument("--no-regenerar", action="store_true", help="reusar los datos ya cargados")
+    p_run.add_argument("--salida", help="archivo JSON de resultados")
+
+    p_arr = sub.add_parser("arranque", help="Mide el arranque en frío: imports del login y de cada pantalla")
+    p_arr.add_argument("--dsn", help="PostgreSQL para el primer render del login (por defecto, el de secrets.toml)")
+    p_arr.add_argument("--repeticiones", type=int, default=3)
+    p_arr.add_argument("--top", type=int, default=15, help="módulos más lentos a listar")
+    p_arr.add_argument("--salida", help="archivo JSON de resultados")
+
+    p_cmp = sub.add_parser("comparar", help="Compara dos archivos de resultados")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("nuevo")
+    p_cmp.add_argument("--tolerancia", type=float, default=10.0, help="%% de aumento tolerado")
+
+    args = parser.parse_args(argv)
+    if args.comando == "correr":
+        # Antes de importar database: el pool se crea con esta URL
+        os.environ["CORE_DATABASE_URL"] = args.dsn
+        os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+        return correr(args)
+    if args.comando == "arranque":
+        return arranque(args)
+    return comparar(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
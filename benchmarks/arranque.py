@@ -0,0 +1,107 @@
+# benchmarks/arranque.py
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# Arranque en frío: cada medición es un intérprete nuevo (nada en sys.modules),
+# como el primer usuario después de reiniciar el servidor.
+
+RAIZ = Path(__file__).resolve().parent.parent
+# Paquetes que no deberían cargarse solo para mostrar el login
+PESADOS = ("pandas", "numpy", "altair", "openpyxl", "pyarrow", "yfinance")
+
+_RE_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+SCRIPT_PAGINA = """
+import importlib, json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+antes = {m.split('.')[0] for m in sys.modules}
+importlib.import_module(sys.argv[1])
+t2 = time.perf_counter()
+# Solo paquetes instalados (sin la biblioteca estándar ni extensiones internas)
+nuevos = {m.split('.')[0] for m in sys.modules} - antes - set(sys.stdlib_module_names)
+print(json.dumps({"app": t1 - t0, "pagina": t2 - t1,
+                  "nuevos": sorted(n for n in nuevos if not n.startswith(('_', 'cython')))}))
+"""
+
+SCRIPT_RENDER = """
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=120).run()
+print(json.dumps({"render": time.perf_counter() - t0,
+                  "errores": [str(e.value) for e in at.exception],
+                  "pesados": sorted(p for p in %r if p in sys.modules)}))
+""" % (PESADOS,)
+
+
+def _python(args, env=None):
+    entorno = {**os.environ, "STREAMLIT_LOGGER_LEVEL": "error", **(env or {})}
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, cwd=RAIZ, env=entorno, check=True)
+
+
+def importtime(modulo="app", top=15):
+    """
+    `python -X importtime -c "import app"` resumido: segundos totales, los
+    paquetes que más tiempo propio suman y qué PESADOS entraron.
+    """
+    salida = _python(["-X", "importtime", "-c", f"import {modulo}"]).stderr
+    total = 0
+    por_paquete = {}
+    for linea in salida.splitlines():
+        m = _RE_IMPORTTIME.match(linea)
+        if not m:
+            continue
+        propio, acumulado, sangria, nombre = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        if nombre == modulo and len(sangria) == 1:
+            total = acumulado
+        paquete = nombre.split(".")[0]
+        por_paquete[paquete] = por_paquete.get(paquete, 0) + propio
+    mas_lentos = sorted(por_paquete.items(), key=lambda x: x[1], reverse=True)[:top]
+    return {
+        "segundos": total / 1e6,
+        "mas_lentos": [{"paquete": n, "segundos": us / 1e6} for n, us in mas_lentos],
+        "pesados": sorted(p for p in PESADOS if p in por_paquete),
+    }
+
+
+def _resumen(nombre, tiempos, **extra):
+    mediana = statistics.median(tiempos)
+    return {
+        "caso": nombre,
+        "repeticiones": len(tiempos),
+        "latencia_s": {"mediana": mediana, "min": min(tiempos), "max": max(tiempos)},
+        **extra,
+    }
+
+
+def medir_importacion(repeticiones):
+    """Importar app.py (lo que se carga antes del login)"""
+    tiempos = [importtime()["segundos"] for _ in range(repeticiones)]
+    return _resumen("import_login", tiempos)
+
+
+def medir_paginas(paginas, repeticiones):
+    """Costo extra de la primera visita a cada pantalla (y qué paquetes trae)"""
+    resultados = []
+    for menu, (modulo, _) in paginas.items():
+        corridas = [json.loads(_python(["-c", SCRIPT_PAGINA, modulo]).stdout.strip().splitlines()[-1])
+                    for _ in range(repeticiones)]
+        resultados.append(_resumen(f"import_{modulo.rsplit('.', 1)[-1]}", [c["pagina"] for c in corridas],
+                                   menu=menu, paquetes_nuevos=corridas[0]["nuevos"]))
+    return resultados
+
+
+def medir_primer_render(repeticiones, dsn=None):
+    """Intérprete nuevo -> login dibujado (AppTest corre app.py completo, con arrancar())"""
+    env = {"CORE_DATABASE_URL": dsn} if dsn else None
+    corridas = [json.loads(_python(["-c", SCRIPT_RENDER], env).stdout.strip().splitlines()[-1])
+                for _ in range(repeticiones)]
+    return _resumen("primer_render_login", [c["render"] for c in corridas],
+                    pesados=corridas[0]["pesados"], errores=corridas[0]["errores"])
@@ -0,0 +1,98 @@
+# benchmarks/casos.py
+from datetime import date
+
+import exportacion
+from database import run_query
+from modules import datos_dashboard as datos
+from modules.registro import consultar_historial, preparar_parte, guardar_parte
+from modules.reportes import generar_excel_corporativo
+
+# Cada caso es una función sin argumentos que devuelve cuántas filas procesó.
+
+
+def rango_para_filas(filas):
+    """Fecha desde la cual (hacia hoy) hay al menos `filas` registros en costos"""
+    res = run_query("""
+        SELECT fecha FROM (
+            SELECT fecha, SUM(SUM(registros)) OVER (ORDER BY fecha DESC) AS acumulado
+            FROM costos_diarios GROUP BY fecha
+        ) t
+        WHERE acumulado >= %s
+        ORDER BY fecha DESC LIMIT 1
+    """, (filas,), cache=False)
+    return res[0]['fecha'] if res else date.min
+
+
+def caso_dashboard(fi, ff):
+    def correr():
+        datos.opciones_filtros(fi, ff)
+        totales = datos.kpis(fi, ff)
+        datos.gasto_por_categoria(fi, ff)
+        datos.resumen_por_labor(fi, ff)
+        return totales['registros']
+    return correr
+
+
+def caso_detalle(fi, ff):
+    def correr():
+        return len(datos.detalle(fi, ff))
+    return correr
+
+
+def caso_excel_reportes(df, df_agrupado):
+    def correr():
+        generar_excel_corporativo(df, df_agrupado, "bench", "admin")
+        return len(df)
+    return correr
+
+
+def caso_excel_exportacion(df, df_agrupado):
+    # exportacion.py espera los nombres de columna antiguos
+    df_det = df.rename(columns={'detalle': 'insumo', 'precio_total': 'costo_pen'})
+    df_res = df_agrupado.rename(columns={'mineral_tm': 'tm', 'precio_total': 'costo_pen'})
+
+    def correr():
+        exportacion.generar_excel_corporativo(df_det, df_res, "bench", "admin")
+        return len(df_det)
+    return correr
+
+
+def caso_guardado(insumos_por_parte=30):
+    """Guarda un parte diario completo (una línea por insumo) con el camino de registro"""
+    frente = run_query("SELECT id FROM frentes ORDER BY id LIMIT 1", cache=False)[0]
+    insumos = run_query("SELECT * FROM insumos ORDER BY id LIMIT %s", (insumos_por_parte,), cache=False)
+    insumos_map = {i['id']: i for i in insumos}
+    consumos = {i['id']: 5.0 for i in insumos}
+
+    def correr():
+        filas = preparar_parte(date.today(), "Día", frente['id'], consumos, 2.4, 30.0, insumos_map, None)
+        return guardar_parte(filas)
+    return correr
+
+
+def caso_guardado_cola(cola, insumos_por_parte=30):
+    """El mismo parte, pero confirmado por la cola local (lo que espera el digitador)"""
+    frente = run_query("SELECT id FROM frentes ORDER BY id LIMIT 1", cache=False)[0]
+    insumos = run_query("SELECT * FROM insumos ORDER BY id LIMIT %s", (insumos_por_parte,), cache=False)
+    insumos_map = {i['id']: i for i in insumos}
+    consumos = {i['id']: 5.0 for i in insumos}
+
+    def correr():
+        filas = preparar_parte(date.today(), "Día", frente['id'], consumos, 2.4, 30.0, insumos_map, None)
+        cola.encolar(filas)
+        return len(filas)
+    return correr
+
+
+def caso_historial(paginas=5):
+    """Primeras `paginas` páginas del historial (paginación por keyset)"""
+    def correr():
+        total, cursor = 0, None
+        for _ in range(paginas):
+            filas, hay_mas = consultar_historial(antes_de=cursor, cache=False)
+            total += len(filas)
+            if not hay_mas:
+                break
+            cursor = filas[-1]['id']
+        return total
+    return correr
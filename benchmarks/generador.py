@@ -0,0 +1,143 @@
+# benchmarks/generador.py
+import io
+import math
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import migraciones
+from database import get_db_connection
+
+# Categorías con (unidad, precio mínimo, precio máximo) en soles
+CATEGORIAS = {
+    "Explosivos": ("kg", 8, 25),
+    "Accesorios": ("und", 1, 8),
+    "Madera": ("und", 20, 60),
+    "Aceros": ("und", 50, 400),
+    "Otros": ("und", 5, 50),
+}
+TIPOS_LABOR = ["Tajeo", "Subnivel", "Galería", "Chimenea", "Rampa", "Crucero"]
+INSUMOS_POR_PARTE = 8       # promedio de materiales por parte diario
+PARTES_POR_LABOR_DIA = 1.2  # en promedio no todas las labores reportan ambas guardias
+TAM_COPY = 250_000          # filas por COPY
+
+
+def crear_esquema():
+    """Lleva la base al esquema actual de la app (migraciones.py)"""
+    return migraciones.aplicar() is not None
+
+
+def generar_maestros(rng, n_labores, n_insumos, n_usuarios=12):
+    """Labores, insumos y digitadores sintéticos (ids 1..n en el orden de las filas)"""
+    tipos = rng.choice(TIPOS_LABOR, n_labores)
+    niveles = rng.integers(1, 12, n_labores)
+    frentes = pd.DataFrame({
+        "codigo": [f"{t[:2].upper()}-{n:02d}{i:03d}" for i, (t, n) in enumerate(zip(tipos, niveles))],
+        "tipo": tipos,
+        "zona": [f"NV-{n:02d}" for n in niveles],
+        "estado": "ACTIVO",
+    })
+
+    cats = rng.choice(list(CATEGORIAS), n_insumos, p=[0.3, 0.3, 0.15, 0.15, 0.1])
+    insumos = pd.DataFrame({
+        "nombre": [f"{c} {i:04d}" for i, c in enumerate(cats)],
+        "unidad": [CATEGORIAS[c][0] for c in cats],
+        "precio": [round(rng.uniform(*CATEGORIAS[c][1:]), 2) for c in cats],
+        "categoria": cats,
+        "activo": 1,
+    })
+
+    usuarios = pd.DataFrame({
+        "username": [f"digitador{i:02d}" for i in range(n_usuarios)],
+        "nombre_completo": [f"Digitador {i:02d}" for i in range(n_usuarios)],
+        "password_hash": "\\x00",
+        "rol": "digitador",
+    })
+    return frentes, insumos, usuarios
+
+
+def generar_partes(rng, filas, frentes, insumos, usuarios, hasta=None):
+    """
+    Genera ~`filas` líneas de consumo repartidas en partes diarios (fecha, guardia, labor)
+    hacia atrás desde `hasta`. Devuelve el DataFrame de consumo_diario (costos es una vista).
+    """
+    hasta = hasta or date.today()
+    n_partes = max(1, math.ceil(filas / INSUMOS_POR_PARTE))
+    partes_por_dia = max(1, int(len(frentes) * PARTES_POR_LABOR_DIA))
+    n_dias = max(1, math.ceil(n_partes / partes_por_dia))
+
+    # Cabecera de cada parte
+    dias_atras = rng.integers(0, n_dias, n_partes)
+    fechas_parte = pd.to_datetime(hasta) - pd.to_timedelta(dias_atras, unit="D")
+    guardias_parte = rng.choice(["Día", "Noche"], n_partes)
+    frente_parte = rng.integers(0, len(frentes), n_partes)
+    usuario_parte = rng.integers(0, len(usuarios), n_partes)
+    avance_parte = np.round(rng.uniform(0.5, 3.8, n_partes), 1)
+    tm_parte = np.round(rng.gamma(2.0, 15.0, n_partes), 0)
+
+    # Líneas: cada parte tiene entre 1 y ~2x INSUMOS_POR_PARTE materiales
+    por_parte = rng.poisson(INSUMOS_POR_PARTE - 1, n_partes) + 1
+    parte = np.repeat(np.arange(n_partes), por_parte)[:filas]
+    primera = np.r_[True, parte[1:] != parte[:-1]]
+    insumo = rng.integers(0, len(insumos), len(parte))
+    cantidad = np.round(rng.gamma(2.0, 6.0, len(parte)), 1)
+    precio = insumos["precio"].to_numpy()[insumo]
+
+    fechas = fechas_parte[parte].date
+    guardias = guardias_parte[parte]
+    avance = np.where(primera, avance_parte[parte], 0)
+    tm = np.where(primera, tm_parte[parte], 0)
+
+    consumo = pd.DataFrame({
+        "fecha": fechas,
+        "guardia": guardias,
+        "frente_id": frente_parte[parte] + 1,
+        "insumo_id": insumo + 1,
+        "cantidad": cantidad,
+        "avance_metros": avance,
+        "tonelaje": tm,
+        "usuario_id": usuario_parte[parte] + 1,
+        "precio_unitario": precio,
+    })
+    return consumo
+
+
+def copiar(cur, tabla, df):
+    """Carga un DataFrame con COPY ... FROM STDIN por bloques"""
+    columnas = ", ".join(df.columns)
+    for inicio in range(0, len(df), TAM_COPY):
+        buffer = io.StringIO()
+        df.iloc[inicio:inicio + TAM_COPY].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cur.copy_expert(f"COPY {tabla} ({columnas}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def poblar(filas, semilla=42, n_labores=300, n_insumos=400):
+    """
+    Vacía la base de benchmark y la llena con datos sintéticos reproducibles.
+    Devuelve un resumen con el rango de fechas generado.
+    """
+    rng = np.random.default_rng(semilla)
+    frentes, insumos, usuarios = generar_maestros(rng, n_labores, n_insumos)
+    consumo = generar_partes(rng, filas, frentes, insumos, usuarios)
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                TRUNCATE consumo_diario, costos_diarios, frentes, insumos, usuarios
+                RESTART IDENTITY CASCADE
+            """)
+            copiar(cur, "frentes", frentes)
+            copiar(cur, "insumos", insumos)
+            copiar(cur, "usuarios", usuarios)
+            copiar(cur, "consumo_diario", consumo)
+            cur.execute("ANALYZE")
+
+    return {
+        "filas": len(consumo),
+        "labores": n_labores,
+        "insumos": n_insumos,
+        "desde": min(consumo["fecha"]).isoformat(),
+        "hasta": max(consumo["fecha"]).isoformat(),
+    }
@@ -0,0 +1,182 @@
+# cierre.py
+"""
+Reportes del cierre de mes, sin abrir el Dashboard.
+
+Lee UNA vez el detalle del periodo (con la zona de cada labor) y genera un Excel
+corporativo por cada labor, por cada zona y/o uno de toda la unidad, repartiendo
+los libros entre varios procesos: openpyxl usa un núcleo por libro, así que el
+cierre escala con los núcleos del servidor. En la carpeta de salida queda además
+un manifiesto.json con lo generado (filas, gasto, tamaño y sha256 de cada archivo).
+
+Uso:
+    python cierre.py --mes 2026-09 --por labor zona unidad [--salida cierre_2026-09] [--procesos 8]
+    python cierre.py --desde 2026-09-01 --hasta 2026-09-15 --por unidad
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from modules.reportes import generar_excel_corporativo
+
+# Lo que corre en los procesos hijos (generar_libro) solo necesita pandas y
+# openpyxl: la conexión a la BD se importa dentro de leer_periodo, en el padre.
+
+AGRUPACIONES = ('labor', 'zona', 'unidad')
+
+SQL_PERIODO = """
+    SELECT c.fecha, c.guardia, c.labor, COALESCE(f.zona, 'SIN ZONA') AS zona,
+           c.categoria, c.detalle, c.unidad,
+           COALESCE(c.cantidad, 0) AS cantidad, COALESCE(c.precio_total, 0) AS precio_total,
+           COALESCE(c.avance, 0) AS avance, COALESCE(c.mineral_tm, 0) AS mineral_tm
+    FROM costos c
+    LEFT JOIN frentes f ON f.codigo = c.labor
+    WHERE c.fecha BETWEEN %s AND %s
+    ORDER BY c.fecha, c.labor
+"""
+
+
+def leer_periodo(desde, hasta):
+    """Detalle del periodo como DataFrame (None si la consulta falló)"""
+    from database import query_df
+    from modules.datos_dashboard import CATEGORICAS
+    return query_df(SQL_PERIODO, (desde, hasta), tipos={**CATEGORICAS, 'zona': 'category'}, cache=False)
+
+
+def resumen(df):
+    """Lo mismo que datos_dashboard.resumen_por_labor, a partir del detalle ya leído"""
+    return (df.groupby('labor', observed=True)[['avance', 'mineral_tm', 'precio_total']]
+            .sum().reset_index().sort_values('labor'))
+
+
+def _nombre_archivo(por, valor, desde, hasta):
+    limpio = re.sub(r"[^\w.-]+", "_", str(valor)).strip("_") or "sin_nombre"
+    return f"Cierre_{por}_{limpio}_{desde:%Y%m%d}_{hasta:%Y%m%d}.xlsx"
+
+
+def tareas(df, agrupaciones, desde, hasta):
+    """(por, valor, archivo, detalle) de cada libro, los más grandes primero"""
+    lista = []
+    for por in agrupaciones:
+        if por == 'unidad':
+            lista.append((por, 'UNIDAD', _nombre_archivo(por, 'UNIDAD', desde, hasta), df))
+            continue
+        for valor, grupo in df.groupby(por, observed=True):
+            lista.append((por, valor, _nombre_archivo(por, valor, desde, hasta), grupo))
+    # Los libros grandes primero: ningún proceso se queda con el más pesado al final
+    return sorted(lista, key=lambda t: len(t[3]), reverse=True)
+
+
+def generar_libro(ruta, detalle, usuario, rol):
+    """Corre en un proceso hijo: arma el Excel y lo escribe directo al disco"""
+    t0 = time.perf_counter()
+    contenido = generar_excel_corporativo(detalle, resumen(detalle), usuario, rol)
+    with open(ruta, "wb") as archivo:
+        archivo.write(contenido)
+    return {
+        'bytes': len(contenido),
+        'sha256': hashlib.sha256(contenido).hexdigest(),
+        'segundos': round(time.perf_counter() - t0, 2),
+    }
+
+
+def generar_cierre(desde, hasta, agrupaciones, salida, procesos=None, usuario="Cierre", rol="Admin", avance=print):
+    """Genera los libros y el manifiesto. Devuelve el manifiesto (dict) o None si falló la lectura."""
+    t0 = time.perf_counter()
+    df = leer_periodo(desde, hasta)
+    if df is None:
+        return None
+    avance(f"📥 {len(df):,} registros leídos en {time.perf_counter() - t0:.1f} s")
+
+    os.makedirs(salida, exist_ok=True)
+    pendientes = tareas(df, agrupaciones, desde, hasta)
+    procesos = procesos or os.cpu_count() or 1
+    archivos, errores = [], []
+    # spawn: los hijos no heredan conexiones ni hilos del padre
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(procesos, max(len(pendientes), 1)), mp_context=contexto) as pool:
+        futuros = {
+            pool.submit(generar_libro, os.path.join(salida, archivo), detalle, usuario, rol):
+                (por, valor, archivo, detalle)
+            for por, valor, archivo, detalle in pendientes
+        }
+        for n, futuro in enumerate(as_completed(futuros), start=1):
+            por, valor, archivo, detalle = futuros[futuro]
+            try:
+                info = futuro.result()
+            except Exception as e:
+                errores.append({'por': por, 'valor': str(valor), 'archivo': archivo, 'error': str(e)})
+                avance(f"❌ [{n}/{len(futuros)}] {archivo}: {e}")
+                continue
+            archivos.append({
+                'por': por, 'valor': str(valor), 'archivo': archivo, 'filas': len(detalle),
+                'gasto': round(float(detalle['precio_total'].sum()), 2), **info,
+            })
+            avance(f"   [{n}/{len(futuros)}] {archivo} ({len(detalle):,} filas, {info['segundos']:.1f} s)")
+
+    manifiesto = {
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'agrupaciones': list(agrupaciones),
+        'generado_en': datetime.now().astimezone().isoformat(timespec="seconds"),
+        'registros': len(df),
+        'gasto_total': round(float(df['precio_total'].sum()), 2),
+        'procesos': procesos,
+        'segundos': round(time.perf_counter() - t0, 1),
+        'archivos': sorted(archivos, key=lambda a: (AGRUPACIONES.index(a['por']), a['valor'])),
+        'errores': errores,
+    }
+    with open(os.path.join(salida, "manifiesto.json"), "w", encoding="utf-8") as archivo:
+        json.dump(manifiesto, archivo, ensure_ascii=False, indent=2)
+    return manifiesto
+
+
+def _mes(texto):
+    inicio = datetime.strptime(texto, "%Y-%m").date()
+    siguiente = (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return inicio, siguiente - timedelta(days=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reportes Excel del cierre de mes (por labor, zona y unidad)")
+    periodo = parser.add_mutually_exclusive_group(required=True)
+    periodo.add_argument("--mes", type=_mes, help="Mes completo (AAAA-MM)")
+    periodo.add_argument("--desde", type=date.fromisoformat, help="Inicio del periodo (AAAA-MM-DD, con --hasta)")
+    parser.add_argument("--hasta", type=date.fromisoformat)
+    parser.add_argument("--por", nargs="+", choices=AGRUPACIONES, default=list(AGRUPACIONES))
+    parser.add_argument("--salida", help="Carpeta de salida (por defecto cierre_<desde>_<hasta>)")
+    parser.add_argument("--procesos", type=int, help="Procesos en paralelo (por defecto, uno por núcleo)")
+    parser.add_argument("--usuario", default="Cierre", help="Nombre que figura como emisor en los libros")
+    args = parser.parse_args(argv)
+
+    if args.mes:
+        desde, hasta = args.mes
+    elif args.hasta is None:
+        parser.error("--desde requiere --hasta")
+    else:
+        desde, hasta = args.desde, args.hasta
+    salida = args.salida or f"cierre_{desde:%Y%m%d}_{hasta:%Y%m%d}"
+
+    manifiesto = generar_cierre(desde, hasta, args.por, salida, args.procesos, usuario=args.usuario)
+    if manifiesto is None:
+        print("❌ No se pudo leer el periodo (ver error arriba)")
+        return 1
+    if not manifiesto['registros']:
+        print("📭 No hay registros en el periodo")
+        return 1
+    print(f"✅ {len(manifiesto['archivos'])} libros en {salida}/ ({manifiesto['segundos']:.1f} s, "
+          f"{manifiesto['procesos']} procesos) — ver manifiesto.json")
+    if manifiesto['errores']:
+        print(f"⚠️ {len(manifiesto['errores'])} libros fallaron (detalle en el manifiesto)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
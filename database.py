@@ -1,35 +1,529 @@
 # database.py
-import streamlit as st
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+
 import psycopg2
+from psycopg2 import extensions
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError
+
+from metricas import registrar_consulta
+
+# Errores que indican que la conexión quedó inservible (red caída, servidor reiniciado...)
+ERRORES_CONEXION = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones a PostgreSQL compartido por todo el proceso.
+    Reutiliza hasta `maxconn` conexiones; si están todas ocupadas espera
+    (hasta `timeout` segundos) en lugar de fallar. Cada conexión se valida al
+    prestarla y las rotas se reemplazan por una nueva.
+    """
+
+    def __init__(self, minconn, maxconn, timeout=30, ping_inactiva=60, **dsn):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_inactiva = ping_inactiva
+        self._dsn = dsn
+        self._libres = []  # [(conexion, instante del último uso)], se usa como pila (LIFO)
+        self._cupos = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._en_uso = 0
+        self._prestamos = 0
+        self._esperas = 0
+        self._conexiones = 0
+        self._reemplazos = 0
+        for _ in range(minconn):
+            self._libres.append((self._conectar(), time.monotonic()))
+
+    def _conectar(self):
+        conn = psycopg2.connect(**self._dsn)
+        # Autocommit: una sentencia suelta no paga un COMMIT extra; las
+        # transacciones explícitas lo desactivan mientras duran.
+        conn.autocommit = True
+        with self._lock:
+            self._conexiones += 1
+        return conn
+
+    def _esta_sana(self, conn, ultimo_uso):
+        """Chequeo al prestar: sin round-trip salvo que la conexión lleve tiempo ociosa."""
+        if conn.closed or conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - ultimo_uso > self.ping_inactiva:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+            except ERRORES_CONEXION:
+                return False
+        return True
+
+    def prestar(self):
+        if not self._cupos.acquire(blocking=False):
+            with self._lock:
+                self._esperas += 1
+            if not self._cupos.acquire(timeout=self.timeout):
+                raise PoolError(f"Pool agotado: {self.maxconn} conexiones ocupadas por más de {self.timeout}s")
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    libre = self._libres.pop() if self._libres else None
+                if libre is None:
+                    conn = self._conectar()
+                elif self._esta_sana(*libre):
+                    conn = libre[0]
+                else:
+                    libre[0].close()
+                    with self._lock:
+                        self._reemplazos += 1
+        except Exception:
+            self._cupos.release()
+            raise
+        with self._lock:
+            self._en_uso += 1
+            self._prestamos += 1
+        return conn
+
+    def devolver(self, conn, descartar=False):
+        try:
+            if not descartar and not conn.closed:
+                try:
+                    if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    conn.autocommit = True
+                except ERRORES_CONEXION:
+                    descartar = True
+            if descartar or conn.closed:
+                conn.close()
+            else:
+                with self._lock:
+                    self._libres.append((conn, time.monotonic()))
+        finally:
+            with self._lock:
+                self._en_uso -= 1
+            self._cupos.release()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "en_uso": self._en_uso,
+                "libres": len(self._libres),
+                "maximo": self.maxconn,
+                "prestamos": self._prestamos,
+                "esperas": self._esperas,
+                "conexiones": self._conexiones,
+                "reemplazos": self._reemplazos,
+            }
+
+
+# Tablas leídas por un SELECT y tablas modificadas por un INSERT/UPDATE/DELETE
+_RE_TABLAS_LEIDAS = re.compile(r"\b(?:FROM|JOIN)\s+([a-z_][\w.]*)", re.IGNORECASE)
+_RE_TABLAS_ESCRITAS = re.compile(
+    r"\b(?:INSERT\s+INTO|(?<!DO\s)UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?)\s+([a-z_][\w.]*)", re.IGNORECASE
+)
+
+_RE_LECTURA = re.compile(r"\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+
+# TTL por defecto (segundos) de cada tabla; 0 = nunca cachear
+TTL_TABLAS = {
+    'usuarios': 0,
+    'costos': 300,
+    'costos_diarios': 300,
+    'consumo_diario': 60,
+    'frentes': 600,
+    'insumos': 600,
+    'configuracion': 600,
+}
+
+
+def tablas_leidas(query):
+    return {t.lower() for t in _RE_TABLAS_LEIDAS.findall(query)}
+
+
+# Tablas (y vistas) que cambian cuando se escribe en otra: la vista costos
+# sale de consumo_diario + maestros, y los triggers mantienen costos_diarios
+TABLAS_DERIVADAS = {
+    'consumo_diario': {'costos', 'costos_diarios'},
+    'frentes': {'costos', 'costos_diarios'},
+    'insumos': {'costos', 'costos_diarios'},
+    'usuarios': {'costos'},
+}
+
+
+def tablas_escritas(query):
+    tablas = {t.lower() for t in _RE_TABLAS_ESCRITAS.findall(query)}
+    for t in list(tablas):
+        tablas |= TABLAS_DERIVADAS.get(t, set())
+    return tablas
+
+
+class CacheConsultas:
+    """
+    Cache LRU de resultados de SELECT, con clave (SQL, parámetros).
+    Cada entrada vence según el TTL de las tablas que lee y se invalida
+    apenas se escribe en cualquiera de ellas desde este proceso.
+    """
+
+    def __init__(self, max_entradas=256, max_filas=50000, ttl_defecto=120, ttl_tablas=None):
+        self.max_entradas = max_entradas
+        self.max_filas = max_filas
+        self.ttl_defecto = ttl_defecto
+        self.ttl_tablas = {**TTL_TABLAS, **(ttl_tablas or {})}
+        self._datos = OrderedDict()  # clave -> (vence, tablas, filas)
+        self._lock = threading.Lock()
+        # Escrituras vistas por tabla (y vaciados completos): un SELECT que empezó
+        # antes de una escritura no guarda su resultado, que ya nació viejo
+        self._escrituras = {}
+        self._vaciados = 0
+        self._aciertos = 0
+        self._fallos = 0
+        self._invalidadas = 0
+
+    def ttl(self, tablas):
+        return min((self.ttl_tablas.get(t, self.ttl_defecto) for t in tablas), default=self.ttl_defecto)
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] < time.monotonic():
+                if entrada is not None:
+                    del self._datos[clave]
+                self._fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self._aciertos += 1
+            return entrada[2]
+
+    def _generacion(self, tablas):
+        return self._vaciados, tuple(self._escrituras.get(t, 0) for t in sorted(tablas))
+
+    def generacion(self, tablas):
+        """Marca a tomar ANTES de consultar; se le pasa luego a guardar()"""
+        with self._lock:
+            return self._generacion(tablas)
+
+    def guardar(self, clave, tablas, filas, generacion=None):
+        ttl = self.ttl(tablas)
+        if ttl <= 0 or len(filas) > self.max_filas:
+            return
+        with self._lock:
+            if generacion is not None and generacion != self._generacion(tablas):
+                return  # se escribió en alguna de sus tablas mientras corría la consulta
+            self._datos[clave] = (time.monotonic() + ttl, tablas, filas)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, tablas):
+        if not tablas:
+            return
+        with self._lock:
+            for t in tablas:
+                self._escrituras[t] = self._escrituras.get(t, 0) + 1
+            claves = [k for k, (_, leidas, _) in self._datos.items() if leidas & tablas]
+            for k in claves:
+                del self._datos[k]
+            self._invalidadas += len(claves)
+
+    def limpiar(self):
+        with self._lock:
+            self._vaciados += 1
+            self._invalidadas += len(self._datos)
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._datos),
+                "maximo": self.max_entradas,
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "invalidadas": self._invalidadas,
+            }
+
+
+# Este módulo no importa Streamlit: los scripts de línea de comandos (cierre.py,
+# migraciones.py, benchmarks) usan el pool y query_df sin cargarlo. Dentro de la
+# app Streamlit ya está importado y se usa desde sys.modules.
+
+def _streamlit():
+    """El módulo streamlit si este código corre dentro de la app, si no None"""
+    st = sys.modules.get("streamlit")
+    return st if st is not None and st.runtime.exists() else None
+
+
+def mostrar_error(mensaje):
+    """st.error en la app; en scripts de línea de comandos (sin Streamlit corriendo), a stderr"""
+    st = _streamlit()
+    if st is not None:
+        st.error(mensaje)
+    else:
+        print(mensaje, file=sys.stderr)
+
+
+@lru_cache(maxsize=1)
+def _secretos_locales():
+    """secrets.toml leído directo, en los mismos lugares que st.secrets (el del proyecto manda)"""
+    import tomllib
+    datos = {}
+    for ruta in (os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+                 os.path.join(os.getcwd(), ".streamlit", "secrets.toml")):
+        if os.path.exists(ruta):
+            with open(ruta, "rb") as archivo:
+                datos.update(tomllib.load(archivo))
+    return datos
+
 
+def config(seccion):
+    """Sección de secrets.toml como dict (vacía si no existe o no hay archivo de secretos)"""
+    st = sys.modules.get("streamlit")
+    try:
+        secretos = st.secrets if st is not None else _secretos_locales()
+        return dict(secretos.get(seccion, {}))
+    except Exception:
+        return {}
+
+
+def recurso_unico(funcion):
+    """Como st.cache_resource, sin Streamlit: la función corre una sola vez por proceso"""
+    lock = threading.Lock()
+    valor = []
+
+    @wraps(funcion)
+    def envoltura():
+        if not valor:
+            with lock:
+                if not valor:
+                    valor.append(funcion())
+        return valor[0]
+    return envoltura
+
+
+@recurso_unico
+def get_pool():
+    """
+    Crea (una sola vez por proceso) el pool de conexiones con Supabase.
+    La variable de entorno CORE_DATABASE_URL, si existe, reemplaza a los datos
+    de conexión de secrets.toml (benchmarks, scripts de línea de comandos).
+    """
+    cfg = config("postgres")
+    url = os.environ.get("CORE_DATABASE_URL")
+    if url:
+        dsn = {"dsn": url}
+    else:
+        dsn = {
+            "host": cfg["host"],
+            "database": cfg["dbname"],
+            "user": cfg["user"],
+            "password": cfg["password"],
+            "port": cfg["port"],
+        }
+    return PoolConexiones(
+        minconn=int(cfg.get("pool_min", 1)),
+        maxconn=int(cfg.get("pool_max", 10)),
+        timeout=float(cfg.get("pool_timeout", 30)),
+        ping_inactiva=float(cfg.get("pool_ping_inactiva", 60)),
+        **dsn,
+    )
+
+
+@contextmanager
 def get_db_connection():
-    """Establece la conexión segura con Supabase"""
+    """Presta una conexión del pool y la devuelve al salir del bloque"""
     try:
-        return psycopg2.connect(
-            host=st.secrets["postgres"]["host"],
-            database=st.secrets["postgres"]["dbname"],
-            user=st.secrets["postgres"]["user"],
-            password=st.secrets["postgres"]["password"],
-            port=st.secrets["postgres"]["port"]
-        )
+        pool_db = get_pool()
+        conn = pool_db.prestar()
     except Exception as e:
-        st.error(f"🔌 Error crítico de conexión: {e}")
-        st.stop()
+        mostrar_error(f"🔌 Error crítico de conexión: {e}")
+        st = _streamlit()
+        if st is not None:
+            st.stop()
+        raise
+    descartar = False
+    try:
+        yield conn
+    except ERRORES_CONEXION:
+        descartar = True
+        raise
+    finally:
+        pool_db.devolver(conn, descartar=descartar)
+
 
-def run_query(query, params=None):
-    """Ejecuta una consulta SQL y maneja la transacción"""
-    conn = get_db_connection()
+@recurso_unico
+def get_cache():
+    """Cache de consultas compartido por todas las sesiones del proceso"""
+    cfg = config("cache")
+    return CacheConsultas(
+        max_entradas=int(cfg.get("max_entradas", 256)),
+        max_filas=int(cfg.get("max_filas", 50000)),
+        ttl_defecto=float(cfg.get("ttl_defecto", 120)),
+        ttl_tablas={t: float(v) for t, v in cfg.get("ttl", {}).items()},
+    )
+
+
+def limpiar_cache():
+    """Vacía el cache de consultas (botón 'Actualizar Data')"""
+    get_cache().limpiar()
+
+
+def estadisticas_cache():
+    return get_cache().estadisticas()
+
+
+def estadisticas_pool():
+    """Estado del pool: conexiones en uso, esperas, conexiones abiertas y reemplazadas"""
+    return get_pool().estadisticas()
+
+
+def run_query(query, params=None, cache=True):
+    """
+    Ejecuta una consulta SQL con una conexión del pool.
+    Los SELECT se sirven desde el cache si hay un resultado vigente; las
+    escrituras invalidan el cache de las tablas que tocan.
+    """
+    lectura = _RE_LECTURA.match(query) is not None
+    escritas = tablas_escritas(query)
+    usar_cache = cache and lectura and not escritas
+    inicio = time.perf_counter()
+    if usar_cache:
+        clave = (query, repr(params))
+        filas = get_cache().obtener(clave)
+        if filas is not None:
+            registrar_consulta(query, inicio, filas, cache=True)
+            return list(filas)
+        leidas = tablas_leidas(query)
+        generacion = get_cache().generacion(leidas)
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, params)
-            if query.strip().upper().startswith("SELECT"):
-                return cur.fetchall()
-            else:
-                conn.commit()
-                return True
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(query, params)
+                resultado = cur.fetchall() if cur.description is not None else True
     except Exception as e:
-        st.error(f"❌ Error SQL: {e}")
+        registrar_consulta(query, inicio, error=e)
+        mostrar_error(f"❌ Error SQL: {e}")
+        return None
+    registrar_consulta(query, inicio, resultado)
+    if escritas:
+        get_cache().invalidar(escritas)
+    elif usar_cache:
+        get_cache().guardar(clave, leidas, resultado, generacion)
+        return list(resultado)
+    return resultado
+
+
+# NUMERIC llega como float desde el driver (sin pasar por Decimal). Solo lo usa
+# query_df: run_query sigue entregando Decimal a quien necesite la precisión.
+NUMERIC_FLOAT = extensions.new_type((1700,), "NUMERIC_FLOAT", lambda v, cur: float(v) if v is not None else None)
+OIDS_REALES = {700, 701, 1700}   # float4, float8, numeric
+OIDS_ENTEROS = {20, 21, 23}      # int8, int2, int4
+
+
+def _columna(valores, oid, tipo):
+    """Arma una columna tipada de una sola vez a partir de la tupla de valores"""
+    import numpy as np
+    import pandas as pd
+    if tipo == 'category':
+        return pd.Categorical(valores)
+    if tipo is not None:
+        return pd.array(valores, dtype=tipo)
+    if oid in OIDS_REALES:
+        return np.array(valores, dtype=np.float64)  # None -> NaN
+    if oid in OIDS_ENTEROS:
+        return np.array(valores, dtype=np.int64 if None not in valores else np.float64)
+    # Texto, fechas...: pandas infiere igual que con run_query
+    return list(valores) if valores else np.array([], dtype=object)
+
+
+def query_df(query, params=None, tipos=None, cache=True):
+    """
+    SELECT directo a DataFrame: filas como tuplas (no dicts) y columnas armadas
+    una vez con su tipo. NUMERIC y los float pasan a float64; `tipos` fija el
+    dtype de columnas puntuales (p. ej. {'labor': 'category'}). Usa el mismo
+    cache que run_query. Devuelve None si la consulta falla.
+    """
+    # pandas (~0,5 s al importarse) se carga con la primera consulta que lo usa,
+    # no al abrir la pantalla de login
+    import pandas as pd
+    tipos = tipos or {}
+    inicio = time.perf_counter()
+    clave = ('df', query, repr(params), repr(sorted(tipos.items())))
+    if cache:
+        df = get_cache().obtener(clave)
+        if df is not None:
+            registrar_consulta(query, inicio, df, cache=True)
+            return df.copy(deep=False)
+        leidas = tablas_leidas(query)
+        generacion = get_cache().generacion(leidas)
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                extensions.register_type(NUMERIC_FLOAT, cur)
+                cur.execute(query, params)
+                filas = cur.fetchall()
+                descripcion = cur.description
+    except Exception as e:
+        registrar_consulta(query, inicio, error=e)
+        mostrar_error(f"❌ Error SQL: {e}")
+        return None
+    columnas = list(zip(*filas)) if filas else [()] * len(descripcion)
+    df = pd.DataFrame({
+        d.name: _columna(valores, d.type_code, tipos.get(d.name))
+        for d, valores in zip(descripcion, columnas)
+    })
+    registrar_consulta(query, inicio, df)
+    if cache:
+        get_cache().guardar(clave, leidas, df, generacion)
+        # Copia liviana: quien la modifique no altera lo guardado en el cache
+        return df.copy(deep=False)
+    return df
+
+
+def _sql_sentencia(cur, query, datos):
+    """Convierte una sentencia del lote en SQL ya parametrizado (bytes)"""
+    if isinstance(datos, list):
+        # Inserción múltiple: la query lleva un único 'VALUES %s' (convención de execute_values)
+        fila = "(" + ",".join(["%s"] * len(datos[0])) + ")"
+        valores = b",".join(cur.mogrify(fila, f) for f in datos)
+        return query.encode() % (valores,)
+    return cur.mogrify(query, datos)
+
+
+def ejecutar_lote(sentencias):
+    """
+    Ejecuta varias sentencias como UNA sola transacción y en un solo viaje a la BD.
+    Cada sentencia es (query, datos): si datos es una lista de filas se expande en
+    un INSERT múltiple ('VALUES %s'); si no, son los parámetros de la query.
+    Si una falla no se guarda ninguna y se lanza la excepción (ver run_batch).
+    """
+    inicio = time.perf_counter()
+    resumen = " ; ".join(q for q, _ in sentencias)
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                partes = [_sql_sentencia(cur, q, d) for q, d in sentencias if d != []]
+                if partes:
+                    # En autocommit, varias sentencias enviadas juntas se ejecutan
+                    # en una transacción implícita: todo o nada.
+                    cur.execute(b";\n".join(partes))
+    except Exception as e:
+        registrar_consulta(resumen, inicio, error=e)
+        raise
+    get_cache().invalidar(set().union(*(tablas_escritas(q) for q, _ in sentencias)))
+    registrar_consulta(resumen, inicio)
+
+
+def run_batch(sentencias):
+    """ejecutar_lote para las pantallas: muestra el error y devuelve True o None"""
+    try:
+        ejecutar_lote(sentencias)
+        return True
+    except Exception as e:
+        mostrar_error(f"❌ Error SQL: {e}")
         return None
-    finally:
-        conn.close()
\ No newline at end of file
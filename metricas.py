@@ -0,0 +1,114 @@
+# metricas.py
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# Instrumentación liviana: cada consulta y cada pantalla deja un evento en un
+# buffer circular en memoria (y, si se configura, en un archivo JSONL).
+
+# Pantalla que se está dibujando en este hilo (para atribuirle sus consultas)
+_pagina_actual = contextvars.ContextVar("pagina_actual", default=None)
+
+_RE_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+def huella(query):
+    """SQL normalizado (sin literales ni espacios extra) para agrupar consultas iguales"""
+    q = _RE_TEXTO.sub("?", query)
+    q = _RE_NUMERO.sub("?", q)
+    return _RE_ESPACIOS.sub(" ", q).strip()[:200]
+
+
+def estimar_bytes(filas, muestra=50):
+    """Tamaño aproximado del resultado a partir de las primeras filas"""
+    if hasattr(filas, 'memory_usage'):  # DataFrame de query_df: su tamaño real
+        return int(filas.memory_usage(index=False).sum())
+    if not isinstance(filas, list) or not filas:
+        return 0
+    primeras = filas[:muestra]
+    total = sum(len(str(v)) for fila in primeras for v in fila.values())
+    return int(total / len(primeras) * len(filas))
+
+
+class RegistroMetricas:
+    """Buffer circular de eventos (consultas y pantallas), seguro entre hilos"""
+
+    def __init__(self, capacidad=5000, archivo=None):
+        self._eventos = deque(maxlen=capacidad)
+        self._lock = threading.Lock()
+        self._archivo = None
+        if archivo:
+            os.makedirs(os.path.dirname(archivo) or ".", exist_ok=True)
+            self._archivo = open(archivo, "a", encoding="utf-8", buffering=1)
+
+    def registrar(self, **evento):
+        evento.setdefault("pagina", _pagina_actual.get())
+        evento["ts"] = time.time()
+        with self._lock:
+            self._eventos.append(evento)
+            if self._archivo is not None:
+                self._archivo.write(json.dumps(evento, ensure_ascii=False, default=str) + "\n")
+
+    def eventos(self):
+        with self._lock:
+            return list(self._eventos)
+
+
+_registro = None
+_lock_registro = threading.Lock()
+
+
+def get_registro():
+    """Registro único por proceso (sin Streamlit: también lo usan los scripts de línea de comandos)"""
+    global _registro
+    if _registro is None:
+        with _lock_registro:
+            if _registro is None:
+                from database import config
+                cfg = config("metricas")
+                _registro = RegistroMetricas(capacidad=int(cfg.get("capacidad", 5000)), archivo=cfg.get("archivo"))
+    return _registro
+
+
+def registrar_consulta(query, inicio, resultado=None, error=None, cache=False):
+    get_registro().registrar(
+        tipo="consulta",
+        nombre=huella(query),
+        ms=(time.perf_counter() - inicio) * 1000,
+        filas=len(resultado) if isinstance(resultado, list) or hasattr(resultado, 'columns') else 0,
+        bytes=estimar_bytes(resultado),
+        cache=cache,
+        error=str(error) if error is not None else None,
+    )
+
+
+def medir_pagina(nombre):
+    """Decorador para las pantallas: mide su tiempo y etiqueta las consultas que hacen"""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            token = _pagina_actual.set(nombre)
+            inicio = time.perf_counter()
+            error = None
+            try:
+                return funcion(*args, **kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                # st.rerun()/st.stop() también pasan por aquí (no son Exception)
+                get_registro().registrar(
+                    tipo="pagina", nombre=nombre, pagina=nombre,
+                    ms=(time.perf_counter() - inicio) * 1000,
+                    error=str(error) if error is not None else None,
+                )
+                _pagina_actual.reset(token)
+        return envoltura
+    return decorador
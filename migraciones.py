@@ -0,0 +1,675 @@
+# migraciones.py
+"""
+Esquema versionado de la base de datos. Cada migración tiene un id ordenado y
+SQL idempotente; las aplicadas quedan anotadas en `schema_migraciones` y cada
+una corre en su propia transacción (junto con su anotación).
+
+Uso:
+    python migraciones.py aplicar
+    python migraciones.py estado
+    python migraciones.py explicar [--dias 30] [--umbral 10000]
+"""
+import argparse
+import json
+import sys
+from datetime import date, timedelta
+
+from database import run_batch, run_query
+
+SQL_TABLA_CONTROL = """
+CREATE TABLE IF NOT EXISTS schema_migraciones (
+    id TEXT PRIMARY KEY,
+    descripcion TEXT,
+    aplicada_en TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+SQL_ESQUEMA_BASE = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    id SERIAL PRIMARY KEY, username TEXT UNIQUE NOT NULL, nombre_completo TEXT,
+    password_hash BYTEA NOT NULL, rol TEXT NOT NULL DEFAULT 'lector', estado INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS frentes (
+    id SERIAL PRIMARY KEY, codigo TEXT UNIQUE NOT NULL, tipo TEXT, zona TEXT, estado TEXT NOT NULL DEFAULT 'ACTIVO'
+);
+CREATE TABLE IF NOT EXISTS insumos (
+    id SERIAL PRIMARY KEY, nombre TEXT NOT NULL, unidad TEXT, precio NUMERIC(14,4) NOT NULL DEFAULT 0,
+    categoria TEXT NOT NULL, activo INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS configuracion (clave TEXT PRIMARY KEY, valor NUMERIC);
+CREATE TABLE IF NOT EXISTS consumo_diario (
+    id SERIAL PRIMARY KEY, fecha DATE NOT NULL, guardia TEXT, frente_id INTEGER REFERENCES frentes(id),
+    insumo_id INTEGER REFERENCES insumos(id), cantidad NUMERIC DEFAULT 0, avance_metros NUMERIC DEFAULT 0,
+    tonelaje NUMERIC DEFAULT 0, usuario_id INTEGER REFERENCES usuarios(id)
+);
+CREATE TABLE IF NOT EXISTS costos (
+    id SERIAL PRIMARY KEY, fecha DATE NOT NULL, guardia TEXT, labor TEXT, categoria TEXT, detalle TEXT,
+    unidad TEXT, cantidad NUMERIC DEFAULT 0, precio_total NUMERIC DEFAULT 0, avance NUMERIC DEFAULT 0,
+    mineral_tm NUMERIC DEFAULT 0, usuario TEXT
+);
+"""
+
+SQL_TABLA_RESUMEN = """
+CREATE TABLE IF NOT EXISTS costos_diarios (
+    fecha DATE NOT NULL, labor TEXT, guardia TEXT, categoria TEXT,
+    precio_total NUMERIC NOT NULL DEFAULT 0, avance NUMERIC NOT NULL DEFAULT 0,
+    mineral_tm NUMERIC NOT NULL DEFAULT 0, cantidad NUMERIC NOT NULL DEFAULT 0,
+    registros BIGINT NOT NULL DEFAULT 0,
+    CONSTRAINT costos_diarios_clave UNIQUE NULLS NOT DISTINCT (fecha, labor, guardia, categoria)
+);
+"""
+
+# Índices pensados para las consultas de las pantallas (ver consultas_criticas).
+# usuarios.username y frentes.codigo ya tienen índice por su UNIQUE.
+# (costos_fecha_labor_idx lo retira 0004: el detalle pasa a leerse por consumo_diario_fecha_idx)
+SQL_INDICES = """
+-- Exportación del detalle: rango de fechas (+ labor) ordenado por fecha, labor
+CREATE INDEX IF NOT EXISTS costos_fecha_labor_idx ON costos (fecha, labor);
+-- Resumen diario filtrado por labor (el UNIQUE ya cubre los filtros que empiezan por fecha)
+CREATE INDEX IF NOT EXISTS costos_diarios_labor_fecha_idx ON costos_diarios (labor, fecha);
+-- Historial: últimos 7 días y, por labor, los más recientes primero (keyset sobre id)
+CREATE INDEX IF NOT EXISTS consumo_diario_fecha_idx ON consumo_diario (fecha);
+CREATE INDEX IF NOT EXISTS consumo_diario_frente_id_idx ON consumo_diario (frente_id, id);
+-- Claves foráneas: sin índice, borrar o validar un insumo/usuario recorre todo consumo_diario
+CREATE INDEX IF NOT EXISTS consumo_diario_insumo_idx ON consumo_diario (insumo_id);
+CREATE INDEX IF NOT EXISTS consumo_diario_usuario_idx ON consumo_diario (usuario_id);
+-- Listas del formulario de registro
+CREATE INDEX IF NOT EXISTS insumos_activos_idx ON insumos (categoria, nombre) WHERE activo = 1;
+"""
+
+# costos deja de ser una tabla escrita en paralelo (doble escritura) y pasa a ser
+# una vista sobre consumo_diario. El precio unitario se guarda en cada consumo;
+# para la historia se toma de la fila de costos equivalente y, si no hay, del
+# precio actual del insumo. La tabla vieja queda como costos_legado. Si alguna
+# fila de costos no tiene su consumo (se perdería de la vista), la migración se
+# detiene informando cuántas son y su monto, hasta que alguien las revise.
+# La vista y los triggers van copiados tal como estaban en rollup.py al publicarse
+# 0004: los cambios posteriores a rollup.py se instalan con una migración nueva.
+SQL_COSTOS_COMO_VISTA = """
+ALTER TABLE consumo_diario ADD COLUMN IF NOT EXISTS precio_unitario NUMERIC;
+
+DO $$
+DECLARE
+    sin_consumo BIGINT;
+    monto NUMERIC;
+BEGIN
+    IF to_regclass('costos') IS NOT NULL
+       AND (SELECT relkind FROM pg_class WHERE oid = to_regclass('costos')) = 'r' THEN
+        -- Filas de costos sin su consumo: desaparecerían de la vista y del resumen
+        SELECT COUNT(*), COALESCE(SUM(k.precio_total), 0) INTO sin_consumo, monto
+        FROM costos k
+        WHERE NOT EXISTS (
+            SELECT 1 FROM consumo_diario c
+            JOIN frentes f ON f.id = c.frente_id
+            LEFT JOIN insumos i ON i.id = c.insumo_id
+            WHERE c.fecha = k.fecha AND f.codigo = k.labor
+              AND COALESCE(i.nombre, 'Solo Avance') = k.detalle
+              AND c.cantidad = k.cantidad AND c.guardia IS NOT DISTINCT FROM k.guardia
+        );
+        IF sin_consumo > 0 THEN
+            RAISE EXCEPTION '0004: % filas de costos (S/ %) no tienen consumo equivalente en consumo_diario',
+                sin_consumo, round(monto, 2)
+                USING HINT = 'Revisarlas (mismas fecha, labor, detalle, cantidad y guardia): cargar el consumo '
+                             'que falta o borrarlas de costos, y volver a aplicar las migraciones.';
+        END IF;
+
+        DROP TRIGGER IF EXISTS costos_diarios_insert ON costos;
+        DROP TRIGGER IF EXISTS costos_diarios_update ON costos;
+        DROP TRIGGER IF EXISTS costos_diarios_delete ON costos;
+        DROP INDEX IF EXISTS costos_fecha_labor_idx;
+        ALTER TABLE costos RENAME TO costos_legado;
+    END IF;
+END $$;
+
+WITH precios AS (
+    SELECT DISTINCT ON (c.id) c.id, k.precio_total / NULLIF(k.cantidad, 0) AS precio
+    FROM consumo_diario c
+    JOIN frentes f ON f.id = c.frente_id
+    JOIN insumos i ON i.id = c.insumo_id
+    JOIN costos_legado k ON k.fecha = c.fecha AND k.labor = f.codigo AND k.detalle = i.nombre
+                        AND k.cantidad = c.cantidad AND k.guardia IS NOT DISTINCT FROM c.guardia
+    WHERE c.precio_unitario IS NULL
+    ORDER BY c.id, k.id
+)
+UPDATE consumo_diario c SET precio_unitario = p.precio
+FROM precios p WHERE p.id = c.id AND p.precio IS NOT NULL;
+
+UPDATE consumo_diario c SET precio_unitario = i.precio
+FROM insumos i WHERE c.precio_unitario IS NULL AND i.id = c.insumo_id;
+UPDATE consumo_diario SET precio_unitario = 0 WHERE precio_unitario IS NULL;
+ALTER TABLE consumo_diario ALTER COLUMN precio_unitario SET DEFAULT 0,
+                           ALTER COLUMN precio_unitario SET NOT NULL;
+
+CREATE OR REPLACE VIEW costos AS 
+    SELECT c.id, c.fecha, c.guardia, f.codigo AS labor,
+           COALESCE(i.categoria, 'AVANCE') AS categoria,
+           COALESCE(i.nombre, 'Solo Avance') AS detalle,
+           COALESCE(i.unidad, 'm') AS unidad,
+           c.cantidad, c.cantidad * c.precio_unitario AS precio_total,
+           c.avance_metros AS avance, c.tonelaje AS mineral_tm,
+           u.username AS usuario
+    FROM consumo_diario c
+    LEFT JOIN frentes f ON f.id = c.frente_id
+    LEFT JOIN insumos i ON i.id = c.insumo_id
+    LEFT JOIN usuarios u ON u.id = c.usuario_id
+    
+;
+
+CREATE TABLE IF NOT EXISTS costos_diarios (
+    fecha DATE NOT NULL,
+    labor TEXT,
+    guardia TEXT,
+    categoria TEXT,
+    precio_total NUMERIC NOT NULL DEFAULT 0,
+    avance NUMERIC NOT NULL DEFAULT 0,
+    mineral_tm NUMERIC NOT NULL DEFAULT 0,
+    cantidad NUMERIC NOT NULL DEFAULT 0,
+    registros BIGINT NOT NULL DEFAULT 0,
+    CONSTRAINT costos_diarios_clave UNIQUE NULLS NOT DISTINCT (fecha, labor, guardia, categoria)
+);
+
+CREATE OR REPLACE FUNCTION costos_diarios_aplicar() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        
+        INSERT INTO costos_diarios AS r
+            (fecha, labor, guardia, categoria, precio_total, avance, mineral_tm, cantidad, registros)
+        SELECT fecha, labor, guardia, categoria,
+               -SUM(COALESCE(precio_total, 0)), -SUM(COALESCE(avance, 0)),
+               -SUM(COALESCE(mineral_tm, 0)), -SUM(COALESCE(cantidad, 0)), -COUNT(*)
+        FROM (
+    SELECT c.id, c.fecha, c.guardia, f.codigo AS labor,
+           COALESCE(i.categoria, 'AVANCE') AS categoria,
+           COALESCE(i.nombre, 'Solo Avance') AS detalle,
+           COALESCE(i.unidad, 'm') AS unidad,
+           c.cantidad, c.cantidad * c.precio_unitario AS precio_total,
+           c.avance_metros AS avance, c.tonelaje AS mineral_tm,
+           u.username AS usuario
+    FROM filas_viejas c
+    LEFT JOIN frentes f ON f.id = c.frente_id
+    LEFT JOIN insumos i ON i.id = c.insumo_id
+    LEFT JOIN usuarios u ON u.id = c.usuario_id
+    
+) o
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT ON CONSTRAINT costos_diarios_clave DO UPDATE SET
+            precio_total = r.precio_total + EXCLUDED.precio_total,
+            avance = r.avance + EXCLUDED.avance,
+            mineral_tm = r.mineral_tm + EXCLUDED.mineral_tm,
+            cantidad = r.cantidad + EXCLUDED.cantidad,
+            registros = r.registros + EXCLUDED.registros;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        
+        INSERT INTO costos_diarios AS r
+            (fecha, labor, guardia, categoria, precio_total, avance, mineral_tm, cantidad, registros)
+        SELECT fecha, labor, guardia, categoria,
+               SUM(COALESCE(precio_total, 0)), SUM(COALESCE(avance, 0)),
+               SUM(COALESCE(mineral_tm, 0)), SUM(COALESCE(cantidad, 0)), COUNT(*)
+        FROM (
+    SELECT c.id, c.fecha, c.guardia, f.codigo AS labor,
+           COALESCE(i.categoria, 'AVANCE') AS categoria,
+           COALESCE(i.nombre, 'Solo Avance') AS detalle,
+           COALESCE(i.unidad, 'm') AS unidad,
+           c.cantidad, c.cantidad * c.precio_unitario AS precio_total,
+           c.avance_metros AS avance, c.tonelaje AS mineral_tm,
+           u.username AS usuario
+    FROM filas_nuevas c
+    LEFT JOIN frentes f ON f.id = c.frente_id
+    LEFT JOIN insumos i ON i.id = c.insumo_id
+    LEFT JOIN usuarios u ON u.id = c.usuario_id
+    
+) o
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT ON CONSTRAINT costos_diarios_clave DO UPDATE SET
+            precio_total = r.precio_total + EXCLUDED.precio_total,
+            avance = r.avance + EXCLUDED.avance,
+            mineral_tm = r.mineral_tm + EXCLUDED.mineral_tm,
+            cantidad = r.cantidad + EXCLUDED.cantidad,
+            registros = r.registros + EXCLUDED.registros;
+    END IF;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        -- Grupos que se quedaron sin registros (solo los tocados por esta sentencia)
+        DELETE FROM costos_diarios r
+        USING (SELECT DISTINCT fecha, labor, guardia, categoria FROM (
+    SELECT c.id, c.fecha, c.guardia, f.codigo AS labor,
+           COALESCE(i.categoria, 'AVANCE') AS categoria,
+           COALESCE(i.nombre, 'Solo Avance') AS detalle,
+           COALESCE(i.unidad, 'm') AS unidad,
+           c.cantidad, c.cantidad * c.precio_unitario AS precio_total,
+           c.avance_metros AS avance, c.tonelaje AS mineral_tm,
+           u.username AS usuario
+    FROM filas_viejas c
+    LEFT JOIN frentes f ON f.id = c.frente_id
+    LEFT JOIN insumos i ON i.id = c.insumo_id
+    LEFT JOIN usuarios u ON u.id = c.usuario_id
+    
+) o) v
+        WHERE r.fecha = v.fecha
+          AND r.labor IS NOT DISTINCT FROM v.labor
+          AND r.guardia IS NOT DISTINCT FROM v.guardia
+          AND r.categoria IS NOT DISTINCT FROM v.categoria
+          AND r.registros <= 0;
+    END IF;
+    RETURN NULL;
+END $$;
+
+-- Las tablas de transición exigen un trigger por evento
+DROP TRIGGER IF EXISTS costos_diarios_insert ON consumo_diario;
+CREATE TRIGGER costos_diarios_insert AFTER INSERT ON consumo_diario
+    REFERENCING NEW TABLE AS filas_nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION costos_diarios_aplicar();
+
+DROP TRIGGER IF EXISTS costos_diarios_update ON consumo_diario;
+CREATE TRIGGER costos_diarios_update AFTER UPDATE ON consumo_diario
+    REFERENCING OLD TABLE AS filas_viejas NEW TABLE AS filas_nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION costos_diarios_aplicar();
+
+DROP TRIGGER IF EXISTS costos_diarios_delete ON consumo_diario;
+CREATE TRIGGER costos_diarios_delete AFTER DELETE ON consumo_diario
+    REFERENCING OLD TABLE AS filas_viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION costos_diarios_aplicar();
+
+-- Cambios de maestros (raros): se resta la historia con el valor viejo y se suma con el nuevo
+CREATE OR REPLACE FUNCTION costos_diarios_maestros() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'frentes' THEN
+        
+        INSERT INTO costos_diarios AS r
+            (fecha, labor, guardia, categoria, precio_total, avance, mineral_tm, cantidad, registros)
+        SELECT fecha, OLD.codigo, guardia, categoria,
+               -SUM(COALESCE(precio_total, 0)), -SUM(COALESCE(avance, 0)),
+               -SUM(COALESCE(mineral_tm, 0)), -SUM(COALESCE(cantidad, 0)), -COUNT(*)
+        FROM (
+    SELECT c.id, c.fecha, c.guardia, f.codigo AS labor,
+           COALESCE(i.categoria, 'AVANCE') AS categoria,
+           COALESCE(i.nombre, 'Solo Avance') AS detalle,
+           COALESCE(i.unidad, 'm') AS unidad,
+           c.cantidad, c.cantidad * c.precio_unitario AS precio_total,
+           c.avance_metros AS avance, c.tonelaje AS mineral_tm,
+           u.username AS usuario
+    FROM consumo_diario c
+    LEFT JOIN frentes f ON f.id = c.frente_id
+    LEFT JOIN insumos i ON i.id = c.insumo_id
+    LEFT JOIN usuarios u ON u.id = c.usuario_id
+    WHERE c.frente_id = NEW.id
+) o
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT ON CONSTRAINT costos_diarios_clave DO UPDATE SET
+            precio_total = r.precio_total + EXCLUDED.precio_total,
+            avance = r.avance + EXCLUDED.avance,
+            mineral_tm = r.mineral_tm + EXCLUDED.mineral_tm,
+            cantidad = r.cantidad + EXCLUDED.cantidad,
+            registros = r.registros + EXCLUDED.registros;
+        
+        INSERT INTO costos_diarios AS r
+            (fecha, labor, guardia, categoria, precio_total, avance, mineral_tm, cantidad, registros)
+        SELECT fecha, labor, guardia, categoria,
+               SUM(COALESCE(precio_total, 0)), SUM(COALESCE(avance, 0)),
+               SUM(COALESCE(mineral_tm, 0)), SUM(COALESCE(cantidad, 0)), COUNT(*)
+        FROM (
+    SELECT c.id, c.fecha, c.guardia, f.codigo AS labor,
+           COALESCE(i.categoria, 'AVANCE') AS categoria,
+           COALESCE(i.nombre, 'Solo Avance') AS detalle,
+           COALESCE(i.unidad, 'm') AS unidad,
+           c.cantidad, c.cantidad * c.precio_unitario AS precio_total,
+           c.avance_metros AS avance, c.tonelaje AS mineral_tm,
+           u.username AS usuario
+    FROM consumo_diario c
+    LEFT JOIN frentes f ON f.id = c.frente_id
+    LEFT JOIN insumos i ON i.id = c.insumo_id
+    LEFT JOIN usuarios u ON u.id = c.usuario_id
+    WHERE c.frente_id = NEW.id
+) o
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT ON CONSTRAINT costos_diarios_clave DO UPDATE SET
+            precio_total = r.precio_total + EXCLUDED.precio_total,
+            avance = r.avance + EXCLUDED.avance,
+            mineral_tm = r.mineral_tm + EXCLUDED.mineral_tm,
+            cantidad = r.cantidad + EXCLUDED.cantidad,
+            registros = r.registros + EXCLUDED.registros;
+    ELSE
+        
+        INSERT INTO costos_diarios AS r
+            (fecha, labor, guardia, categoria, precio_total, avance, mineral_tm, cantidad, registros)
+        SELECT fecha, labor, guardia, OLD.categoria,
+               -SUM(COALESCE(precio_total, 0)), -SUM(COALESCE(avance, 0)),
+               -SUM(COALESCE(mineral_tm, 0)), -SUM(COALESCE(cantidad, 0)), -COUNT(*)
+        FROM (
+    SELECT c.id, c.fecha, c.guardia, f.codigo AS labor,
+           COALESCE(i.categoria, 'AVANCE') AS categoria,
+           COALESCE(i.nombre, 'Solo Avance') AS detalle,
+           COALESCE(i.unidad, 'm') AS unidad,
+           c.cantidad, c.cantidad * c.precio_unitario AS precio_total,
+           c.avance_metros AS avance, c.tonelaje AS mineral_tm,
+           u.username AS usuario
+    FROM consumo_diario c
+    LEFT JOIN frentes f ON f.id = c.frente_id
+    LEFT JOIN insumos i ON i.id = c.insumo_id
+    LEFT JOIN usuarios u ON u.id = c.usuario_id
+    WHERE c.insumo_id = NEW.id
+) o
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT ON CONSTRAINT costos_diarios_clave DO UPDATE SET
+            precio_total = r.precio_total + EXCLUDED.precio_total,
+            avance = r.avance + EXCLUDED.avance,
+            mineral_tm = r.mineral_tm + EXCLUDED.mineral_tm,
+            cantidad = r.cantidad + EXCLUDED.cantidad,
+            registros = r.registros + EXCLUDED.registros;
+        
+        INSERT INTO costos_diarios AS r
+            (fecha, labor, guardia, categoria, precio_total, avance, mineral_tm, cantidad, registros)
+        SELECT fecha, labor, guardia, categoria,
+               SUM(COALESCE(precio_total, 0)), SUM(COALESCE(avance, 0)),
+               SUM(COALESCE(mineral_tm, 0)), SUM(COALESCE(cantidad, 0)), COUNT(*)
+        FROM (
+    SELECT c.id, c.fecha, c.guardia, f.codigo AS labor,
+           COALESCE(i.categoria, 'AVANCE') AS categoria,
+           COALESCE(i.nombre, 'Solo Avance') AS detalle,
+           COALESCE(i.unidad, 'm') AS unidad,
+           c.cantidad, c.cantidad * c.precio_unitario AS precio_total,
+           c.avance_metros AS avance, c.tonelaje AS mineral_tm,
+           u.username AS usuario
+    FROM consumo_diario c
+    LEFT JOIN frentes f ON f.id = c.frente_id
+    LEFT JOIN insumos i ON i.id = c.insumo_id
+    LEFT JOIN usuarios u ON u.id = c.usuario_id
+    WHERE c.insumo_id = NEW.id
+) o
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT ON CONSTRAINT costos_diarios_clave DO UPDATE SET
+            precio_total = r.precio_total + EXCLUDED.precio_total,
+            avance = r.avance + EXCLUDED.avance,
+            mineral_tm = r.mineral_tm + EXCLUDED.mineral_tm,
+            cantidad = r.cantidad + EXCLUDED.cantidad,
+            registros = r.registros + EXCLUDED.registros;
+    END IF;
+    DELETE FROM costos_diarios WHERE registros <= 0;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS costos_diarios_frentes ON frentes;
+CREATE TRIGGER costos_diarios_frentes AFTER UPDATE OF codigo ON frentes
+    FOR EACH ROW WHEN (OLD.codigo IS DISTINCT FROM NEW.codigo)
+    EXECUTE FUNCTION costos_diarios_maestros();
+
+DROP TRIGGER IF EXISTS costos_diarios_insumos ON insumos;
+CREATE TRIGGER costos_diarios_insumos AFTER UPDATE OF categoria ON insumos
+    FOR EACH ROW WHEN (OLD.categoria IS DISTINCT FROM NEW.categoria)
+    EXECUTE FUNCTION costos_diarios_maestros();
+
+
+-- El resumen se rehace desde la vista: los costos de consumos ya borrados desaparecen
+TRUNCATE costos_diarios;
+
+    INSERT INTO costos_diarios
+        (fecha, labor, guardia, categoria, precio_total, avance, mineral_tm, cantidad, registros)
+    SELECT fecha, labor, guardia, categoria,
+           SUM(COALESCE(precio_total, 0)), SUM(COALESCE(avance, 0)),
+           SUM(COALESCE(mineral_tm, 0)), SUM(COALESCE(cantidad, 0)), COUNT(*)
+    FROM costos
+    WHERE fecha BETWEEN '-infinity' AND 'infinity'
+    GROUP BY 1, 2, 3, 4
+
+"""
+
+# Sello de versión de los maestros: cualquier escritura en frentes, insumos o
+# configuracion sube la secuencia y los procesos recargan su catálogo (modules/catalogos.py)
+SQL_VERSION_CATALOGO = """
+CREATE SEQUENCE IF NOT EXISTS catalogo_version;
+
+CREATE OR REPLACE FUNCTION catalogo_cambio() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM nextval('catalogo_version');
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS catalogo_cambio ON frentes;
+CREATE TRIGGER catalogo_cambio AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON frentes
+    FOR EACH STATEMENT EXECUTE FUNCTION catalogo_cambio();
+DROP TRIGGER IF EXISTS catalogo_cambio ON insumos;
+CREATE TRIGGER catalogo_cambio AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON insumos
+    FOR EACH STATEMENT EXECUTE FUNCTION catalogo_cambio();
+DROP TRIGGER IF EXISTS catalogo_cambio ON configuracion;
+CREATE TRIGGER catalogo_cambio AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON configuracion
+    FOR EACH STATEMENT EXECUTE FUNCTION catalogo_cambio();
+"""
+
+# Cada cotización (dólar, oro) que se guarda, con su hora y de dónde vino
+SQL_HISTORIAL_CONFIGURACION = """
+CREATE TABLE IF NOT EXISTS configuracion_historial (
+    id BIGSERIAL PRIMARY KEY,
+    clave TEXT NOT NULL,
+    valor NUMERIC NOT NULL,
+    fuente TEXT,
+    obtenido_en TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS configuracion_historial_clave_idx ON configuracion_historial (clave, obtenido_en DESC);
+"""
+
+# Precios de insumos con fecha de vigencia (revaluacion.py). La historia arranca
+# con el precio actual vigente "desde siempre"; luego cada cambio de insumos.precio
+# se anota vigente desde el día del cambio (salvo que ya coincida con lo vigente).
+SQL_PRECIOS_INSUMOS = """
+CREATE TABLE IF NOT EXISTS insumos_precios (
+    insumo_id INTEGER NOT NULL REFERENCES insumos(id),
+    vigente_desde DATE NOT NULL,
+    precio NUMERIC(14,4) NOT NULL,
+    registrado_en TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (insumo_id, vigente_desde)
+);
+
+INSERT INTO insumos_precios (insumo_id, vigente_desde, precio)
+SELECT id, '-infinity', precio FROM insumos
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION insumos_precios_anotar() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO insumos_precios AS p (insumo_id, vigente_desde, precio)
+    SELECT n.id, CASE WHEN TG_OP = 'INSERT' THEN '-infinity'::date ELSE CURRENT_DATE END, n.precio
+    FROM filas_nuevas n
+    WHERE n.precio IS DISTINCT FROM (
+        SELECT v.precio FROM insumos_precios v
+        WHERE v.insumo_id = n.id AND v.vigente_desde <= CURRENT_DATE
+        ORDER BY v.vigente_desde DESC LIMIT 1
+    )
+    ON CONFLICT (insumo_id, vigente_desde) DO UPDATE SET precio = EXCLUDED.precio, registrado_en = now();
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS insumos_precios_insert ON insumos;
+CREATE TRIGGER insumos_precios_insert AFTER INSERT ON insumos
+    REFERENCING NEW TABLE AS filas_nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION insumos_precios_anotar();
+DROP TRIGGER IF EXISTS insumos_precios_update ON insumos;
+CREATE TRIGGER insumos_precios_update AFTER UPDATE ON insumos
+    REFERENCING NEW TABLE AS filas_nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION insumos_precios_anotar();
+"""
+
+# Claves de idempotencia de los partes enviados desde la cola local
+# (modules/cola_partes.py): cada parte entra UNA vez aunque se reenvíe.
+SQL_PARTES_RECIBIDOS = """
+CREATE TABLE IF NOT EXISTS partes_recibidos (
+    clave TEXT PRIMARY KEY,
+    registros INTEGER NOT NULL,
+    creado_en TIMESTAMPTZ NOT NULL,
+    recibido_en TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+# (id, descripción, SQL). Nunca editar una migración ya publicada: agregar una nueva.
+MIGRACIONES = [
+    ("0001_esquema_base", "Tablas de la aplicación", SQL_ESQUEMA_BASE),
+    ("0002_resumen_diario", "Tabla del resumen diario costos_diarios", SQL_TABLA_RESUMEN),
+    ("0003_indices", "Índices para dashboard, exportación e historial", SQL_INDICES),
+    ("0004_costos_vista", "costos como vista de consumo_diario (sin doble escritura)", SQL_COSTOS_COMO_VISTA),
+    ("0005_version_catalogo", "Sello de versión de frentes, insumos y configuracion", SQL_VERSION_CATALOGO),
+    ("0006_historial_configuracion", "Historial de cotizaciones (dólar, oro)", SQL_HISTORIAL_CONFIGURACION),
+    ("0007_precios_insumos", "Historial de precios de insumos con fecha de vigencia", SQL_PRECIOS_INSUMOS),
+    ("0008_partes_recibidos", "Claves de idempotencia de la cola local de partes", SQL_PARTES_RECIBIDOS),
+]
+
+
+def aplicadas():
+    """{id: fecha de aplicación} de las migraciones ya corridas"""
+    if not run_batch([(SQL_TABLA_CONTROL, None)]):
+        return None
+    res = run_query("SELECT id, aplicada_en FROM schema_migraciones", cache=False)
+    if res is None:
+        return None
+    return {r['id']: r['aplicada_en'] for r in res}
+
+
+def pendientes():
+    hechas = aplicadas()
+    if hechas is None:
+        return None
+    return [m for m in MIGRACIONES if m[0] not in hechas]
+
+
+def aplicar():
+    """Corre en orden las migraciones pendientes. Devuelve los ids aplicados o None si alguna falló."""
+    faltan = pendientes()
+    if faltan is None:
+        return None
+    hechas = []
+    for id_mig, descripcion, sql in faltan:
+        ok = run_batch([
+            # Dos procesos migrando a la vez se turnan en vez de pisarse
+            ("SELECT pg_advisory_xact_lock(hashtext('schema_migraciones'))", None),
+            (sql, None),
+            ("INSERT INTO schema_migraciones (id, descripcion) VALUES (%s, %s) ON CONFLICT (id) DO NOTHING",
+             (id_mig, descripcion)),
+        ])
+        if not ok:
+            return None
+        hechas.append(id_mig)
+    return hechas
+
+
+def version_esquema():
+    """Id de la última migración aplicada (None si no hay ninguna)"""
+    hechas = aplicadas()
+    return max(hechas) if hechas else None
+
+
+# --- PLANES DE LAS CONSULTAS CRÍTICAS ---
+
+def consultas_criticas(dias=30):
+    """(nombre, sql, params) con la misma forma que las consultas de las pantallas"""
+    from modules.auth import SQL_LOGIN
+    from modules.catalogos import SQL_FRENTES, SQL_INSUMOS
+    from modules.registro import SQL_HISTORIAL
+    hasta = date.today()
+    desde = hasta - timedelta(days=dias)
+    labor = run_query("SELECT labor FROM costos_diarios WHERE labor IS NOT NULL LIMIT 1", cache=False)
+    labor = labor[0]['labor'] if labor else ''
+    frente = run_query("SELECT id FROM frentes ORDER BY id LIMIT 1", cache=False)
+    frente = frente[0]['id'] if frente else 0
+    return [
+        ("Login", SQL_LOGIN, ('admin',)),
+        ("Dashboard: KPIs",
+         "SELECT SUM(precio_total), SUM(avance), SUM(mineral_tm), SUM(registros) FROM costos_diarios "
+         "WHERE fecha BETWEEN %s AND %s", (desde, hasta)),
+        ("Dashboard: KPIs por labor",
+         "SELECT SUM(precio_total), SUM(avance), SUM(mineral_tm), SUM(registros) FROM costos_diarios "
+         "WHERE fecha BETWEEN %s AND %s AND labor = %s", (desde, hasta, labor)),
+        ("Dashboard: detalle exportado",
+         "SELECT * FROM costos WHERE fecha BETWEEN %s AND %s ORDER BY fecha, labor", (desde, hasta)),
+        ("Dashboard: detalle por labor",
+         "SELECT * FROM costos WHERE fecha BETWEEN %s AND %s AND labor = %s ORDER BY fecha, labor",
+         (desde, hasta, labor)),
+        ("Registro: historial",
+         SQL_HISTORIAL.format(where="c.fecha >= CURRENT_DATE - INTERVAL '7 days'"), (51,)),
+        ("Registro: historial por labor",
+         SQL_HISTORIAL.format(where="c.fecha >= CURRENT_DATE - INTERVAL '7 days' AND c.frente_id = %s"),
+         (frente, 51)),
+        ("Catálogo: insumos", SQL_INSUMOS, None),
+        ("Catálogo: frentes", SQL_FRENTES, None),
+    ]
+
+
+def _nodos(plan):
+    yield plan
+    for hijo in plan.get("Plans", []):
+        yield from _nodos(hijo)
+
+
+def explicar(dias=30, umbral=10000):
+    """
+    EXPLAIN de cada consulta crítica. Marca los Seq Scan sobre tablas con más de
+    `umbral` filas estimadas (en tablas chicas el planner los elige con razón).
+    Devuelve una lista de dicts, o None si no se pudo consultar.
+    """
+    tamanos = run_query("SELECT relname, reltuples::bigint AS filas FROM pg_class WHERE relkind = 'r'", cache=False)
+    if tamanos is None:
+        return None
+    tamanos = {r['relname']: r['filas'] for r in tamanos}
+
+    informe = []
+    for nombre, sql, params in consultas_criticas(dias):
+        res = run_query(f"EXPLAIN (FORMAT JSON) {sql}", params, cache=False)
+        if not res:
+            return None
+        plan = res[0]['QUERY PLAN']
+        plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+        nodos = list(_nodos(plan))
+        secuenciales = sorted({n['Relation Name'] for n in nodos
+                               if n['Node Type'] == 'Seq Scan' and tamanos.get(n['Relation Name'], 0) > umbral})
+        informe.append({
+            'consulta': nombre,
+            'costo': plan['Total Cost'],
+            'accesos': ", ".join(f"{n['Node Type']} ({n.get('Index Name') or n['Relation Name']})"
+                                 for n in nodos if 'Relation Name' in n or 'Index Name' in n),
+            'seq_scan': secuenciales,
+        })
+    return informe
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migraciones del esquema de CORE")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("aplicar", help="Corre las migraciones pendientes")
+    sub.add_parser("estado", help="Lista las migraciones y si están aplicadas")
+    p_exp = sub.add_parser("explicar", help="Planes de las consultas críticas (avisa Seq Scan)")
+    p_exp.add_argument("--dias", type=int, default=30, help="Rango de fechas usado en las consultas del dashboard")
+    p_exp.add_argument("--umbral", type=int, default=10000, help="Filas a partir de las cuales un Seq Scan es sospechoso")
+    args = parser.parse_args(argv)
+
+    if args.comando == "aplicar":
+        hechas = aplicar()
+        if hechas is None:
+            print("❌ Falló (ver error arriba)")
+            return 1
+        print("\n".join(f"✅ {m}" for m in hechas) or "✅ El esquema ya estaba al día")
+        return 0
+
+    if args.comando == "estado":
+        hechas = aplicadas()
+        if hechas is None:
+            print("❌ No se pudo leer schema_migraciones")
+            return 1
+        for id_mig, descripcion, _ in MIGRACIONES:
+            marca = f"✅ {hechas[id_mig]:%Y-%m-%d %H:%M}" if id_mig in hechas else "⏳ pendiente      "
+            print(f"{marca}  {id_mig}  {descripcion}")
+        return 0
+
+    informe = explicar(args.dias, args.umbral)
+    if informe is None:
+        print("❌ Falló (ver error arriba)")
+        return 1
+    for fila in informe:
+        marca = f"⚠️  Seq Scan en {', '.join(fila['seq_scan'])}" if fila['seq_scan'] else "✅"
+        print(f"{marca}  {fila['consulta']}  (costo {fila['costo']:,.0f})\n      {fila['accesos']}")
+    return 1 if any(f['seq_scan'] for f in informe) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
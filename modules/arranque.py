@@ -0,0 +1,68 @@
+# modules/arranque.py
+import time
+from datetime import datetime
+import streamlit as st
+from modules.auth import check_admin_exists
+from modules.catalogos import get_catalogo
+from modules.cola_partes import get_cola
+from modules.mercado import get_actualizador
+
+# Lo que antes se repetía en cada rerun (chequeo del admin) y lo que conviene
+# hacer antes de la primera pantalla (versión del esquema, catálogo en memoria,
+# actualizador de cotizaciones, envío de la cola local) corre UNA vez por proceso.
+
+@st.cache_resource(show_spinner="⏳ Iniciando CORE...")
+def _arrancar():
+    # Si un paso falla se lanza la excepción: cache_resource no guarda el
+    # resultado y el siguiente rerun lo vuelve a intentar.
+    if not check_admin_exists():
+        raise RuntimeError("no se pudo verificar el usuario administrador")
+
+    import migraciones
+    pendientes = migraciones.pendientes()
+    if pendientes is None:
+        raise RuntimeError("no se pudo leer la versión del esquema")
+
+    if get_catalogo() is None:
+        raise RuntimeError("no se pudo cargar el catálogo de maestros")
+
+    # Dólar y oro se refrescan en un hilo aparte; ninguna pantalla espera a internet
+    actualizador = get_actualizador()
+    if actualizador is not None and not pendientes:
+        actualizador.iniciar()
+
+    # Envío de los partes guardados en la cola local (también los de sesiones anteriores)
+    cola = get_cola()
+    if cola is not None and not pendientes:
+        cola.iniciar()
+
+    return {
+        'inicio': datetime.now(),
+        'version_esquema': migraciones.version_esquema(),
+        'migraciones_pendientes': [m[0] for m in pendientes],
+    }
+
+# Con migraciones pendientes el arranque queda a medias (sin envío de la cola ni
+# cotizaciones): se vuelve a mirar el esquema cada tanto y, cuando un admin corre
+# `python migraciones.py aplicar`, se rehace el arranque completo sin reiniciar.
+REVISAR_MIGRACIONES_CADA = 30
+_ultima_revision = [0.0]
+
+def _migraciones_aplicadas():
+    if time.monotonic() - _ultima_revision[0] < REVISAR_MIGRACIONES_CADA:
+        return False
+    _ultima_revision[0] = time.monotonic()
+    import migraciones
+    return migraciones.pendientes() == []
+
+def arrancar():
+    """Estado del arranque del proceso; detiene la página si la BD no está lista"""
+    try:
+        estado = _arrancar()
+        if estado['migraciones_pendientes'] and _migraciones_aplicadas():
+            _arrancar.clear()
+            estado = _arrancar()
+        return estado
+    except RuntimeError as e:
+        st.error(f"❌ No se pudo iniciar la aplicación: {e}. Reintente en unos segundos.")
+        st.stop()
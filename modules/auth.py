@@ -1,22 +1,51 @@
 # modules/auth.py
 import streamlit as st
 import bcrypt
-import pandas as pd
 import time
-from database import run_query
+from database import run_query, config
+from metricas import medir_pagina
+
+# Costo de bcrypt para los hashes nuevos (secrets.toml: [auth] bcrypt_rounds).
+# Los hashes con otro costo se regeneran solos en el siguiente login correcto.
+# bcrypt suelta el GIL mientras calcula: cada login verifica en su propio hilo
+# de sesión, sin cola, y un pico al cambio de guardia usa todos los núcleos.
+BCRYPT_ROUNDS = int(config("auth").get("bcrypt_rounds", 12))
+
+SQL_LOGIN = "SELECT id, username, nombre_completo, rol, password_hash FROM usuarios WHERE username=%s AND estado=1"
+
+def hashear(password):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(BCRYPT_ROUNDS))
+
+def _verificar(password, password_hash):
+    """Devuelve (clave correcta, hash nuevo si hay que actualizar el costo)"""
+    if not bcrypt.checkpw(password.encode(), password_hash):
+        return False, None
+    costo = int(password_hash.split(b'$')[2])
+    return True, (hashear(password) if costo != BCRYPT_ROUNDS else None)
 
 def check_admin_exists():
-    if not run_query("SELECT id FROM usuarios WHERE username=%s", ('admin',)):
-        h = bcrypt.hashpw("admin123".encode(), bcrypt.gensalt())
-        run_query("INSERT INTO usuarios (username, nombre_completo, password_hash, rol) VALUES (%s,%s,%s,%s)", ('admin', 'System Admin', h, 'admin'))
+    """Crea el admin inicial si no existe. Devuelve False si no se pudo consultar."""
+    res = run_query("SELECT id FROM usuarios WHERE username=%s", ('admin',))
+    if res is None:
+        return False
+    if not res:
+        return run_query("INSERT INTO usuarios (username, nombre_completo, password_hash, rol) VALUES (%s,%s,%s,%s)",
+                         ('admin', 'System Admin', hashear("admin123"), 'admin')) is not None
+    return True
 
 def login_user(user, password):
-    res = run_query("SELECT * FROM usuarios WHERE username=%s AND estado=1", (user,))
-    if res:
-        u_data = res[0]
-        if bcrypt.checkpw(password.encode(), bytes(u_data['password_hash'])):
-            return u_data
-    return None
+    """Datos del usuario (sin el hash) si las credenciales son correctas, si no None"""
+    res = run_query(SQL_LOGIN, (user,))
+    if not res:
+        return None
+    u_data = dict(res[0])
+    password_hash = bytes(u_data.pop('password_hash'))
+    correcta, nuevo_hash = _verificar(password, password_hash)
+    if not correcta:
+        return None
+    if nuevo_hash:
+        run_query("UPDATE usuarios SET password_hash=%s WHERE id=%s", (nuevo_hash, u_data['id']))
+    return u_data
 
 # --- ESTA ES LA FUNCIÓN QUE FALTABA Y CAUSABA EL ERROR ---
 def show_login_screen():
@@ -29,7 +58,8 @@ def show_login_screen():
             u = st.text_input("Usuario")
             p = st.text_input("Contraseña", type="password")
             if st.form_submit_button("Ingresar", type="primary"):
-                user_data = login_user(u, p)
+                with st.spinner("Verificando..."):
+                    user_data = login_user(u, p)
                 if user_data:
                     st.session_state['authenticated'] = True
                     st.session_state['usuario'] = user_data['username']
@@ -38,6 +68,7 @@ def show_login_screen():
                     # -------------------------------------------
                     st.session_state['rol'] = user_data['rol']
                     st.session_state['user_id'] = user_data['id']
+                    # Desde aquí cada rerun usa estos datos de sesión: no se vuelve a leer usuarios
                     
                     st.success(f"¡Bienvenido, {user_data['nombre_completo']}!")
                     time.sleep(1)
@@ -45,6 +76,7 @@ def show_login_screen():
                 else:
                     st.error("Credenciales incorrectas")
 
+@medir_pagina("Usuarios")
 def show_users_manager():
     st.subheader("Gestión de Usuarios")
     with st.form("new_u"):
@@ -53,8 +85,8 @@ def show_users_manager():
         p = st.text_input("Clave", type="password")
         r = st.selectbox("Rol", ["digitador", "lector", "admin"])
         if st.form_submit_button("Crear"):
-            h = bcrypt.hashpw(p.encode(), bcrypt.gensalt())
+            h = hashear(p)
             run_query("INSERT INTO usuarios (username, nombre_completo, password_hash, rol) VALUES (%s,%s,%s,%s)", (u, n, h, r))
             st.success("Usuario creado")
             st.rerun()
-    st.dataframe(pd.DataFrame(run_query("SELECT username, rol FROM usuarios")))
\ No newline at end of file
+    st.dataframe(run_query("SELECT username, rol FROM usuarios"))
\ No newline at end of file
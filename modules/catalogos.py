@@ -0,0 +1,110 @@
+# modules/catalogos.py
+import threading
+import time
+from types import MappingProxyType
+import streamlit as st
+from database import run_query, config
+
+# Maestros (frentes, insumos, configuracion) en memoria, compartidos por todas las
+# sesiones del proceso. Cambian pocas veces por semana pero se leen en cada rerun.
+# Un trigger sube la secuencia catalogo_version con cualquier escritura en esas
+# tablas (migración 0005); cada proceso la revisa cada `revisar_cada` segundos y
+# recarga si cambió. Las escrituras de este proceso invalidan al instante.
+
+SQL_VERSION = "SELECT CASE WHEN is_called THEN last_value ELSE 0 END AS version FROM catalogo_version"
+SQL_FRENTES = "SELECT id, codigo, tipo, zona, estado FROM frentes"
+SQL_INSUMOS = "SELECT id, nombre, unidad, precio::float8 AS precio, categoria, activo FROM insumos"
+SQL_PARAMETROS = "SELECT clave, valor FROM configuracion"
+
+
+class Catalogo:
+    """Foto inmutable de los maestros con búsquedas O(1) por id y por código"""
+
+    def __init__(self, version, frentes, insumos, parametros):
+        self.version = version
+        fijar = lambda filas: tuple(MappingProxyType(dict(f)) for f in filas)
+        # Ordenados como se muestran: frentes por código, insumos por categoría y nombre
+        self.frentes = fijar(sorted(frentes, key=lambda f: f['codigo']))
+        self.insumos = fijar(sorted(insumos, key=lambda i: (i['categoria'], i['nombre'])))
+        self.frentes_activos = tuple(f for f in self.frentes if f['estado'] == 'ACTIVO')
+        self.insumos_activos = tuple(i for i in self.insumos if i['activo'] == 1)
+        self._frentes_id = MappingProxyType({f['id']: f for f in self.frentes})
+        self._frentes_codigo = MappingProxyType({f['codigo']: f for f in self.frentes})
+        self._insumos_id = MappingProxyType({i['id']: i for i in self.insumos})
+        self._parametros = MappingProxyType({p['clave']: float(p['valor']) for p in parametros if p['valor'] is not None})
+
+    def frente(self, frente_id):
+        return self._frentes_id.get(frente_id)
+
+    def frente_por_codigo(self, codigo):
+        return self._frentes_codigo.get(codigo)
+
+    def insumo(self, insumo_id):
+        return self._insumos_id.get(insumo_id)
+
+    @property
+    def insumos_por_id(self):
+        return self._insumos_id
+
+    def parametro(self, clave, defecto=None):
+        return self._parametros.get(clave, defecto)
+
+
+class GestorCatalogo:
+    """Entrega la foto vigente y la recarga cuando el sello de versión cambia"""
+
+    def __init__(self, revisar_cada=30):
+        self.revisar_cada = revisar_cada
+        self._actual = None
+        self._revisado = 0.0
+        self._lock = threading.Lock()
+        self.recargas = 0
+
+    def _version(self):
+        res = run_query(SQL_VERSION, cache=False)
+        return res[0]['version'] if res else None
+
+    def _cargar(self, version):
+        frentes = run_query(SQL_FRENTES, cache=False)
+        insumos = run_query(SQL_INSUMOS, cache=False)
+        parametros = run_query(SQL_PARAMETROS, cache=False)
+        if frentes is None or insumos is None or parametros is None:
+            return None
+        self.recargas += 1
+        return Catalogo(version, frentes, insumos, parametros)
+
+    def actual(self):
+        ahora = time.monotonic()
+        if self._actual is not None and ahora - self._revisado < self.revisar_cada:
+            return self._actual
+        with self._lock:
+            # Otro hilo pudo haberlo refrescado mientras esperábamos
+            if self._actual is not None and time.monotonic() - self._revisado < self.revisar_cada:
+                return self._actual
+            version = self._version()
+            if self._actual is None or version != self._actual.version:
+                nuevo = self._cargar(version)
+                if nuevo is not None:
+                    self._actual = nuevo
+            self._revisado = time.monotonic()
+            return self._actual
+
+    def invalidar(self):
+        """Fuerza la revisión del sello en la próxima lectura (tras escribir maestros)"""
+        with self._lock:
+            self._revisado = 0.0
+
+
+@st.cache_resource(show_spinner=False)
+def get_gestor():
+    cfg = config("catalogos")
+    return GestorCatalogo(revisar_cada=float(cfg.get("revisar_cada", 30)))
+
+
+def get_catalogo():
+    """Foto vigente de los maestros (puede ser None si la BD no respondió nunca)"""
+    return get_gestor().actual()
+
+
+def invalidar():
+    get_gestor().invalidar()
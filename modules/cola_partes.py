@@ -0,0 +1,203 @@
+# modules/cola_partes.py
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+import psycopg2
+from psycopg2.errors import UniqueViolation
+from psycopg2.pool import PoolError
+import streamlit as st
+from database import config, ejecutar_lote, run_query, ERRORES_CONEXION
+
+# Los partes se guardan primero en un SQLite local (con fsync) y el digitador
+# recibe la confirmación al instante. Un hilo los envía a Postgres por lotes;
+# cada parte lleva una clave única que queda en `partes_recibidos` en la misma
+# transacción que sus filas, así que reenviar un lote nunca duplica datos.
+
+# Sin red no tiene sentido insistir parte por parte: se espera y se reintenta todo
+ERRORES_RED = ERRORES_CONEXION + (PoolError,)
+
+SQL_COLA = """
+CREATE TABLE IF NOT EXISTS cola (
+    orden INTEGER PRIMARY KEY AUTOINCREMENT,
+    clave TEXT UNIQUE NOT NULL,
+    creado_en TEXT NOT NULL,
+    filas TEXT NOT NULL,
+    rechazado INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+)
+"""
+
+SQL_RECIBIDO = "INSERT INTO partes_recibidos (clave, registros, creado_en) VALUES %s"
+
+
+class ColaPartes:
+    """Partes guardados en disco local y enviados a Postgres en segundo plano"""
+
+    def __init__(self, ruta, lote=50, intervalo=10, espera_max=300):
+        self.ruta = ruta
+        self.lote = lote
+        self.intervalo = intervalo
+        self.espera_max = espera_max
+        self.enviados = 0
+        self.ultimo_envio = None
+        self.error = None
+        self._pedido = threading.Event()
+        self._envio = threading.Lock()
+        self._hilo = None
+        self._lock = threading.Lock()
+        if os.path.dirname(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with self._conexion() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(SQL_COLA)
+
+    @contextmanager
+    def _conexion(self):
+        # Una conexión por operación: sirve desde cualquier hilo (sesiones y envío)
+        con = sqlite3.connect(self.ruta, timeout=30)
+        try:
+            con.execute("PRAGMA synchronous=FULL")  # confirmado = escrito en disco
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def encolar(self, filas):
+        """Guarda el parte en disco y devuelve su clave; el envío ocurre después"""
+        clave = os.urandom(16).hex()
+        with self._conexion() as con:
+            con.execute("INSERT INTO cola (clave, creado_en, filas) VALUES (?, ?, ?)", (
+                clave, datetime.now().astimezone().isoformat(timespec="seconds"),
+                json.dumps(filas, default=date.isoformat),
+            ))
+        self._pedido.set()
+        return clave
+
+    def estado(self):
+        """(partes por enviar, partes rechazados por la BD)"""
+        with self._conexion() as con:
+            pendientes, rechazados = con.execute(
+                "SELECT COUNT(*) - COALESCE(SUM(rechazado), 0), COALESCE(SUM(rechazado), 0) FROM cola"
+            ).fetchone()
+        return pendientes, rechazados
+
+    def rechazados(self):
+        with self._conexion() as con:
+            return con.execute(
+                "SELECT creado_en, filas, error FROM cola WHERE rechazado = 1 ORDER BY orden"
+            ).fetchall()
+
+    def reintentar(self):
+        """Vuelve a la cola los partes rechazados (p. ej. tras corregir un maestro)"""
+        with self._conexion() as con:
+            con.execute("UPDATE cola SET rechazado = 0, error = NULL WHERE rechazado = 1")
+        self._pedido.set()
+
+    @property
+    def activa(self):
+        """True si el hilo de envío está corriendo (si no, lo encolado no sale del equipo)"""
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="cola-partes", daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        espera = 0
+        while True:
+            self._pedido.wait(espera)
+            self._pedido.clear()
+            if self.vaciar():
+                espera = self.intervalo
+            else:
+                # Sin conexión: cada vez se espera el doble, hasta espera_max
+                espera = min(max(espera * 2, self.intervalo), self.espera_max)
+
+    def _leer(self):
+        with self._conexion() as con:
+            return con.execute(
+                "SELECT clave, creado_en, filas FROM cola WHERE rechazado = 0 ORDER BY orden LIMIT ?",
+                (self.lote,),
+            ).fetchall()
+
+    def _borrar(self, claves):
+        with self._conexion() as con:
+            con.executemany("DELETE FROM cola WHERE clave = ?", [(c,) for c in claves])
+
+    def _rechazar(self, clave, error):
+        with self._conexion() as con:
+            con.execute("UPDATE cola SET rechazado = 1, error = ? WHERE clave = ?", (str(error), clave))
+
+    def _enviar(self, lote):
+        """Un lote = una transacción: claves de idempotencia + todas sus filas"""
+        from modules.registro import SQL_INSERT_CONSUMO  # registro importa este módulo
+        recibidos, filas = [], []
+        for clave, creado_en, texto in lote:
+            parte = [tuple(f) for f in json.loads(texto)]
+            for f in parte:
+                filas.append((date.fromisoformat(f[0]),) + f[1:])
+            recibidos.append((clave, len(parte), creado_en))
+        claves = [r[0] for r in recibidos]
+        try:
+            ejecutar_lote([(SQL_RECIBIDO, recibidos), (SQL_INSERT_CONSUMO, filas)])
+        except UniqueViolation:
+            # Alguno ya había llegado (se cortó la red antes de borrarlo de la cola)
+            ya = run_query("SELECT clave FROM partes_recibidos WHERE clave = ANY(%s)", (claves,), cache=False)
+            if ya is None:
+                raise psycopg2.OperationalError("no se pudo verificar qué partes ya llegaron")
+            if not ya:
+                raise
+            self._borrar([r['clave'] for r in ya])
+            return
+        self._borrar(claves)
+        self.enviados += len(claves)
+        self.ultimo_envio = datetime.now()
+
+    def vaciar(self):
+        """Envía todo lo pendiente. False si la BD no respondió (se reintenta más tarde)."""
+        with self._envio:
+            while True:
+                lote = self._leer()
+                if not lote:
+                    self.error = None
+                    return True
+                try:
+                    self._enviar(lote)
+                except ERRORES_RED as e:
+                    self.error = f"sin conexión con la base de datos: {e}"
+                    return False
+                except Exception as e:
+                    if len(lote) == 1:
+                        self._rechazar(lote[0][0], e)
+                        continue
+                    # Datos rechazados: parte por parte, para apartar solo el que falla
+                    for parte in lote:
+                        try:
+                            self._enviar([parte])
+                        except ERRORES_RED as e:
+                            self.error = f"sin conexión con la base de datos: {e}"
+                            return False
+                        except Exception as e:
+                            self._rechazar(parte[0], e)
+
+
+@st.cache_resource(show_spinner=False)
+def get_cola():
+    """Cola del proceso (None si [registro] cola_local = false o no se pudo abrir el archivo)"""
+    cfg = config("registro")
+    if not cfg.get("cola_local", True):
+        return None
+    try:
+        return ColaPartes(
+            cfg.get("ruta_cola", "datos/cola_partes.sqlite"),
+            lote=int(cfg.get("lote_cola", 50)),
+            intervalo=float(cfg.get("intervalo_cola", 10)),
+        )
+    except (sqlite3.Error, OSError):
+        # Sin disco local utilizable los partes se guardan directo en la BD
+        return None
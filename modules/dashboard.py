@@ -1,11 +1,14 @@
 # modules/dashboard.py
 import streamlit as st
-import pandas as pd
 import altair as alt
-from datetime import datetime, time
-from database import run_query
-from modules.reportes import generar_excel_corporativo
+from datetime import datetime
+from database import limpiar_cache
+from metricas import medir_pagina
+from modules import datos_dashboard as datos
+from modules import descargas
+from modules.catalogos import get_catalogo, invalidar as invalidar_catalogo
 
+@medir_pagina("Dashboard")
 def show_dashboard():
     # --- CABECERA Y BOTÓN DE ACTUALIZACIÓN ---
     col_head, col_btn = st.columns([8,2])
@@ -13,12 +16,14 @@ def show_dashboard():
         st.title("💎 CORE - Control de Costos")
     with col_btn:
         if st.button("🔄 Actualizar Data"):
+            limpiar_cache()
+            invalidar_catalogo()
             st.cache_data.clear()
             st.rerun()
     
     # 1. Configuración General
-    res = run_query("SELECT valor FROM configuracion WHERE clave='DOLAR_CAMBIO'")
-    dolar = float(res[0]['valor']) if res else 3.75
+    catalogo = get_catalogo()
+    dolar = catalogo.parametro('DOLAR_CAMBIO', 3.75) if catalogo else 3.75
     
     with st.expander("🔍 Filtros de Búsqueda", expanded=True):
         c1, c2, c3, c4 = st.columns(4)
@@ -26,131 +31,142 @@ def show_dashboard():
         ff = c2.date_input("Hasta", value=datetime.today())
         
         # ---------------------------------------------------------
-        # 🚀 LA LÓGICA DEL FILTRO "A PRUEBA DE BALAS"
+        # 🚀 FILTROS CON LO QUE REALMENTE HAY EN LA BD
         # ---------------------------------------------------------
-        # En lugar de adivinar qué labores existen, primero traemos TODA la data
-        # del rango de fechas. Así el filtro se llena con lo que REALMENTE hay.
-        
-        # Paso 1: Consultar BD sin filtrar por labor/guardia aún
-        base_query = """
-            SELECT 
-                c.fecha, c.guardia, c.labor, c.categoria, c.detalle, c.unidad,
-                c.cantidad, c.precio_total, c.avance, c.mineral_tm
-            FROM costos c
-            WHERE c.fecha BETWEEN %s AND %s
-        """
-        ff_full = datetime.combine(ff, time(23, 59, 59))
-        base_params = [fi, ff_full]
-        
-        raw_data = run_query(base_query, base_params)
-        df_base = pd.DataFrame(raw_data)
-        
-        # Paso 2: Extraer listas únicas para los selectbox
-        if not df_base.empty:
-            # Normalizamos nombres de columnas por si acaso
-            df_base.columns = [c.lower() for c in df_base.columns]
+        # La BD nos devuelve solo las labores/guardias distintas del rango
+        # (SELECT DISTINCT), sin traer las filas de costos a memoria.
+        labs_reales, gua_reales = datos.opciones_filtros(fi, ff)
             
-            # Sacamos lista única de labores y guardias presentes en la data
-            labs_reales = sorted(df_base['labor'].unique().tolist()) if 'labor' in df_base.columns else []
-            gua_reales = sorted(df_base['guardia'].unique().tolist()) if 'guardia' in df_base.columns else []
-        else:
-            labs_reales = []
-            gua_reales = []
-            
-        # Paso 3: Crear los filtros con esas listas reales
         f_lab = c3.selectbox("Labor", ["TODOS"] + labs_reales)
         f_gua = c4.selectbox("Guardia", ["TODOS"] + gua_reales)
         
-    # ---------------------------------------------------------
-    # 2. Aplicar Filtros en Memoria (Pandas)
-    # ---------------------------------------------------------
-    # Usamos df_base que ya tiene los datos, solo filtramos el DataFrame
-    df = df_base.copy()
-    
-    if df.empty:
+    if not labs_reales:
         st.warning("📭 No hay datos registrados en este rango de fechas.")
         return 
 
-    # Filtro de Labor
-    if f_lab != "TODOS":
-        df = df[df['labor'] == f_lab]
-        
-    # Filtro de Guardia
-    if f_gua != "TODOS":
-        df = df[df['guardia'] == f_gua]
-        
-    if df.empty:
+    # ---------------------------------------------------------
+    # 2. Agregados calculados en Postgres (SUM / GROUP BY)
+    # ---------------------------------------------------------
+    totales = datos.kpis(fi, ff, f_lab, f_gua)
+    if totales is None:
+        return  # el error de la BD ya se mostró
+    if totales['registros'] == 0:
         st.warning("📭 No hay datos con los filtros seleccionados.")
         return
 
-    # 3. Procesamiento de Datos (Limpieza y Tipos)
-    cols_num = ['precio_total', 'avance', 'mineral_tm', 'cantidad']
-    for col in cols_num:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            
-    total_pen = df['precio_total'].sum()
-    
-    # Dataframe Agrupado para gráfico
-    df_agrupado = df.groupby(['labor']).agg({
-        'avance': 'sum', 
-        'mineral_tm': 'sum', 
-        'precio_total': 'sum'
-    }).reset_index()
+    total_pen = totales['precio_total']
     
-    # 4. KPIs y Gráficos
+    # 3. KPIs y Gráficos
     k1, k2, k3, k4 = st.columns(4)
     k1.metric("Gasto Total (S/)", f"S/ {total_pen:,.0f}")
     k2.metric("Equiv. Dólares ($)", f"$ {total_pen/dolar:,.0f}")
-    k3.metric("Avance Total", f"{df['avance'].sum():.1f} m")
-    k4.metric("Mineral (TM)", f"{df['mineral_tm'].sum():.0f} t")
+    k3.metric("Avance Total", f"{totales['avance']:.1f} m")
+    k4.metric("Mineral (TM)", f"{totales['mineral_tm']:.0f} t")
     
     st.divider()
     
     g1, g2 = st.columns(2)
     with g1:
         st.markdown("##### 📦 Gasto por Categoría")
-        if 'categoria' in df.columns:
-            d_c = df.groupby('categoria')['precio_total'].sum().reset_index()
+        d_c = datos.gasto_por_categoria(fi, ff, f_lab, f_gua)
+        if d_c is not None:
             st.altair_chart(alt.Chart(d_c).mark_bar().encode(
                 x=alt.X('categoria', sort='-y'), y='precio_total',
                 tooltip=['categoria', 'precio_total']
-            ), use_container_width=True)
+            ), width="stretch")
             
     with g2:
-        st.markdown("##### 📉 Costo por Labor")
-        st.altair_chart(alt.Chart(df_agrupado).mark_bar(color='#FFA500').encode(
-            x=alt.X('labor', sort='-y'), y='precio_total',
-            tooltip=['labor', 'precio_total']
-        ), use_container_width=True)
+        # Pareto: top N labores + "Otros", así el gráfico pesa lo mismo con 10 o 500 labores
+        st.markdown("##### 📉 Pareto de Costo por Labor")
+        d_p = datos.pareto(fi, ff, f_lab, f_gua)
+        if d_p is not None:
+            base = alt.Chart(d_p).encode(x=alt.X('clave', sort=None, title='labor'))
+            st.altair_chart(alt.layer(
+                base.mark_bar(color='#FFA500').encode(
+                    y=alt.Y('gasto', title='S/'), tooltip=['clave', 'gasto', 'pct_acum']),
+                base.mark_line(color='#C0392B', point=True).encode(
+                    y=alt.Y('pct_acum', title='% acumulado', scale=alt.Scale(domain=[0, 100]))),
+            ).resolve_scale(y='independent'), width="stretch")
+
+    # Curvas en el tiempo: el grano (día / semana / mes) se elige según el rango
+    grano = datos.grano_para(fi, ff)
+    st.markdown(f"##### 📈 Avance vs. Gasto (por {datos.GRANOS[grano]})")
+    d_t = datos.tendencia(fi, ff, f_lab, f_gua, grano)
+    if d_t is not None:
+        base = alt.Chart(d_t).encode(x=alt.X('periodo:T', title=None))
+        t1, t2 = st.columns(2)
+        t1.altair_chart(alt.layer(
+            base.mark_line(color='#FFA500').encode(
+                y=alt.Y('gasto_acum', title='Gasto acumulado (S/)'), tooltip=['periodo:T', 'gasto_acum']),
+            base.mark_line(color='#2E86C1').encode(
+                y=alt.Y('avance_acum', title='Avance acumulado (m)'), tooltip=['periodo:T', 'avance_acum']),
+        ).resolve_scale(y='independent'), width="stretch")
+        t2.altair_chart(alt.layer(
+            base.mark_bar(opacity=0.4).encode(
+                y=alt.Y('costo_metro', title='S/ por metro'), tooltip=['periodo:T', 'costo_metro']),
+            base.mark_line(color='#C0392B').encode(
+                y='costo_metro_acum', tooltip=['periodo:T', 'costo_metro_acum']),
+        ), width="stretch")
 
-    # 5. SECCIÓN DE EXPORTACIÓN
+    # 4. SECCIÓN DE EXPORTACIÓN
     st.divider()
     st.subheader("📥 Exportación de Reportes")
     
+    # Los archivos se generan solo a pedido, en segundo plano, y quedan cacheados
+    usuario = st.session_state.get('usuario', 'Admin')
+    rol = st.session_state.get('rol', 'Lector')
+    gestor = descargas.get_gestor()
+    clave = descargas.clave_reporte(fi, ff, f_lab, f_gua, usuario)
+
     col_btn_csv, col_btn_xls = st.columns(2)
-    
-    # --- BOTÓN 1: CSV ---
+
+    # --- BOTÓN 1: EXTRACCIÓN COMPLETA (CSV / PARQUET) ---
     with col_btn_csv:
-        st.info("📊 **Formato Básico (CSV)**")
-        csv_data = df.to_csv(index=False).encode('utf-8')
-        st.download_button("📄 Descargar CSV", csv_data, "data_raw.csv", "text/csv", key="btn_csv_down")
+        st.info("📊 **Extracción completa (CSV / Parquet)**")
+        formato = st.radio("Formato", list(descargas.FORMATOS_EXTRACCION), horizontal=True,
+                           format_func=lambda f: descargas.FORMATOS_EXTRACCION[f][0], key="fmt_extraccion")
+        # Se escribe a disco por lotes: la memoria no crece con el rango de fechas
+        archivo = _trabajo_exportacion(gestor, ('extraccion', formato) + clave, "📦 Preparar extracción",
+                                       "btn_prep_extraccion", descargas.extraer_detalle, fi, ff, f_lab, f_gua, formato)
+        if archivo is not None:
+            st.download_button(
+                f"📄 Descargar {descargas.FORMATOS_EXTRACCION[formato][0]} ({archivo['filas']:,} filas, "
+                f"{archivo['bytes'] / 1e6:,.1f} MB)",
+                lambda: descargas.abrir_extraccion(archivo, fi, ff, f_lab, f_gua, formato),  # al hacer clic
+                archivo['nombre'], archivo['mime'], key="btn_csv_down")
 
     # --- BOTÓN 2: EXCEL PREMIUM ---
     with col_btn_xls:
         st.success("📈 **Formato Gerencial (Excel)**")
-        try:
-            usuario = st.session_state.get('usuario', 'Admin')
-            rol = st.session_state.get('rol', 'Lector')
-            excel_data = generar_excel_corporativo(df, df_agrupado, usuario, rol)
-            
+        archivos = _trabajo_exportacion(gestor, clave, "📦 Preparar Excel", "btn_prep_export",
+                                        descargas.construir_reporte, fi, ff, f_lab, f_gua, usuario, rol)
+        if archivos is not None:
             st.download_button(
                 "📊 Descargar Excel Pro", 
-                excel_data, 
-                f"Reporte_CORE_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
+                archivos['xlsx'], 
+                archivos['nombre_xlsx'],
                 "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 key="btn_xls_down",
                 type="primary"
             )
-        except Exception as e:
-            st.error(f"⚠️ Error: {e}")
\ No newline at end of file
+
+def _trabajo_exportacion(gestor, clave, etiqueta, key, construir, *args):
+    """Botón para encolar la exportación, barra de progreso mientras corre; devuelve sus archivos"""
+    trabajo = gestor.buscar(clave)
+    if trabajo is not None and trabajo.error is not None:
+        st.error(f"⚠️ Error: {trabajo.error}")
+        trabajo = None
+    if trabajo is None:
+        if not st.button(etiqueta, key=key):
+            return None
+        trabajo = gestor.solicitar(clave, construir, *args)
+
+    if not trabajo.terminada:
+        barra = st.progress(trabajo.progreso, text=trabajo.mensaje)
+        while not trabajo.esperar(timeout=0.3):
+            barra.progress(trabajo.progreso, text=trabajo.mensaje)
+        barra.empty()
+    if trabajo.error is not None:
+        st.error(f"⚠️ Error: {trabajo.error}")
+        return None
+    return trabajo.archivos
@@ -0,0 +1,208 @@
+# modules/datos_dashboard.py
+from datetime import datetime, time
+from database import get_db_connection, query_df, run_query
+
+# Capa de datos del Dashboard: Postgres filtra y agrega, a pandas solo
+# llega lo que realmente se muestra en pantalla. Todo lo que se agrega por
+# día o más grueso sale del resumen diario (rollup.py); las filas crudas de
+# costos solo se leen para exportar el detalle.
+FUENTE_AGREGADOS = "costos_diarios"
+
+COLUMNAS_DETALLE = ['fecha', 'guardia', 'labor', 'categoria', 'detalle', 'unidad',
+                    'cantidad', 'precio_total', 'avance', 'mineral_tm']
+# Texto con pocos valores distintos que se repite en miles de filas: categóricas
+CATEGORICAS = {c: 'category' for c in ('labor', 'guardia', 'categoria', 'unidad', 'detalle')}
+
+# Todas las consultas devuelven None si la BD falló (el error ya se mostró): quien
+# llama distingue una caída de un periodo sin datos.
+
+def _df(query, params, columnas):
+    """query_df con columnas categóricas (None si la consulta falló)"""
+    return query_df(query, params, tipos={c: t for c, t in CATEGORICAS.items() if c in columnas})
+
+def _where(fi, ff, labor="TODOS", guardia="TODOS"):
+    """Arma el WHERE común (rango de fechas + filtros opcionales) y sus parámetros"""
+    ff_full = datetime.combine(ff, time(23, 59, 59))
+    condiciones = ["fecha BETWEEN %s AND %s"]
+    params = [fi, ff_full]
+    if labor != "TODOS":
+        condiciones.append("labor = %s")
+        params.append(labor)
+    if guardia != "TODOS":
+        condiciones.append("guardia = %s")
+        params.append(guardia)
+    return " AND ".join(condiciones), params
+
+def opciones_filtros(fi, ff):
+    """Labores y guardias con datos en el rango (para llenar los selectbox)"""
+    where, params = _where(fi, ff)
+    res = run_query(f"""
+        SELECT
+            COALESCE(array_agg(DISTINCT labor ORDER BY labor) FILTER (WHERE labor IS NOT NULL), '{{}}') AS labores,
+            COALESCE(array_agg(DISTINCT guardia ORDER BY guardia) FILTER (WHERE guardia IS NOT NULL), '{{}}') AS guardias
+        FROM {FUENTE_AGREGADOS}
+        WHERE {where}
+    """, params)
+    if not res:
+        return [], []
+    return list(res[0]['labores']), list(res[0]['guardias'])
+
+def kpis(fi, ff, labor="TODOS", guardia="TODOS"):
+    """Totales del periodo filtrado: gasto, avance, mineral y número de registros (None si falló)"""
+    where, params = _where(fi, ff, labor, guardia)
+    res = run_query(f"""
+        SELECT
+            COALESCE(SUM(precio_total), 0)::float8 AS precio_total,
+            COALESCE(SUM(avance), 0)::float8 AS avance,
+            COALESCE(SUM(mineral_tm), 0)::float8 AS mineral_tm,
+            COALESCE(SUM(registros), 0)::bigint AS registros
+        FROM {FUENTE_AGREGADOS}
+        WHERE {where}
+    """, params)
+    return dict(res[0]) if res else None
+
+def gasto_por_categoria(fi, ff, labor="TODOS", guardia="TODOS"):
+    where, params = _where(fi, ff, labor, guardia)
+    return _df(f"""
+        SELECT categoria, COALESCE(SUM(precio_total), 0) AS precio_total
+        FROM {FUENTE_AGREGADOS}
+        WHERE {where}
+        GROUP BY categoria
+        ORDER BY precio_total DESC
+    """, params, ['categoria', 'precio_total'])
+
+def resumen_por_labor(fi, ff, labor="TODOS", guardia="TODOS"):
+    """Avance, mineral y gasto por labor (alimenta el gráfico y la hoja 'Resumen Gerencial')"""
+    where, params = _where(fi, ff, labor, guardia)
+    return _df(f"""
+        SELECT labor,
+               COALESCE(SUM(avance), 0) AS avance,
+               COALESCE(SUM(mineral_tm), 0) AS mineral_tm,
+               COALESCE(SUM(precio_total), 0) AS precio_total
+        FROM {FUENTE_AGREGADOS}
+        WHERE {where}
+        GROUP BY labor
+        ORDER BY labor
+    """, params, ['labor', 'avance', 'mineral_tm', 'precio_total'])
+
+# Puntos de las curvas acotados sea cual sea el rango: día hasta ~2 meses,
+# semana hasta ~1,5 años y luego mes (5 años = 60 puntos)
+GRANOS = {'day': 'día', 'week': 'semana', 'month': 'mes'}
+
+def grano_para(fi, ff):
+    dias = (ff - fi).days + 1
+    return 'day' if dias <= 62 else 'week' if dias <= 550 else 'month'
+
+def tendencia(fi, ff, labor="TODOS", guardia="TODOS", grano=None):
+    """
+    Gasto y avance por periodo con sus acumulados y el costo por metro (del periodo
+    y acumulado), todo con funciones de ventana en Postgres.
+    """
+    where, params = _where(fi, ff, labor, guardia)
+    return _df(f"""
+        SELECT periodo, gasto, avance,
+               SUM(gasto) OVER w AS gasto_acum,
+               SUM(avance) OVER w AS avance_acum,
+               gasto / NULLIF(avance, 0) AS costo_metro,
+               SUM(gasto) OVER w / NULLIF(SUM(avance) OVER w, 0) AS costo_metro_acum
+        FROM (
+            SELECT date_trunc(%s, fecha)::date AS periodo,
+                   COALESCE(SUM(precio_total), 0) AS gasto, COALESCE(SUM(avance), 0) AS avance
+            FROM {FUENTE_AGREGADOS}
+            WHERE {where}
+            GROUP BY 1
+        ) t
+        WINDOW w AS (ORDER BY periodo)
+        ORDER BY periodo
+    """, [grano or grano_para(fi, ff)] + params,
+        ['periodo', 'gasto', 'avance', 'gasto_acum', 'avance_acum', 'costo_metro', 'costo_metro_acum'])
+
+TOP_PARETO = 15
+COLUMNAS_PARETO = ('labor', 'categoria', 'guardia')
+
+def pareto(fi, ff, labor="TODOS", guardia="TODOS", por='labor', top=TOP_PARETO):
+    """
+    Gasto por `por` de mayor a menor con el % acumulado; pasado el puesto `top`
+    todo se junta en una sola barra "Otros (n)". Nunca más de top + 1 filas.
+    """
+    if por not in COLUMNAS_PARETO:
+        raise ValueError(f"pareto por {por!r}: use {COLUMNAS_PARETO}")
+    where, params = _where(fi, ff, labor, guardia)
+    df = query_df(f"""
+        WITH ranking AS (
+            SELECT {por} AS clave, SUM(precio_total) AS gasto,
+                   ROW_NUMBER() OVER (ORDER BY SUM(precio_total) DESC, {por}) AS puesto
+            FROM {FUENTE_AGREGADOS}
+            WHERE {where}
+            GROUP BY {por}
+            HAVING SUM(precio_total) > 0
+        ), barras AS (
+            SELECT CASE WHEN puesto <= %s THEN clave END AS clave, puesto > %s AS otros,
+                   SUM(gasto) AS gasto, COUNT(*) AS elementos, MIN(puesto) AS orden
+            FROM ranking
+            GROUP BY 1, 2
+        )
+        SELECT clave, otros, gasto, elementos,
+               100 * SUM(gasto) OVER (ORDER BY orden) / NULLIF(SUM(gasto) OVER (), 0) AS pct_acum
+        FROM barras
+        ORDER BY orden
+    """, params + [top, top])
+    if df is None:
+        return None
+    df['clave'] = df['clave'].where(~df['otros'], 'Otros (' + df['elementos'].astype(str) + ')')
+    return df[['clave', 'gasto', 'pct_acum']]
+
+def version_datos(fi, ff, labor="TODOS", guardia="TODOS"):
+    """
+    Huella de los datos filtrados: cambia con cualquier alta, baja o corrección
+    dentro del rango. Sirve de clave para los archivos ya exportados.
+    Va por el cache de consultas como los KPIs: se invalida apenas se escribe en
+    costos_diarios desde este proceso y, si no, vence con el mismo TTL, así que
+    la clave de la descarga nunca es más nueva ni más vieja que lo que se ve.
+    """
+    where, params = _where(fi, ff, labor, guardia)
+    res = run_query(f"""
+        SELECT COALESCE(SUM(registros), 0)::bigint AS registros,
+               COALESCE(SUM(precio_total), 0)::text AS precio_total,
+               COALESCE(SUM(cantidad), 0)::text AS cantidad,
+               COALESCE(SUM(avance), 0)::text AS avance,
+               COALESCE(SUM(mineral_tm), 0)::text AS mineral_tm
+        FROM {FUENTE_AGREGADOS}
+        WHERE {where}
+    """, params)
+    return tuple(res[0].values()) if res else None
+
+SQL_DETALLE = """
+    SELECT fecha, guardia, labor, categoria, detalle, unidad,
+           COALESCE(cantidad, 0)::float8 AS cantidad, COALESCE(precio_total, 0)::float8 AS precio_total,
+           COALESCE(avance, 0)::float8 AS avance, COALESCE(mineral_tm, 0)::float8 AS mineral_tm
+    FROM costos
+    WHERE {where}
+    ORDER BY fecha, labor
+"""
+
+def detalle(fi, ff, labor="TODOS", guardia="TODOS"):
+    """Filas crudas del periodo: solo para exportar"""
+    where, params = _where(fi, ff, labor, guardia)
+    return _df(SQL_DETALLE.format(where=where), params, COLUMNAS_DETALLE)
+
+def detalle_por_lotes(fi, ff, labor="TODOS", guardia="TODOS", tam_lote=20000):
+    """
+    Las mismas filas que detalle(), de a `tam_lote` tuplas, leídas con un cursor
+    del lado del servidor: en memoria nunca hay más de un lote, sea cual sea el rango.
+    """
+    where, params = _where(fi, ff, labor, guardia)
+    with get_db_connection() as conn:
+        # Un cursor con nombre vive dentro de una transacción (de solo lectura)
+        conn.autocommit = False
+        try:
+            with conn.cursor(name="exportacion_detalle") as cur:
+                cur.itersize = tam_lote
+                cur.execute(SQL_DETALLE.format(where=where), params)
+                while True:
+                    filas = cur.fetchmany(tam_lote)
+                    if not filas:
+                        break
+                    yield filas
+        finally:
+            conn.rollback()
@@ -0,0 +1,266 @@
+# modules/descargas.py
+import csv
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import streamlit as st
+from database import config
+from modules import datos_dashboard as datos
+from modules.reportes import generar_excel_corporativo
+
+# Los archivos de exportación (Excel, CSV / Parquet) se generan solo cuando alguien los pide,
+# en un hilo aparte, y quedan guardados por (filtros, versión de datos, usuario):
+# descargar de nuevo el mismo reporte es instantáneo.
+# La extracción completa (CSV / Parquet) no pasa por un DataFrame: se lee por
+# lotes con un cursor del servidor y se escribe a un archivo temporal en disco.
+
+class Exportacion:
+    """Estado de una exportación en curso o terminada"""
+
+    def __init__(self):
+        self.progreso = 0.0
+        self.mensaje = "En cola..."
+        self.archivos = None
+        self.error = None
+        self._listo = threading.Event()
+
+    def avanzar(self, progreso, mensaje):
+        self.progreso = progreso
+        self.mensaje = mensaje
+
+    @property
+    def terminada(self):
+        return self._listo.is_set()
+
+    def esperar(self, timeout=None):
+        return self._listo.wait(timeout)
+
+    def descartar(self):
+        """Borra el archivo temporal (si la exportación generó uno)"""
+        ruta = (self.archivos or {}).get('ruta')
+        if ruta:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+
+class GestorExportaciones:
+    """Cola de generación (pool de hilos) + cache LRU de los archivos ya generados"""
+
+    def __init__(self, hilos=2, max_archivos=8):
+        self.max_archivos = max_archivos
+        self._executor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="exportacion")
+        self._trabajos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def buscar(self, clave):
+        with self._lock:
+            trabajo = self._trabajos.get(clave)
+            if trabajo is not None and trabajo.error is not None:
+                # Un intento fallido no se cachea: se podrá volver a pedir
+                del self._trabajos[clave]
+                trabajo.descartar()
+                return trabajo
+            ruta = (trabajo.archivos or {}).get('ruta') if trabajo is not None and trabajo.terminada else None
+            if ruta and not os.path.exists(ruta):
+                # Alguien borró el temporal (limpieza de /tmp...): se vuelve a generar a pedido
+                del self._trabajos[clave]
+                return None
+            if trabajo is not None:
+                self._trabajos.move_to_end(clave)
+            return trabajo
+
+    def solicitar(self, clave, construir, *args):
+        with self._lock:
+            trabajo = self._trabajos.get(clave)
+            if trabajo is not None:
+                return trabajo
+            trabajo = Exportacion()
+            self._trabajos[clave] = trabajo
+            terminadas = [k for k, t in self._trabajos.items() if t.terminada]
+            while len(self._trabajos) > self.max_archivos and terminadas:
+                self._trabajos.pop(terminadas.pop(0)).descartar()
+        self._executor.submit(self._ejecutar, trabajo, construir, args)
+        return trabajo
+
+    @staticmethod
+    def _ejecutar(trabajo, construir, args):
+        try:
+            trabajo.archivos = construir(*args, avance=trabajo.avanzar)
+        except Exception as e:
+            trabajo.error = str(e) or type(e).__name__
+        finally:
+            trabajo._listo.set()
+
+
+@st.cache_resource(show_spinner=False)
+def get_gestor():
+    cfg = config("exportacion")
+    return GestorExportaciones(hilos=int(cfg.get("hilos", 2)), max_archivos=int(cfg.get("max_archivos", 8)))
+
+
+def construir_reporte(fi, ff, labor, guardia, usuario, rol, avance=lambda p, m: None):
+    """Trae el detalle del periodo y arma el Excel gerencial"""
+    avance(0.1, "📥 Leyendo registros del periodo...")
+    df = datos.detalle(fi, ff, labor, guardia)
+    df_agrupado = datos.resumen_por_labor(fi, ff, labor, guardia)
+    if df is None or df_agrupado is None:
+        raise RuntimeError("no se pudieron leer los datos del periodo")
+
+    avance(0.5, f"📊 Generando Excel ({len(df):,} filas)...")
+    excel_data = generar_excel_corporativo(df, df_agrupado, usuario, rol)
+
+    avance(1.0, "✅ Listo")
+    return {
+        'xlsx': excel_data,
+        'nombre_xlsx': f"Reporte_CORE_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
+        'filas': len(df),
+    }
+
+
+def clave_reporte(fi, ff, labor, guardia, usuario):
+    return (fi, ff, labor, guardia, datos.version_datos(fi, ff, labor, guardia), usuario)
+
+
+FORMATOS_EXTRACCION = {
+    'csv': ("CSV", "text/csv"),
+    'parquet': ("Parquet", "application/vnd.apache.parquet"),
+}
+
+
+def _escribir_csv(lotes, archivo, avance):
+    escritor = csv.writer(archivo)
+    escritor.writerow(datos.COLUMNAS_DETALLE)
+    for filas in lotes:
+        escritor.writerows(filas)
+        avance(len(filas))
+
+
+def _escribir_parquet(lotes, archivo, avance, compresion):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("la exportación Parquet requiere pyarrow (pip install pyarrow)")
+    esquema = pa.schema([
+        ('fecha', pa.date32()), ('guardia', pa.string()), ('labor', pa.string()),
+        ('categoria', pa.string()), ('detalle', pa.string()), ('unidad', pa.string()),
+        ('cantidad', pa.float64()), ('precio_total', pa.float64()),
+        ('avance', pa.float64()), ('mineral_tm', pa.float64()),
+    ])
+    # Cada lote es un row group: el archivo crece en disco, la memoria no
+    with pq.ParquetWriter(archivo, esquema, compression=compresion) as escritor:
+        for filas in lotes:
+            columnas = list(zip(*filas))
+            escritor.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=campo.type) for col, campo in zip(columnas, esquema)], schema=esquema))
+            avance(len(filas))
+
+
+def extraer_detalle(fi, ff, labor, guardia, formato, avance=lambda p, m: None):
+    """
+    Escribe el detalle del periodo a un archivo temporal en `formato` ('csv' o
+    'parquet') leyendo de a `[exportacion] tam_lote` filas. Devuelve ruta, nombre y tamaño.
+    """
+    cfg = config("exportacion")
+    tam_lote = int(cfg.get("tam_lote", 20000))
+    totales = datos.kpis(fi, ff, labor, guardia)
+    if totales is None:
+        raise RuntimeError("no se pudieron leer los datos del periodo")
+    total = max(totales['registros'], 1)
+    escritas = 0
+
+    def contar(n):
+        nonlocal escritas
+        escritas += n
+        avance(min(escritas / total, 0.99), f"📥 {escritas:,} de {total:,} filas...")
+
+    avance(0.0, "📥 Leyendo registros del periodo...")
+    lotes = datos.detalle_por_lotes(fi, ff, labor, guardia, tam_lote=tam_lote)
+    fd, ruta = tempfile.mkstemp(prefix="core_detalle_", suffix=f".{formato}")
+    try:
+        if formato == 'csv':
+            with open(fd, "w", encoding="utf-8", newline="") as archivo:
+                _escribir_csv(lotes, archivo, contar)
+        else:
+            with open(fd, "wb") as archivo:
+                _escribir_parquet(lotes, archivo, contar, cfg.get("compresion", "zstd"))
+    except BaseException:
+        lotes.close()
+        os.remove(ruta)
+        raise
+
+    avance(1.0, "✅ Listo")
+    _, mime = FORMATOS_EXTRACCION[formato]
+    return {
+        'ruta': ruta,
+        'mime': mime,
+        'nombre': f"Detalle_CORE_{fi:%Y%m%d}_{ff:%Y%m%d}.{formato}",
+        'filas': escritas,
+        'bytes': os.path.getsize(ruta),
+    }
+
+
+class ArchivoDescarga(io.RawIOBase):
+    """
+    Archivo en disco abierto para st.download_button: se entrega el handle, no
+    bytes, y se cierra solo apenas Streamlit termina de leerlo.
+
+    Streamlit (1.x) no transmite por bloques: al hacer clic copia el archivo
+    completo a su almacén de medios en memoria y lo sirve desde ahí hasta el
+    siguiente rerun de la sesión. Ese es el único búfer del tamaño del archivo:
+    esta clase no agrega otra copia (se lee de una vez, sin acumular bloques) ni
+    deja el archivo abierto. Extracciones anuales muy grandes: cierre.py, que
+    escribe directo a disco.
+    """
+
+    def __init__(self, ruta, borrar=False):
+        super().__init__()
+        # Abierto antes de que el LRU pueda borrarlo: un archivo ya abierto se sigue leyendo
+        self._archivo = open(ruta, "rb", buffering=0)
+        self._ruta = ruta
+        self._borrar = borrar
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, posicion, desde=io.SEEK_SET):
+        return self._archivo.seek(posicion, desde)
+
+    def readinto(self, destino):
+        return self._archivo.readinto(destino)
+
+    def readall(self):
+        # FileIO.readall reserva el tamaño del archivo una sola vez
+        try:
+            return self._archivo.readall()
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self._archivo.close()
+            if self._borrar:
+                os.remove(self._ruta)
+        super().close()
+
+
+def abrir_extraccion(archivo, fi, ff, labor, guardia, formato):
+    """
+    Archivo para el botón de descarga (se llama recién al hacer clic).
+    Si el temporal ya no existe (el LRU lo descartó entre el render y el clic) se
+    vuelve a extraer en el momento y se borra después de leerlo.
+    """
+    try:
+        return ArchivoDescarga(archivo['ruta'])
+    except FileNotFoundError:
+        nuevo = extraer_detalle(fi, ff, labor, guardia, formato)
+        return ArchivoDescarga(nuevo['ruta'], borrar=True)
@@ -0,0 +1,265 @@
+# modules/importacion.py
+import hashlib
+import io
+import re
+import time
+import unicodedata
+from datetime import date
+import numpy as np
+import pandas as pd
+import streamlit as st
+from psycopg2.errors import UniqueViolation
+from database import get_cache, get_db_connection, tablas_escritas
+from metricas import medir_pagina
+from modules.catalogos import get_catalogo
+
+# Carga de partes históricos (las hojas Excel de cada mina) en bloque.
+# La validación se hace por columnas contra el catálogo (Series.map y máscaras,
+# sin recorrer filas) y la carga con COPY a una tabla temporal + un único INSERT ...
+# SELECT que toma el precio vigente en la fecha de cada consumo. Todo el archivo
+# entra en una transacción: o se importa completo o no se importa nada.
+
+TAM_COPY = 100_000
+
+# Cabeceras aceptadas (ya normalizadas: minúsculas, sin tildes, '_' entre palabras).
+# Incluye las del Excel de detalle que exporta CORE.
+ALIAS_COLUMNAS = {
+    'fecha': 'fecha',
+    'guardia': 'guardia', 'turno': 'guardia',
+    'labor': 'labor', 'frente': 'labor', 'codigo_labor': 'labor', 'ubicacion_labor': 'labor',
+    'insumo': 'insumo', 'material': 'insumo', 'detalle': 'insumo', 'material_detalle': 'insumo',
+    'cantidad': 'cantidad', 'cant_consumida': 'cantidad',
+    'avance': 'avance', 'avance_m': 'avance', 'avance_metros': 'avance',
+    'mineral': 'mineral_tm', 'mineral_tm': 'mineral_tm', 'tonelaje': 'mineral_tm',
+    'precio_unitario': 'precio_unitario',
+}
+GUARDIAS = {'dia': 'Día', 'd': 'Día', 'noche': 'Noche', 'n': 'Noche'}
+
+SQL_STAGING = """
+    CREATE TEMP TABLE importacion_consumo (
+        fecha DATE, guardia TEXT, frente_id INTEGER, insumo_id INTEGER, cantidad NUMERIC,
+        avance_metros NUMERIC, tonelaje NUMERIC, precio_unitario NUMERIC
+    ) ON COMMIT DROP
+"""
+COLUMNAS_STAGING = ['fecha', 'guardia', 'frente_id', 'insumo_id', 'cantidad',
+                    'avance_metros', 'tonelaje', 'precio_unitario']
+
+# Precio del archivo si lo trae; si no, el vigente en la fecha (insumos_precios)
+SQL_INSERTAR = """
+    INSERT INTO consumo_diario
+    (fecha, guardia, frente_id, insumo_id, cantidad, avance_metros, tonelaje, usuario_id, precio_unitario)
+    SELECT s.fecha, s.guardia, s.frente_id, s.insumo_id, s.cantidad, s.avance_metros, s.tonelaje, %s,
+           COALESCE(s.precio_unitario, p.precio, 0)
+    FROM importacion_consumo s
+    LEFT JOIN LATERAL (
+        SELECT v.precio FROM insumos_precios v
+        WHERE v.insumo_id = s.insumo_id AND v.vigente_desde <= s.fecha
+        ORDER BY v.vigente_desde DESC LIMIT 1
+    ) p ON true
+"""
+
+# Un archivo ya importado no vuelve a entrar (misma tabla que la cola de partes)
+SQL_RECIBIDO = "INSERT INTO partes_recibidos (clave, registros, creado_en) VALUES (%s, %s, now())"
+
+
+def _normalizar(texto):
+    """'Ubicación (Labor)' -> 'ubicacion_labor'"""
+    sin_tildes = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', sin_tildes.lower()).strip('_')
+
+
+def _clave_texto(serie):
+    """Texto comparable por columnas: sin tildes, minúsculas y espacios simples"""
+    return (serie.astype('string').str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+            .str.lower().str.replace(r'\s+', ' ', regex=True).str.strip())
+
+
+def leer_archivo(contenido, nombre):
+    """DataFrame con las columnas reconocidas, renombradas a los nombres internos"""
+    if nombre.lower().endswith(('.xlsx', '.xlsm')):
+        df = pd.read_excel(io.BytesIO(contenido), engine='openpyxl')
+    else:
+        # El Excel en español guarda CSV con ';' y coma decimal
+        cabecera = contenido[:contenido.find(b'\n')]
+        punto_coma = cabecera.count(b';') > cabecera.count(b',')
+        df = pd.read_csv(io.BytesIO(contenido), sep=';' if punto_coma else ',',
+                         decimal=',' if punto_coma else '.', encoding='utf-8-sig', low_memory=False)
+    columnas = {}
+    for col in df.columns:
+        interna = ALIAS_COLUMNAS.get(_normalizar(col))
+        if interna and interna not in columnas.values():
+            columnas[col] = interna
+    return df[list(columnas)].rename(columns=columnas)
+
+
+def validar(df, catalogo, hoy=None):
+    """
+    Valida todo el archivo de una vez contra el catálogo. Devuelve (validas,
+    rechazadas): validas con las columnas de COLUMNAS_STAGING; rechazadas con las
+    columnas del archivo, su número de fila y el motivo (el primero que aplica).
+    """
+    faltan = {'fecha', 'labor'} - set(df.columns)
+    if faltan or not {'insumo', 'avance', 'mineral_tm'} & set(df.columns):
+        raise ValueError("el archivo debe tener fecha, labor y al menos insumo+cantidad, avance o mineral")
+    hoy = pd.Timestamp(hoy or date.today())
+    n = len(df)
+    motivo = np.full(n, None, dtype=object)
+
+    def rechazar(mascara, texto):
+        mascara = pd.Series(mascara, index=df.index).fillna(False).to_numpy(dtype=bool) & pd.isna(motivo)
+        motivo[mascara] = texto
+
+    def columna(nombre):
+        return df[nombre] if nombre in df.columns else pd.Series([None] * n, index=df.index, dtype=object)
+
+    def numero(nombre):
+        original = columna(nombre)
+        valores = pd.to_numeric(original, errors='coerce')
+        rechazar(original.notna() & valores.isna(), f"{nombre}: no es un número")
+        rechazar(valores < 0, f"{nombre}: negativo")
+        return valores
+
+    # ISO (AAAA-MM-DD) o fecha de Excel primero; el resto como día/mes/año
+    original = columna('fecha')
+    fecha = pd.to_datetime(original, errors='coerce', format='ISO8601')
+    otras = fecha.isna() & original.notna() & ~original.astype(str).str.match(r'\d{4}-')
+    if otras.any():
+        fecha[otras] = pd.to_datetime(original[otras].astype(str), errors='coerce', dayfirst=True, format='mixed')
+    fecha = fecha.dt.normalize()
+    rechazar(fecha.isna(), "fecha inválida")
+    rechazar(fecha > hoy, "fecha futura")
+
+    # Labor con la misma normalización que insumos y guardia ("GALERÍA" = "galeria ")
+    frentes = pd.DataFrame([dict(f) for f in catalogo.frentes], columns=['id', 'codigo'])
+    codigos = dict(zip(_clave_texto(frentes['codigo']), frentes['id']))
+    frente_id = _clave_texto(columna('labor')).map(codigos)
+    rechazar(frente_id.isna(), "labor no existe en frentes")
+
+    guardia_txt = _clave_texto(columna('guardia'))
+    guardia = guardia_txt.map(GUARDIAS)
+    rechazar(guardia_txt.notna() & (guardia_txt != '') & guardia.isna(), "guardia no reconocida")
+
+    # Si un nombre se repite en el catálogo gana el insumo activo
+    nombres = pd.DataFrame([dict(i) for i in catalogo.insumos], columns=['id', 'nombre', 'activo']).sort_values('activo')
+    nombres = dict(zip(_clave_texto(nombres['nombre']), nombres['id']))
+    insumo_txt = _clave_texto(columna('insumo'))
+    # 'Solo Avance' es como CORE exporta los partes sin consumo de materiales
+    con_insumo = insumo_txt.notna() & (insumo_txt != '') & (insumo_txt != 'solo avance')
+    insumo_id = insumo_txt.map(nombres)
+    rechazar(con_insumo & insumo_id.isna(), "insumo no existe en insumos")
+
+    cantidad = numero('cantidad')
+    avance = numero('avance')
+    mineral = numero('mineral_tm')
+    precio = numero('precio_unitario')
+    rechazar(con_insumo & cantidad.isna(), "cantidad vacía")
+    rechazar(~con_insumo & ~((avance > 0) | (mineral > 0)), "fila sin insumo, avance ni mineral")
+
+    ok = pd.isna(motivo)
+    validas = pd.DataFrame({
+        'fecha': fecha,
+        'guardia': guardia,
+        'frente_id': frente_id.astype('Int64'),
+        'insumo_id': insumo_id.where(con_insumo).astype('Int64'),
+        'cantidad': cantidad.where(con_insumo, 0).fillna(0),
+        'avance_metros': avance.fillna(0),
+        'tonelaje': mineral.fillna(0),
+        'precio_unitario': precio,
+    })[ok]
+    rechazadas = df[~ok].copy()
+    rechazadas.insert(0, 'fila', rechazadas.index + 2)  # fila en la hoja (cabecera = 1)
+    rechazadas['motivo'] = motivo[~ok]
+    return validas, rechazadas
+
+
+def huella(contenido):
+    return "importacion:" + hashlib.sha256(contenido).hexdigest()
+
+
+def importar(validas, clave, usuario_id):
+    """
+    Carga las filas válidas en una sola transacción. Devuelve las filas
+    insertadas, o None si el archivo ya se había importado.
+    """
+    with get_db_connection() as conn:
+        conn.autocommit = False
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute(SQL_RECIBIDO, (clave, len(validas)))
+                    cur.execute(SQL_STAGING)
+                    for inicio in range(0, len(validas), TAM_COPY):
+                        buffer = io.StringIO()
+                        validas.iloc[inicio:inicio + TAM_COPY].to_csv(buffer, index=False, header=False,
+                                                                      date_format='%Y-%m-%d')
+                        buffer.seek(0)
+                        cur.copy_expert(f"COPY importacion_consumo ({', '.join(COLUMNAS_STAGING)}) "
+                                        "FROM STDIN WITH (FORMAT csv)", buffer)
+                    cur.execute(SQL_INSERTAR, (usuario_id,))
+                    insertadas = cur.rowcount
+        except UniqueViolation:
+            return None
+    get_cache().invalidar(tablas_escritas(SQL_INSERTAR))
+    return insertadas
+
+
+@medir_pagina("Importación")
+def show_importacion():
+    st.title("📥 Importar Partes Históricos")
+    st.caption("Archivos CSV o Excel con una fila por consumo. Columnas: fecha, guardia, labor, insumo, "
+               "cantidad, avance, mineral (y opcionalmente precio_unitario; si falta se usa el precio "
+               "vigente en la fecha). Cada archivo se importa completo o no se importa.")
+
+    catalogo = get_catalogo()
+    if catalogo is None:
+        return
+    archivos = st.file_uploader("Archivos", type=["csv", "xlsx"], accept_multiple_files=True)
+    validados = st.session_state.setdefault('importacion', {})
+
+    for archivo in archivos or []:
+        st.subheader(f"📄 {archivo.name}")
+        contenido = archivo.getvalue()
+        clave = huella(contenido)
+        # La validación se guarda por archivo y versión del catálogo (no se repite en cada rerun)
+        if validados.get(clave, (None,))[0] != catalogo.version:
+            inicio = time.perf_counter()
+            try:
+                validas, rechazadas = validar(leer_archivo(contenido, archivo.name), catalogo)
+            except Exception as e:
+                st.error(f"❌ No se pudo leer el archivo: {e}")
+                continue
+            validados[clave] = (catalogo.version, validas, rechazadas, time.perf_counter() - inicio, None)
+        _, validas, rechazadas, segundos, resultado = validados[clave]
+
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Filas válidas", f"{len(validas):,}")
+        c2.metric("Filas rechazadas", f"{len(rechazadas):,}")
+        if len(validas):
+            c3.metric("Periodo", f"{validas['fecha'].min():%d/%m/%Y} – {validas['fecha'].max():%d/%m/%Y}")
+        st.caption(f"Validado en {segundos:.1f} s")
+
+        if len(rechazadas):
+            with st.expander(f"⚠️ Ver filas rechazadas ({len(rechazadas):,})"):
+                st.dataframe(rechazadas['motivo'].value_counts().rename("filas"), width="stretch")
+                st.dataframe(rechazadas.head(200), width="stretch", hide_index=True)
+            st.download_button("📄 Descargar reporte de rechazos (CSV)",
+                               rechazadas.to_csv(index=False).encode('utf-8-sig'),
+                               f"rechazos_{archivo.name.rsplit('.', 1)[0]}.csv", "text/csv",
+                               key=f"rech_{clave}")
+
+        if resultado is not None:
+            st.success(resultado)
+        elif len(validas) and st.button(f"📥 Importar {len(validas):,} filas", key=f"imp_{clave}", type="primary"):
+            with st.spinner("Cargando..."):
+                inicio = time.perf_counter()
+                try:
+                    insertadas = importar(validas, clave, st.session_state.get('user_id'))
+                except Exception as e:
+                    st.error(f"❌ Error SQL: {e}. No se importó ninguna fila del archivo.")
+                    continue
+            if insertadas is None:
+                st.warning("⚠️ Este archivo ya fue importado antes; no se cargó de nuevo.")
+                continue
+            resultado = f"✅ {insertadas:,} filas importadas en {time.perf_counter() - inicio:.1f} s."
+            validados[clave] = validados[clave][:4] + (resultado,)
+            st.success(resultado)
@@ -2,35 +2,96 @@
 import streamlit as st
 import pandas as pd
 import time
-import yfinance as yf  # <--- IMPORTANTE: La nueva librería
-from database import run_query
-
-def obtener_datos_yahoo():
-    """Conecta con Yahoo Finance para traer Dólar y Oro"""
-    try:
-        # 1. Traer Dólar (PEN=X)
-        dolar_ticker = yf.Ticker("PEN=X")
-        dolar_data = dolar_ticker.history(period="1d")
-        if dolar_data.empty: return None, None
-        precio_dolar = float(dolar_data['Close'].iloc[-1])
-
-        # 2. Traer Oro (GC=F -> Futuros de Oro en USD/Onza)
-        oro_ticker = yf.Ticker("GC=F")
-        oro_data = oro_ticker.history(period="1d")
-        if oro_data.empty: return None, None
-        precio_oro_usd_oz = float(oro_data['Close'].iloc[-1])
-
-        # 3. Conversión: De USD/Onza a PEN/Gramo
-        # 1 Onza Troy = 31.1035 gramos
-        precio_oro_pen_oz = precio_oro_usd_oz * precio_dolar
-        precio_oro_pen_gramo = precio_oro_pen_oz / 31.1035
-
-        return round(precio_dolar, 3), round(precio_oro_pen_gramo, 2)
-
-    except Exception as e:
-        st.error(f"Error conectando a Yahoo Finance: {e}")
-        return None, None
+from database import run_query, run_batch
+from metricas import medir_pagina
+from modules.catalogos import get_catalogo, invalidar as invalidar_catalogo
+from modules import mercado
 
+COLUMNAS_INSUMO = ['nombre', 'unidad', 'precio', 'categoria', 'activo']
+
+SQL_ACTUALIZAR_INSUMOS = """
+    UPDATE insumos AS i SET
+        nombre = v.nombre, unidad = v.unidad, precio = v.precio::numeric,
+        categoria = v.categoria, activo = v.activo::int
+    FROM (VALUES %s) AS v(id, nombre, unidad, precio, categoria, activo)
+    WHERE i.id = v.id::int
+"""
+SQL_INSERTAR_INSUMOS = "INSERT INTO insumos (nombre, unidad, precio, categoria, activo) VALUES %s"
+SQL_DESACTIVAR_INSUMOS = "UPDATE insumos SET activo = 0 WHERE id = ANY(%s) AND activo <> 0"
+
+def _texto(valor):
+    """NULL de la BD llega como NaN / NA en pandas: a la BD vuelve como None, nunca como 'NaN'"""
+    return None if valor is None or pd.isna(valor) else str(valor)
+
+def _fila_insumo(valores):
+    """Tupla (nombre, unidad, precio, categoria, activo) lista para la BD (y comparable: sin NaN)"""
+    precio = valores.get('precio')
+    return (_texto(valores.get('nombre')), _texto(valores.get('unidad')),
+            0.0 if precio is None or pd.isna(precio) else float(precio),
+            _texto(valores.get('categoria')), 1 if valores.get('activo') else 0)
+
+def cambios_insumos(df_mostrado, estado_editor, actuales):
+    """
+    Traduce el estado del data_editor (edited_rows / added_rows / deleted_rows) en
+    las filas a actualizar, insertar y desactivar. Las posiciones del editor se
+    resuelven a ids con df_mostrado (la foto que vio el usuario) y cada insumo se
+    compara con su fila actual en `actuales` ({id: fila}). Ignora ediciones que dejan
+    el valor igual, filas sin nombre o categoría e insumos que ya no existen.
+    """
+    cambios = {'actualizar': [], 'insertar': [], 'desactivar': [], 'ignoradas': 0}
+    borradas = set(estado_editor.get('deleted_rows', []))
+
+    def fila_actual(pos):
+        return actuales.get(int(df_mostrado.iloc[pos]['id']))
+
+    for pos, editado in estado_editor.get('edited_rows', {}).items():
+        pos = int(pos)
+        if pos in borradas:
+            continue
+        original = fila_actual(pos)
+        if original is None:
+            cambios['ignoradas'] += 1
+            continue
+        nueva = {c: editado.get(c, original[c]) for c in COLUMNAS_INSUMO}
+        if not _texto(nueva['nombre']) or not _texto(nueva['categoria']):
+            cambios['ignoradas'] += 1
+        elif _fila_insumo(nueva) != _fila_insumo(original):
+            cambios['actualizar'].append((int(original['id']),) + _fila_insumo(nueva))
+
+    for nueva in estado_editor.get('added_rows', []):
+        if _texto(nueva.get('nombre')) and _texto(nueva.get('categoria')):
+            if nueva.get('activo') is None:
+                nueva = {**nueva, 'activo': True}
+            cambios['insertar'].append(_fila_insumo(nueva))
+        else:
+            cambios['ignoradas'] += 1
+
+    # Borrar = desactivar: consumo_diario guarda la historia de cada insumo
+    for pos in sorted(borradas):
+        original = fila_actual(pos)
+        if original is not None and original['activo']:
+            cambios['desactivar'].append((int(original['id']), original['nombre']))
+    return cambios
+
+def guardar_cambios_insumos(cambios):
+    """Aplica los cambios en una sola transacción. Devuelve True/False."""
+    sentencias = [(SQL_ACTUALIZAR_INSUMOS, cambios['actualizar']), (SQL_INSERTAR_INSUMOS, cambios['insertar'])]
+    if cambios['desactivar']:
+        sentencias.append((SQL_DESACTIVAR_INSUMOS, ([i for i, _ in cambios['desactivar']],)))
+    return run_batch(sentencias)
+
+def resumen_cambios(cambios):
+    """Texto con exactamente lo que se guardó"""
+    partes = []
+    if cambios['actualizar']:
+        partes.append(f"✏️ Modificados ({len(cambios['actualizar'])}): " + ", ".join(f[1] for f in cambios['actualizar']))
+    if cambios['insertar']:
+        partes.append(f"✨ Agregados ({len(cambios['insertar'])}): " + ", ".join(f[0] for f in cambios['insertar']))
+    if cambios['desactivar']:
+        partes.append(f"🗃️ Desactivados ({len(cambios['desactivar'])}): " + ", ".join(n for _, n in cambios['desactivar']))
+    return "  \n".join(partes)
+
+@medir_pagina("Parámetros")
 def show_maestros():
     st.title("⚙️ Parámetros del Sistema")
 
@@ -41,29 +102,32 @@ def show_maestros():
         del st.session_state['mensaje_exito']
 
     # --- VARIABLES ECONÓMICAS ---
-    # 1. Obtenemos valores actuales de la Base de Datos
-    res_dol = run_query("SELECT valor FROM configuracion WHERE clave='DOLAR_CAMBIO'")
-    val_dol = float(res_dol[0]['valor']) if res_dol else 3.75
-    res_oro = run_query("SELECT valor FROM configuracion WHERE clave='PRECIO_ORO_GRAMO'")
-    val_oro = float(res_oro[0]['valor']) if res_oro else 260.00
+    # 1. Valores actuales (catálogo en memoria; cada escritura de abajo lo invalida)
+    catalogo = get_catalogo()
+    if catalogo is None:
+        return
+    val_dol = catalogo.parametro('DOLAR_CAMBIO', 3.75)
+    val_oro = catalogo.parametro('PRECIO_ORO_GRAMO', 260.00)
     
     with st.expander("💰 Variables Económicas (Dólar y Oro)", expanded=False):
-        st.caption("Puedes escribir manualmente o descargar de internet.")
+        st.caption("Se actualizan solos en segundo plano; también puedes pedirlo ahora o escribirlos a mano.")
         
-        # --- BOTÓN MÁGICO DE INTERNET ---
+        # --- ACTUALIZACIÓN DESDE INTERNET (en segundo plano, la pantalla no espera) ---
+        actualizador = mercado.get_actualizador()
         col_btn, col_info = st.columns([1, 2])
         with col_btn:
-            if st.button("🔄 Actualizar desde Internet", type="secondary"):
-                with st.spinner("Conectando con Bolsa de Valores..."):
-                    nuevo_dolar, nuevo_oro = obtener_datos_yahoo()
-                    if nuevo_dolar and nuevo_oro:
-                        # Guardamos en BD automáticamente
-                        run_query("INSERT INTO configuracion (clave, valor) VALUES ('DOLAR_CAMBIO', %s) ON CONFLICT (clave) DO UPDATE SET valor = EXCLUDED.valor", (nuevo_dolar,))
-                        run_query("INSERT INTO configuracion (clave, valor) VALUES ('PRECIO_ORO_GRAMO', %s) ON CONFLICT (clave) DO UPDATE SET valor = EXCLUDED.valor", (nuevo_oro,))
-                        st.session_state['mensaje_exito'] = f"✅ Actualizado: Dólar S/{nuevo_dolar} | Oro S/{nuevo_oro}/gr"
-                        st.rerun()
-                    else:
-                        st.error("No se pudo obtener datos de internet. Revisa tu conexión.")
+            if st.button("🔄 Actualizar desde Internet", type="secondary", disabled=actualizador is None):
+                actualizador.solicitar()
+                st.toast("Actualización solicitada: los valores nuevos aparecerán en unos segundos.", icon="🔄")
+        with col_info:
+            if actualizador is None:
+                st.caption("Actualización automática desactivada ([mercado] proveedor).")
+            else:
+                estado = "⏳ consultando..." if actualizador.en_curso else (
+                    f"✅ {actualizador.ultimo_exito:%d/%m %H:%M}" if actualizador.ultimo_exito else "—")
+                st.caption(f"Fuente: **{actualizador.proveedor.nombre}** · Última actualización: {estado}")
+                if actualizador.error:
+                    st.warning(f"⚠️ Último intento fallido: {actualizador.error}")
 
         # FORMULARIO MANUAL (Por si no hay internet o quieren ajustar)
         with st.form("vars"):
@@ -72,29 +136,37 @@ def show_maestros():
             no = c2.number_input("Oro (S/ gramo)", value=val_oro, step=0.1, format="%.2f")
             
             if st.form_submit_button("💾 Guardar Manualmente"):
-                run_query("INSERT INTO configuracion (clave, valor) VALUES ('DOLAR_CAMBIO', %s) ON CONFLICT (clave) DO UPDATE SET valor = EXCLUDED.valor", (nd,))
-                run_query("INSERT INTO configuracion (clave, valor) VALUES ('PRECIO_ORO_GRAMO', %s) ON CONFLICT (clave) DO UPDATE SET valor = EXCLUDED.valor", (no,))
-                st.session_state['mensaje_exito'] = "Variables guardadas manualmente."
-                st.rerun()
+                if mercado.guardar_cotizacion(nd, no, "manual"):
+                    st.session_state['mensaje_exito'] = "Variables guardadas manualmente."
+                    st.rerun()
+
+        hist = mercado.historial()
+        if hist:
+            st.caption("Historial de cotizaciones")
+            st.dataframe(pd.DataFrame(hist), width="stretch", hide_index=True, height=200)
 
     st.divider()
 
     # --- GESTIÓN DE INSUMOS ---
     st.subheader("1. Parámetros de Insumos")
     
-    data = run_query("SELECT id, nombre, unidad, precio, categoria, activo FROM insumos ORDER BY categoria, nombre")
-    df_ins = pd.DataFrame(data) if data else pd.DataFrame(columns=['id', 'nombre', 'unidad', 'precio', 'categoria', 'activo'])
+    # Mientras haya ediciones pendientes el editor sigue sobre la misma foto: sus
+    # posiciones (edited_rows / deleted_rows) se refieren a ella aunque el catálogo se recargue
+    estado_editor = st.session_state.get("editor_insumos", {})
+    pendientes = any(estado_editor.get(k) for k in ('edited_rows', 'added_rows', 'deleted_rows'))
+    if not pendientes or 'insumos_mostrados' not in st.session_state:
+        df_ins = pd.DataFrame(catalogo.insumos, columns=['id', 'nombre', 'unidad', 'precio', 'categoria', 'activo'])
+        if not df_ins.empty:
+            df_ins['activo'] = df_ins['activo'].astype(bool)
+            df_ins['id'] = df_ins['id'].astype(float)
+        st.session_state['insumos_mostrados'] = df_ins
+    df_ins = st.session_state['insumos_mostrados']
 
-    if not df_ins.empty:
-        df_ins['precio'] = df_ins['precio'].astype(float)
-        df_ins['activo'] = df_ins['activo'].astype(bool)
-        df_ins['id'] = df_ins['id'].astype(float)
-
-    edited_ins = st.data_editor(
+    st.data_editor(
         df_ins, 
         key="editor_insumos", 
         num_rows="dynamic", 
-        use_container_width=True,
+        width="stretch",
         column_config={
             "id": st.column_config.NumberColumn(disabled=True),
             "precio": st.column_config.NumberColumn(format="S/ %.2f"),
@@ -108,28 +180,18 @@ def show_maestros():
     )
     
     if st.button("💾 Guardar Cambios en Insumos", type="primary"):
-        try:
-            cambios = 0
-            nuevos_nombres = [] 
-            for index, row in edited_ins.iterrows():
-                es_nuevo = pd.isna(row['id']) or row['id'] == 0
-                nombre = row['nombre']; unidad = row['unidad']; precio = row['precio']; cat = row['categoria']; activo = 1 if row['activo'] else 0
-                
-                if nombre and cat: 
-                    if es_nuevo:
-                        run_query("INSERT INTO insumos (nombre, unidad, precio, categoria, activo) VALUES (%s,%s,%s,%s,%s)", (nombre, unidad, precio, cat, activo))
-                        nuevos_nombres.append(nombre)
-                        cambios += 1
-                    else:
-                        run_query("UPDATE insumos SET nombre=%s, unidad=%s, precio=%s, categoria=%s, activo=%s WHERE id=%s", (nombre, unidad, precio, cat, activo, row['id']))
-                        cambios += 1
-            
-            if cambios > 0:
-                if nuevos_nombres: st.session_state['mensaje_exito'] = f"✨ Se agregaron: {', '.join(nuevos_nombres)}"
-                else: st.session_state['mensaje_exito'] = "✅ Datos guardados."
-                st.rerun()
-            else: st.info("Sin cambios.")
-        except Exception as e: st.error(f"Error: {e}")
+        # Solo lo que el usuario tocó, según el estado del editor (no se recorre toda la tabla)
+        cambios = cambios_insumos(df_ins, st.session_state.get("editor_insumos", {}), catalogo.insumos_por_id)
+        if cambios['ignoradas']:
+            st.warning(f"⚠️ {cambios['ignoradas']} fila(s) sin nombre o categoría no se guardaron.")
+        if not (cambios['actualizar'] or cambios['insertar'] or cambios['desactivar']):
+            st.info("Sin cambios.")
+        elif guardar_cambios_insumos(cambios):
+            invalidar_catalogo()
+            st.session_state['mensaje_exito'] = resumen_cambios(cambios)
+            # El editor arranca limpio sobre los datos nuevos
+            del st.session_state["editor_insumos"], st.session_state['insumos_mostrados']
+            st.rerun()
 
     st.divider()
 
@@ -137,8 +199,8 @@ def show_maestros():
     st.subheader("2. Parámetros de Labores")
     col_tab, col_form = st.columns([1, 1])
     with col_tab:
-        df_frentes = pd.DataFrame(run_query("SELECT codigo, tipo, estado, zona FROM frentes ORDER BY codigo"))
-        st.dataframe(df_frentes, use_container_width=True, height=300)
+        df_frentes = pd.DataFrame(catalogo.frentes, columns=['codigo', 'tipo', 'estado', 'zona'])
+        st.dataframe(df_frentes, width="stretch", height=300)
     with col_form:
         opcion = st.radio("Acción", ["Crear Nueva", "Editar Existente"], horizontal=True)
         tipos = ["Tajeo", "Subnivel", "Galería", "Chimenea", "Rampa", "Pique", "Crucero", "ByPass", "Cámara"]
@@ -147,18 +209,20 @@ def show_maestros():
                 nc = st.text_input("Código"); nt = st.selectbox("Tipo", tipos); nz = st.text_input("Zona/Nivel")
                 if st.form_submit_button("Crear"):
                     if run_query("INSERT INTO frentes (codigo, tipo, zona, estado) VALUES (%s,%s,%s,'ACTIVO')", (nc,nt,nz)):
+                        invalidar_catalogo()
                         st.session_state['mensaje_exito'] = f"✅ Labor {nc} creada."
                         st.rerun()
         else:
-            ls = [f['codigo'] for f in run_query("SELECT codigo FROM frentes")]
+            ls = [f['codigo'] for f in catalogo.frentes]
             sel = st.selectbox("Seleccionar Labor", ls)
             if sel:
-                curr = run_query("SELECT * FROM frentes WHERE codigo=%s", (sel,))[0]
+                curr = catalogo.frente_por_codigo(sel)
                 with st.form("edit_labor"):
                     et = st.selectbox("Tipo", tipos, index=tipos.index(curr['tipo']) if curr['tipo'] in tipos else 0)
                     es = st.selectbox("Estado", ["ACTIVO", "STANDBY", "CERRADO"], index=["ACTIVO", "STANDBY", "CERRADO"].index(curr['estado']))
                     ez = st.text_input("Zona", value=curr['zona'] if curr['zona'] else "")
                     if st.form_submit_button("Actualizar"):
                         run_query("UPDATE frentes SET tipo=%s, estado=%s, zona=%s WHERE codigo=%s", (et,es,ez,sel))
+                        invalidar_catalogo()
                         st.session_state['mensaje_exito'] = f"✅ Labor {sel} actualizada."
                         st.rerun()
\ No newline at end of file
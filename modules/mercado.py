@@ -0,0 +1,218 @@
+# modules/mercado.py
+import json
+import threading
+from abc import ABC, abstractmethod
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from datetime import datetime
+import streamlit as st
+from database import run_query, run_batch, config
+from modules.catalogos import invalidar as invalidar_catalogo
+
+# Dólar y oro se consultan en segundo plano y quedan en `configuracion` (último
+# valor) y en `configuracion_historial` (cada lectura con su hora y fuente).
+# Las pantallas solo leen lo guardado: nunca esperan a internet.
+
+GRAMOS_POR_ONZA = 31.1035  # onza troy
+
+
+class ProveedorMercado(ABC):
+    """Fuente de cotizaciones. Cada método devuelve un float o lanza una excepción."""
+    nombre = "base"
+
+    @abstractmethod
+    def dolar(self):
+        """Soles por dólar (PEN/USD)"""
+
+    @abstractmethod
+    def oro_usd_onza(self):
+        """Precio del oro en USD por onza troy"""
+
+
+class ProveedorYahoo(ProveedorMercado):
+    nombre = "yahoo"
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+
+    def _cierre(self, ticker):
+        import yfinance as yf  # solo lo necesita este proveedor
+        datos = yf.Ticker(ticker).history(period="1d", timeout=self.timeout)
+        if datos.empty:
+            raise ValueError(f"Yahoo no devolvió datos para {ticker}")
+        return float(datos['Close'].iloc[-1])
+
+    def dolar(self):
+        return self._cierre("PEN=X")
+
+    def oro_usd_onza(self):
+        return self._cierre("GC=F")  # futuros de oro, USD/onza
+
+
+class ProveedorArchivo(ProveedorMercado):
+    """Lee {"dolar": 3.75, "oro_usd_onza": 2300} de un JSON local (uso sin internet)"""
+    nombre = "archivo"
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+
+    def _leer(self, clave):
+        with open(self.ruta, encoding="utf-8") as f:
+            return float(json.load(f)[clave])
+
+    def dolar(self):
+        return self._leer("dolar")
+
+    def oro_usd_onza(self):
+        return self._leer("oro_usd_onza")
+
+
+class ProveedorFijo(ProveedorMercado):
+    """Valores constantes (demos y pruebas)"""
+    nombre = "fijo"
+
+    def __init__(self, dolar=3.75, oro_usd_onza=2300.0):
+        self._dolar = float(dolar)
+        self._oro = float(oro_usd_onza)
+
+    def dolar(self):
+        return self._dolar
+
+    def oro_usd_onza(self):
+        return self._oro
+
+
+def crear_proveedor(cfg):
+    tipo = cfg.get("proveedor", "yahoo")
+    if tipo == "yahoo":
+        return ProveedorYahoo(timeout=float(cfg.get("timeout", 10)))
+    if tipo == "archivo":
+        return ProveedorArchivo(cfg.get("archivo", "mercado.json"))
+    if tipo == "fijo":
+        return ProveedorFijo(cfg.get("dolar", 3.75), cfg.get("oro_usd_onza", 2300.0))
+    return None
+
+
+SQL_GUARDAR_PARAMETRO = """
+    INSERT INTO configuracion (clave, valor) VALUES (%s, %s)
+    ON CONFLICT (clave) DO UPDATE SET valor = EXCLUDED.valor
+"""
+SQL_HISTORIAL = "INSERT INTO configuracion_historial (clave, valor, fuente) VALUES %s"
+
+
+def guardar_cotizacion(dolar, oro_pen_gramo, fuente):
+    """Último valor en configuracion + una fila por clave en el historial, en una transacción"""
+    ok = run_batch([
+        (SQL_GUARDAR_PARAMETRO, ('DOLAR_CAMBIO', dolar)),
+        (SQL_GUARDAR_PARAMETRO, ('PRECIO_ORO_GRAMO', oro_pen_gramo)),
+        (SQL_HISTORIAL, [('DOLAR_CAMBIO', dolar, fuente), ('PRECIO_ORO_GRAMO', oro_pen_gramo, fuente)]),
+    ])
+    if ok:
+        invalidar_catalogo()
+    return ok
+
+
+def historial(limite=20):
+    """Últimas cotizaciones guardadas (más nuevas primero)"""
+    return run_query("""
+        SELECT obtenido_en, clave, valor::float8 AS valor, fuente
+        FROM configuracion_historial ORDER BY obtenido_en DESC, id DESC LIMIT %s
+    """, (limite,), cache=False) or []
+
+
+class ActualizadorMercado:
+    """Hilo que refresca las cotizaciones cada `intervalo` segundos o cuando se le pide"""
+
+    def __init__(self, proveedor, intervalo=3600, timeout=10, reintentos=2, espera=2, retraso_inicial=30):
+        self.proveedor = proveedor
+        self.intervalo = intervalo
+        self.retraso_inicial = retraso_inicial
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.espera = espera
+        self.ultimo_intento = None
+        self.ultimo_exito = None
+        self.error = None
+        self.en_curso = False
+        self._pedido = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="mercado", daemon=True)
+                self._hilo.start()
+
+    def solicitar(self):
+        """Pide una actualización inmediata (no espera el resultado)"""
+        self._pedido.set()
+
+    def _bucle(self):
+        # Si el último dato guardado es reciente (p. ej. tras reiniciar el servidor) no se repite
+        edad = run_query("SELECT EXTRACT(EPOCH FROM now() - MAX(obtenido_en))::float8 AS s FROM configuracion_historial", cache=False)
+        edad = edad[0]['s'] if edad and edad[0]['s'] is not None else None
+        # Nunca antes de `retraso_inicial`: importar el proveedor (yfinance arrastra pandas,
+        # numpy...) compite por el GIL con el primer render del login
+        espera = self.retraso_inicial if edad is None else max(self.retraso_inicial, self.intervalo - edad)
+        while True:
+            self._pedido.wait(espera)
+            self._pedido.clear()
+            self.actualizar()
+            espera = self.intervalo
+
+    def _con_reintentos(self, funcion):
+        for intento in range(self.reintentos + 1):
+            try:
+                return funcion()
+            except Exception:
+                if intento == self.reintentos:
+                    raise
+                time.sleep(self.espera * (intento + 1))
+
+    def actualizar(self):
+        """Consulta ambas cotizaciones en paralelo y las guarda. Devuelve (dolar, oro) o None."""
+        self.en_curso = True
+        self.ultimo_intento = datetime.now()
+        # Tiempo máximo de una fuente contando todos sus reintentos y pausas
+        limite = self.timeout * (self.reintentos + 1) + self.espera * self.reintentos * (self.reintentos + 1) / 2
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="mercado-fuente")
+        try:
+            f_dolar = executor.submit(self._con_reintentos, self.proveedor.dolar)
+            f_oro = executor.submit(self._con_reintentos, self.proveedor.oro_usd_onza)
+            dolar = f_dolar.result(timeout=limite)
+            oro_pen_gramo = f_oro.result(timeout=limite) * dolar / GRAMOS_POR_ONZA
+        except FuturesTimeout:
+            self.error = f"{self.proveedor.nombre}: sin respuesta en {limite:.0f}s"
+            return None
+        except Exception as e:
+            self.error = f"{self.proveedor.nombre}: {e}"
+            return None
+        finally:
+            # Un hilo colgado no bloquea el ciclo: queda abandonado hasta que la fuente responda
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.en_curso = False
+
+        dolar, oro = round(dolar, 3), round(oro_pen_gramo, 2)
+        if not guardar_cotizacion(dolar, oro, self.proveedor.nombre):
+            self.error = "no se pudo guardar en la base de datos"
+            return None
+        self.error = None
+        self.ultimo_exito = datetime.now()
+        return dolar, oro
+
+
+@st.cache_resource(show_spinner=False)
+def get_actualizador():
+    """Actualizador del proceso (None si [mercado] proveedor = "ninguno")"""
+    cfg = config("mercado")
+    proveedor = crear_proveedor(cfg)
+    if proveedor is None:
+        return None
+    return ActualizadorMercado(
+        proveedor,
+        intervalo=float(cfg.get("intervalo", 3600)),
+        timeout=float(cfg.get("timeout", 10)),
+        reintentos=int(cfg.get("reintentos", 2)),
+        retraso_inicial=float(cfg.get("retraso_inicial", 30)),
+    )
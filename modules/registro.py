@@ -1,31 +1,138 @@
 # modules/registro.py
 import streamlit as st
 import pandas as pd
+import json
+import sqlite3
 import time
 from datetime import datetime
-from database import run_query
+from database import run_query, run_batch, config
+from metricas import medir_pagina
+from modules.catalogos import get_catalogo
+from modules.cola_partes import get_cola
 
+# Filas por página del historial (secrets.toml: [registro] tam_pagina_historial)
+TAM_PAGINA_HISTORIAL = int(config("registro").get("tam_pagina_historial", 50))
+
+SQL_INSERT_CONSUMO = """
+    INSERT INTO consumo_diario
+    (fecha, guardia, frente_id, insumo_id, cantidad, avance_metros, tonelaje, usuario_id, precio_unitario)
+    VALUES %s
+"""
+
+SQL_HISTORIAL = """
+    SELECT c.id, c.fecha, c.guardia, f.codigo as labor, i.nombre as insumo, c.cantidad, u.username
+    FROM consumo_diario c
+    LEFT JOIN frentes f ON c.frente_id = f.id
+    LEFT JOIN insumos i ON c.insumo_id = i.id
+    LEFT JOIN usuarios u ON c.usuario_id = u.id
+    WHERE {where}
+    ORDER BY c.id DESC
+    LIMIT %s
+"""
+
+def consultar_historial(frente_id=None, antes_de=None, limite=50, cache=True):
+    """
+    Una página del historial de los últimos 7 días, del registro más nuevo al más antiguo.
+    Paginación por keyset: `antes_de` es el último id de la página anterior.
+    Devuelve (filas, hay_mas).
+    """
+    condiciones = ["c.fecha >= CURRENT_DATE - INTERVAL '7 days'"]
+    params = []
+    if frente_id is not None:
+        condiciones.append("c.frente_id = %s")
+        params.append(frente_id)
+    if antes_de is not None:
+        condiciones.append("c.id < %s")
+        params.append(antes_de)
+    # Pedimos una fila de más solo para saber si existe otra página
+    filas = run_query(SQL_HISTORIAL.format(where=" AND ".join(condiciones)), params + [limite + 1], cache=cache) or []
+    return filas[:limite], len(filas) > limite
+
+def preparar_parte(fecha, guardia, frente_id, consumos, avance, tm, insumos_map, usuario_id):
+    """
+    Arma las filas del parte para consumo_diario sin tocar la BD. Cada fila lleva el
+    precio vigente del insumo (los costos salen de ahí: la vista costos). insumos_map
+    es {id_insumo: fila de insumos}; el avance y el mineral van solo en la primera
+    fila para no duplicarlos.
+    """
+    filas = []
+    for iid, qty in consumos.items():
+        if qty > 0:
+            av_val = avance if not filas else 0
+            tm_val = tm if not filas else 0
+            precio = float(insumos_map.get(iid, {}).get('precio', 0))
+            filas.append((fecha, guardia, frente_id, iid, qty, av_val, tm_val, usuario_id, precio))
+
+    # Si solo hubo avance/mineral SIN consumo de materiales
+    if not filas and (avance > 0 or tm > 0):
+        filas.append((fecha, guardia, frente_id, None, 0, avance, tm, usuario_id, 0))
+
+    return filas
+
+def guardar_parte(filas):
+    """Escribe el parte completo en una sola sentencia. Devuelve los registros guardados o None si falló."""
+    if not filas:
+        return 0
+    ok = run_batch([(SQL_INSERT_CONSUMO, filas)])
+    return len(filas) if ok else None
+
+def registrar_parte(filas):
+    """
+    Con la cola local activa, el parte queda en disco y se confirma al instante
+    (se envía en segundo plano). Si el envío no está corriendo (p. ej. migraciones
+    pendientes) se guarda directo en la BD: nada queda varado en este equipo.
+    Devuelve (registros, en_cola) o (None, False).
+    """
+    cola = get_cola()
+    if cola is not None and cola.activa:
+        try:
+            cola.encolar(filas)
+            return len(filas), True
+        except sqlite3.Error as e:
+            st.warning(f"⚠️ No se pudo usar la cola local ({e}); guardando directo en la base de datos.")
+    return guardar_parte(filas), False
+
+def mostrar_estado_cola():
+    """Partes aún no enviados al servidor y los que la BD rechazó"""
+    cola = get_cola()
+    if cola is None:
+        return
+    pendientes, rechazados = cola.estado()
+    if pendientes and not cola.activa:
+        st.warning(f"⚠️ {pendientes} parte(s) guardados en este equipo esperan envío, pero el envío en segundo "
+                   "plano está detenido (migraciones pendientes). Saldrán cuando el administrador las aplique.")
+    elif pendientes:
+        detalle = f" Último intento: {cola.error}" if cola.error else ""
+        st.info(f"⏳ {pendientes} parte(s) guardados en este equipo, pendientes de envío al servidor.{detalle}")
+    if rechazados:
+        st.error(f"❌ {rechazados} parte(s) rechazados por la base de datos. Revise el detalle y reintente.")
+        with st.expander("Ver partes rechazados"):
+            for creado_en, texto, error in cola.rechazados():
+                filas = json.loads(texto)
+                st.caption(f"{creado_en} · parte del {filas[0][0]} · guardia {filas[0][1]} · {len(filas)} registros")
+                st.code(error)
+            if st.button("🔁 Reintentar envío", key="btn_reintentar_cola"):
+                cola.reintentar()
+                st.rerun()
+
+@medir_pagina("Registros")
 def show_registro():
     st.title("📝 Parte Diario de Mina")
     st.caption(f"Responsable: **{st.session_state.get('nombre', 'Usuario')}**")
     
-    # Cargar Datos Maestros
-    frentes_data = run_query("SELECT id, codigo FROM frentes WHERE estado='ACTIVO'")
-    if not frentes_data:
+    # Datos Maestros: del catálogo en memoria (sin consultas en cada rerun)
+    catalogo = get_catalogo()
+    if catalogo is None:
+        return
+    if not catalogo.frentes_activos:
         st.warning("⚠️ No hay labores activas. Ve al Panel Maestro para crearlas.")
         return
 
-    frentes_codigos = [f['codigo'] for f in frentes_data]
-    # Traemos también el precio para calcular costos
-    insumos_db = run_query("SELECT * FROM insumos WHERE activo=1 ORDER BY categoria, nombre")
-    
-    # Mapa de precios para cálculo rápido {id_insumo: precio}
-    precios_map = {i['id']: float(i['precio']) for i in insumos_db}
-    # Mapa de nombres para la tabla 'costos' {id_insumo: nombre}
-    nombres_map = {i['id']: i['nombre'] for i in insumos_db}
-    # Mapa de categorias y unidades
-    cat_map = {i['id']: i['categoria'] for i in insumos_db}
-    uni_map = {i['id']: i['unidad'] for i in insumos_db}
+    mostrar_estado_cola()
+
+    frentes_codigos = [f['codigo'] for f in catalogo.frentes_activos]
+    insumos_db = catalogo.insumos_activos
+    insumos_map = catalogo.insumos_por_id
     
     tab_new, tab_hist = st.tabs(["📄 NUEVO REGISTRO", "🗑️ HISTORIAL / CORREGIR"])
 
@@ -60,111 +167,80 @@ def show_registro():
             render_tab("Aceros", t4)
 
             if st.form_submit_button("💾 Guardar Parte", type="primary"):
-                try:
-                    # Obtener IDs necesarios
-                    fid_res = run_query("SELECT id FROM frentes WHERE codigo=%s", (labor,))
-                    if not fid_res: st.error("Error: Labor no encontrada"); st.stop()
-                    fid = fid_res[0]['id']
-                    
-                    # Intentamos obtener usuario, si falla usamos default
-                    try:
-                        uid_res = run_query("SELECT id FROM usuarios WHERE username=%s", (st.session_state.get('usuario'),))
-                        uid = uid_res[0]['id'] if uid_res else None
-                    except:
-                        uid = None
-                    
-                    saved_count = 0
-                    
-                    # 1. Guardar Insumos (DOBLE ESCRITURA)
-                    for iid, qty in consumos.items():
-                        if qty > 0:
-                            # Valores para evitar duplicar avance/tm en cada fila
-                            av_val = avance if saved_count == 0 else 0
-                            tm_val = tm if saved_count == 0 else 0
-                            
-                            # A) Insertar en la tabla BUENA (Relacional)
-                            run_query("""
-                                INSERT INTO consumo_diario 
-                                (fecha, guardia, frente_id, insumo_id, cantidad, avance_metros, tonelaje, usuario_id)
-                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                            """, (fecha, guardia, fid, iid, qty, av_val, tm_val, uid))
-                            
-                            # B) Insertar en la tabla COSTOS (Para el Dashboard actual)
-                            # Calculamos precio total
-                            precio_unit = precios_map.get(iid, 0)
-                            total_soles = qty * precio_unit
-                            nom_insumo = nombres_map.get(iid, 'Desconocido')
-                            cat_insumo = cat_map.get(iid, 'General')
-                            uni_insumo = uni_map.get(iid, 'und')
-                            
-                            run_query("""
-                                INSERT INTO costos 
-                                (fecha, guardia, labor, categoria, detalle, unidad, cantidad, precio_total, avance, mineral_tm, usuario)
-                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            """, (fecha, guardia, labor, cat_insumo, nom_insumo, uni_insumo, qty, total_soles, av_val, tm_val, st.session_state.get('usuario','App')))
-                            
-                            saved_count += 1
-                    
-                    # 2. Si solo hubo avance/mineral SIN consumo de materiales
-                    if saved_count == 0 and (avance > 0 or tm > 0):
-                        # A) Tabla Buena
-                        run_query("""
-                            INSERT INTO consumo_diario 
-                            (fecha, guardia, frente_id, insumo_id, cantidad, avance_metros, tonelaje, usuario_id)
-                            VALUES (%s, %s, %s, NULL, 0, %s, %s, %s)
-                        """, (fecha, guardia, fid, avance, tm, uid))
-                        
-                        # B) Tabla Costos
-                        run_query("""
-                            INSERT INTO costos 
-                            (fecha, guardia, labor, categoria, detalle, unidad, cantidad, precio_total, avance, mineral_tm, usuario)
-                            VALUES (%s, %s, %s, 'AVANCE', 'Solo Avance', 'm', 0, 0, %s, %s, %s)
-                        """, (fecha, guardia, labor, avance, tm, st.session_state.get('usuario','App')))
-                        
-                        saved_count += 1
-                        
-                    if saved_count > 0:
+                filas = preparar_parte(
+                    fecha, guardia, catalogo.frente_por_codigo(labor)['id'], consumos, avance, tm, insumos_map,
+                    st.session_state.get('user_id')
+                )
+                if not filas:
+                    st.warning("⚠️ El registro está vacío. Ingrese algún valor.")
+                else:
+                    saved_count, en_cola = registrar_parte(filas)
+                    if saved_count and en_cola:
+                        st.success(f"✅ Parte guardado ({saved_count} registros). Se enviará al servidor en segundo plano.")
+                        time.sleep(1); st.rerun()
+                    elif saved_count:
                         st.success(f"✅ Guardado exitosamente ({saved_count} registros).")
                         time.sleep(1); st.rerun()
                     else:
-                        st.warning("⚠️ El registro está vacío. Ingrese algún valor.")
-                        
-                except Exception as e:
-                    st.error(f"Error al guardar: {e}")
+                        st.error("Error al guardar: no se registró ninguna fila del parte.")
 
     # --- PESTAÑA 2: HISTORIAL (Leyendo de la tabla buena) ---
     with tab_hist:
         st.subheader("🕵️ Últimos 7 días")
-        filtro = st.selectbox("Filtrar por Labor", ["TODAS"] + frentes_codigos)
+        c_fil, c_tam = st.columns([3, 1])
+        filtro = c_fil.selectbox("Filtrar por Labor", ["TODAS"] + frentes_codigos)
+        tam_pagina = c_tam.selectbox("Filas por página", [25, 50, 100, 200],
+                                     index=[25, 50, 100, 200].index(TAM_PAGINA_HISTORIAL) if TAM_PAGINA_HISTORIAL in [25, 50, 100, 200] else 1)
+        
+        # Pila de cursores (último id de cada página ya vista); se reinicia al cambiar el filtro
+        if st.session_state.get('hist_filtro') != (filtro, tam_pagina):
+            st.session_state['hist_filtro'] = (filtro, tam_pagina)
+            st.session_state['hist_cursores'] = [None]
+        cursores = st.session_state['hist_cursores']
         
-        q = """
-            SELECT c.id, c.fecha, c.guardia, f.codigo as labor, i.nombre as insumo, c.cantidad, u.username
-            FROM consumo_diario c
-            LEFT JOIN frentes f ON c.frente_id = f.id
-            LEFT JOIN insumos i ON c.insumo_id = i.id
-            LEFT JOIN usuarios u ON c.usuario_id = u.id
-            WHERE c.fecha >= CURRENT_DATE - INTERVAL '7 days'
-            ORDER BY c.id DESC
-        """
-        df_hist = pd.DataFrame(run_query(q))
+        frente_id = catalogo.frente_por_codigo(filtro)['id'] if filtro != "TODAS" else None
+        filas, hay_mas = consultar_historial(frente_id, cursores[-1], tam_pagina)
         
-        if not df_hist.empty:
-            if filtro != "TODAS":
-                df_hist = df_hist[df_hist['labor'] == filtro]
+        if filas:
+            df_hist = pd.DataFrame(filas)
+            df_hist['insumo'] = df_hist['insumo'].fillna("---")
+            df_hist.insert(0, 'borrar', False)
+            
+            # Las marcas del editor van por posición: se descartan al cambiar de página o
+            # después de borrar, para que no caigan sobre otras filas
+            clave_editor = f"hist_editor_{len(cursores)}_{filtro}"
+            editado = st.data_editor(
+                df_hist,
+                key=clave_editor,
+                hide_index=True,
+                width="stretch",
+                disabled=[c for c in df_hist.columns if c != 'borrar'],
+                column_config={
+                    "borrar": st.column_config.CheckboxColumn("🗑️", help="Marcar para eliminar"),
+                    "id": None,
+                    "fecha": st.column_config.DateColumn("📅 Fecha"),
+                    "guardia": "Guardia",
+                    "labor": "📍 Labor",
+                    "insumo": "📦 Insumo",
+                    "cantidad": st.column_config.NumberColumn("Cantidad"),
+                    "username": "👤 Usuario",
+                }
+            )
+            
+            c_prev, c_pag, c_next, c_del = st.columns([1, 1, 1, 2])
+            if c_prev.button("⬅️ Más recientes", disabled=len(cursores) == 1):
+                st.session_state.pop(clave_editor, None); cursores.pop(); st.rerun()
+            c_pag.caption(f"Página {len(cursores)}")
+            if c_next.button("Más antiguos ➡️", disabled=not hay_mas):
+                st.session_state.pop(clave_editor, None); cursores.append(int(df_hist['id'].iloc[-1])); st.rerun()
             
-            for i, row in df_hist.iterrows():
-                c1, c2, c3, c4, c5 = st.columns([2,2,3,2,1])
-                c1.write(f"📅 {row['fecha']}")
-                c2.write(f"📍 **{row['labor']}**")
-                item_nom = row['insumo'] if pd.notna(row['insumo']) else "---"
-                c3.write(f"📦 {item_nom}: **{row['cantidad']}**")
-                c4.caption(f"👤 {row['username']}")
-                if c5.button("🗑️", key=f"del_{row['id']}"):
-                    # Borramos de la tabla buena
-                    run_query("DELETE FROM consumo_diario WHERE id=%s", (row['id'],))
-                    # OJO: Borrar de la tabla 'costos' es difícil porque no tenemos el ID aquí.
-                    # Por ahora aceptamos esa pequeña inconsistencia al borrar.
-                    st.warning("Eliminado."); time.sleep(0.5); st.rerun()
-                st.divider()
+            seleccion = editado.loc[editado['borrar'], 'id'].astype(int).tolist()
+            if c_del.button(f"🗑️ Eliminar seleccionados ({len(seleccion)})", type="primary", disabled=not seleccion):
+                # Una sola sentencia: costos (vista) y el resumen diario se actualizan solos
+                if run_query("DELETE FROM consumo_diario WHERE id = ANY(%s)", (seleccion,)) is None:
+                    st.error("No se pudieron eliminar los registros seleccionados.")
+                else:
+                    st.session_state.pop(clave_editor, None)
+                    st.warning(f"Eliminados {len(seleccion)} registros."); time.sleep(0.5); st.rerun()
         else:
-            st.info("No hay registros recientes.")
\ No newline at end of file
+            st.info("No hay registros recientes.")
@@ -0,0 +1,74 @@
+# modules/rendimiento.py
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+from database import estadisticas_pool, estadisticas_cache
+from metricas import get_registro
+
+def _percentiles(df, por, consultas=True):
+    """p50/p95/p99 de latencia (ms) agrupados por `por`"""
+    g = df.groupby(por)['ms']
+    tabla = pd.DataFrame({
+        'llamadas': g.size(),
+        'p50 (ms)': g.quantile(0.50),
+        'p95 (ms)': g.quantile(0.95),
+        'p99 (ms)': g.quantile(0.99),
+        'máx (ms)': g.max(),
+        'total (s)': g.sum() / 1000,
+    })
+    if consultas:
+        tabla['filas prom.'] = df.groupby(por)['filas'].mean()
+        tabla['KB prom.'] = df.groupby(por)['bytes'].mean() / 1024
+        tabla['% cache'] = df.groupby(por)['cache'].mean() * 100
+        tabla['errores'] = df.groupby(por)['error'].count()
+    return tabla.sort_values('p95 (ms)', ascending=False).reset_index()
+
+def show_rendimiento():
+    st.title("⏱️ Rendimiento del Sistema")
+    st.caption("Mediciones de este servidor desde su último reinicio (buffer circular en memoria).")
+
+    # --- ESTADO DEL POOL Y DEL CACHE ---
+    pool = estadisticas_pool()
+    cache = estadisticas_cache()
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric("Conexiones en uso", f"{pool['en_uso']} / {pool['maximo']}")
+    k2.metric("Esperas por conexión", pool['esperas'])
+    k3.metric("Conexiones abiertas", pool['conexiones'], help=f"Reemplazadas por rotas: {pool['reemplazos']}")
+    consultas_cache = cache['aciertos'] + cache['fallos']
+    k4.metric("Aciertos de cache", f"{cache['aciertos'] / consultas_cache:.0%}" if consultas_cache else "—")
+
+    eventos = pd.DataFrame(get_registro().eventos())
+    if eventos.empty:
+        st.info("Todavía no hay mediciones.")
+        return
+    eventos['momento'] = eventos['ts'].map(datetime.fromtimestamp)
+    eventos['pagina'] = eventos['pagina'].fillna('(segundo plano)')
+
+    st.divider()
+    tab_pag, tab_sql, tab_lentas = st.tabs(["🖥️ Por Pantalla", "🗄️ Por Consulta", "🐢 Más Lentas"])
+
+    with tab_pag:
+        paginas = eventos[eventos['tipo'] == 'pagina']
+        if paginas.empty:
+            st.caption("Sin pantallas medidas.")
+        else:
+            st.dataframe(_percentiles(paginas, 'nombre', consultas=False), width="stretch", hide_index=True)
+
+        consultas = eventos[eventos['tipo'] == 'consulta']
+        if not consultas.empty:
+            st.markdown("##### Consultas por pantalla")
+            st.dataframe(_percentiles(consultas, 'pagina'), width="stretch", hide_index=True)
+
+    with tab_sql:
+        consultas = eventos[eventos['tipo'] == 'consulta']
+        if consultas.empty:
+            st.caption("Sin consultas medidas.")
+        else:
+            st.dataframe(_percentiles(consultas, 'nombre'), width="stretch", hide_index=True,
+                         column_config={"nombre": st.column_config.TextColumn("Consulta", width="large")})
+
+    with tab_lentas:
+        n = st.slider("Mostrar", 10, 100, 25, step=5)
+        lentas = eventos.nlargest(n, 'ms')
+        columnas = [c for c in ['momento', 'tipo', 'pagina', 'nombre', 'ms', 'filas', 'error'] if c in lentas.columns]
+        st.dataframe(lentas[columnas], width="stretch", hide_index=True)
@@ -1,11 +1,21 @@
 # modules/reportes.py
 import pandas as pd
 import io
-from datetime import datetime
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from datetime import date, datetime
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
 from openpyxl.chart import BarChart, PieChart, LineChart, Reference
 
+COLOR_CABECERA = "1F4E78"
+COLOR_TEXTO_CABECERA = "FFFFFF"
+CURRENCY_FMT = '#,##0.00 "S/"'
+NUMBER_FMT = '#,##0.00'
+# Palabras de la cabecera que indican que la columna es dinero
+PALABRAS_MONEDA = ('s/', 'costo', 'gasto', 'precio')
+
 def preparar_resumen(df_agrupado):
     """
     Prepara el dataframe de resumen (agrupado por labor) para el reporte.
@@ -20,10 +30,8 @@ def preparar_resumen(df_agrupado):
     df_final = df_agrupado[cols_existentes].rename(columns=cols_map)
 
     if 'Avance (m)' in df_final.columns and 'Gasto Total (S/)' in df_final.columns:
-        df_final['Costo Unitario (S/m)'] = df_final.apply(
-            lambda x: x['Gasto Total (S/)'] / x['Avance (m)'] if x['Avance (m)'] > 0 else 0,
-            axis=1
-        )
+        avance = df_final['Avance (m)']
+        df_final['Costo Unitario (S/m)'] = (df_final['Gasto Total (S/)'] / avance).where(avance > 0, 0)
     return df_final
 
 def preparar_detalle(df_detalle):
@@ -46,120 +54,155 @@ def preparar_detalle(df_detalle):
     cols_existentes = [c for c in df_detalle.columns if c in cols_map.keys()]
     return df_detalle[cols_existentes].rename(columns=cols_map)
 
+def _registrar_estilos(workbook):
+    """Estilos con nombre del reporte: se definen una vez y cada celda solo los referencia"""
+    borde = Side(border_style="thin", color="000000")
+    caja = Border(left=borde, right=borde, top=borde, bottom=borde)
+    izquierda = Alignment(horizontal='left')
+    estilos = [
+        NamedStyle(name='core_titulo', font=Font(size=16, bold=True, color=COLOR_CABECERA)),
+        NamedStyle(name='core_subtitulo', font=Font(size=10, italic=True, color="555555")),
+        NamedStyle(
+            name='core_cabecera',
+            font=Font(name='Calibri', size=11, bold=True, color=COLOR_TEXTO_CABECERA),
+            fill=PatternFill(start_color=COLOR_CABECERA, end_color=COLOR_CABECERA, fill_type='solid'),
+            alignment=Alignment(horizontal='center', vertical='center'),
+            border=caja,
+        ),
+        NamedStyle(name='core_moneda', font=DEFAULT_FONT, border=caja, number_format=CURRENCY_FMT),
+        NamedStyle(name='core_numero', font=DEFAULT_FONT, border=caja, number_format=NUMBER_FMT),
+        NamedStyle(name='core_texto', font=DEFAULT_FONT, border=caja, alignment=izquierda),
+        NamedStyle(name='core_fecha', font=DEFAULT_FONT, border=caja, alignment=izquierda, number_format='YYYY-MM-DD'),
+        NamedStyle(name='core_fecha_hora', font=DEFAULT_FONT, border=caja, alignment=izquierda, number_format='YYYY-MM-DD HH:MM:SS'),
+    ]
+    for estilo in estilos:
+        workbook.add_named_style(estilo)
+
+def _estilo_columna(serie, cabecera):
+    """Decide una sola vez el estilo de toda la columna (según su tipo y su cabecera)"""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return 'core_fecha_hora'
+    if pd.api.types.is_numeric_dtype(serie):
+        es_numero = True
+    else:
+        muestra = serie.dropna()
+        muestra = muestra.iloc[0] if not muestra.empty else None
+        if isinstance(muestra, datetime):
+            return 'core_fecha_hora'
+        if isinstance(muestra, date):
+            return 'core_fecha'
+        es_numero = isinstance(muestra, (int, float))
+    if es_numero:
+        texto = str(cabecera).lower()
+        return 'core_moneda' if any(p in texto for p in PALABRAS_MONEDA) else 'core_numero'
+    return 'core_texto'
+
+def _columnas(df):
+    """Valores de cada columna como listas de Python (los NaN pasan a celdas vacías)"""
+    for _, serie in df.items():
+        if serie.hasnans:
+            serie = serie.astype(object).where(serie.notna(), None)
+        yield serie.tolist()
+
+def _celda(ws, valor, estilo):
+    celda = WriteOnlyCell(ws, value=valor)
+    celda.style = estilo
+    return celda
+
+def escribir_hoja(workbook, sheet_name, titulo, df, usuario, rol, emision):
+    """
+    Escribe una hoja en modo streaming: título, cabecera en la fila 5 y datos desde la fila 6,
+    con los estilos ya aplicados. Devuelve la hoja y su última fila.
+    """
+    ws = workbook.create_sheet(sheet_name)
+    n_cols = max(len(df.columns), 1)
+
+    # En modo write-only el ancho de columnas y los paneles se fijan antes de la primera fila
+    for idx, col in enumerate(df.columns, 1):
+        ws.column_dimensions[get_column_letter(idx)].width = len(str(col)) + 8
+    ws.freeze_panes = "A6"
+
+    ws.append([_celda(ws, f"REPORTES CORE - {titulo}", 'core_titulo')])
+    ws.append([_celda(ws, f"Generado por: {usuario} ({rol})", 'core_subtitulo')])
+    ws.append([_celda(ws, f"Fecha de Emisión: {emision}", 'core_subtitulo')])
+    ws.append([])
+    ws.append([_celda(ws, col, 'core_cabecera') for col in df.columns])
+
+    # Una celda con estilo por columna: openpyxl serializa cada fila al hacer append,
+    # así que se reutilizan cambiando solo el valor.
+    celdas = [_celda(ws, None, _estilo_columna(df[col], col)) for col in df.columns]
+    for fila in zip(*_columnas(df)):
+        for celda, valor in zip(celdas, fila):
+            celda.value = valor
+        ws.append(celdas)
+
+    max_row = 5 + len(df)
+    ws.auto_filter.ref = f"A5:{get_column_letter(n_cols)}{max_row}"
+    return ws, max_row
+
 def generar_excel_corporativo(df_detalle, df_resumen, usuario="Admin", rol="Lector"):
     """
     Función principal que genera el Excel binario en memoria.
+    Usa el modo write-only de openpyxl: las filas se escriben una sola vez ya formateadas.
     """
     output = io.BytesIO()
 
-    COLOR_CABECERA = "1F4E78"
-    COLOR_TEXTO_CABECERA = "FFFFFF"
-
     df_res_final = preparar_resumen(df_resumen)
     df_det_final = preparar_detalle(df_detalle)
 
-    pivot_chart = pd.pivot_table(
-        df_det_final,
-        values='Costo Total (S/)',
-        index='Rubro / Categoría',
-        aggfunc='sum'
-    ).reset_index().sort_values(by='Costo Total (S/)', ascending=False)
-
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df_res_final.to_excel(writer, index=False, sheet_name='Resumen Gerencial', startrow=4)
-        df_det_final.to_excel(writer, index=False, sheet_name='Base de Datos Detallada', startrow=4)
-        pivot_chart.to_excel(writer, index=False, sheet_name='Análisis Gráfico', startrow=4)
-
-        workbook = writer.book
-
-        header_font = Font(name='Calibri', size=11, bold=True, color=COLOR_TEXTO_CABECERA)
-        header_fill = PatternFill(start_color=COLOR_CABECERA, end_color=COLOR_CABECERA, fill_type='solid')
-        border_style = Side(border_style="thin", color="000000")
-        border_box = Border(left=border_style, right=border_style, top=border_style, bottom=border_style)
-        currency_fmt = '#,##0.00 "S/"'
-        number_fmt = '#,##0.00'
-
-        def formatear_hoja(sheet_name, titulo):
-            ws = workbook[sheet_name]
-            ws['A1'] = f"REPORTES CORE - {titulo}"
-            ws['A1'].font = Font(size=16, bold=True, color=COLOR_CABECERA)
-            ws['A2'] = f"Generado por: {usuario} ({rol})"
-            ws['A2'].font = Font(size=10, italic=True, color="555555")
-            ws['A3'] = f"Fecha de Emisión: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"
-            ws['A3'].font = Font(size=10, italic=True, color="555555")
-
-            max_row = ws.max_row
-            max_col = ws.max_column
-
-            for col in range(1, max_col + 1):
-                col_letter = get_column_letter(col)
-                cell_header = ws[f"{col_letter}5"]
-                cell_header.fill = header_fill
-                cell_header.font = header_font
-                cell_header.alignment = Alignment(horizontal='center', vertical='center')
-                cell_header.border = border_box
-                ws.column_dimensions[col_letter].width = len(str(cell_header.value)) + 8
-
-                for row in range(6, max_row + 1):
-                    cell = ws[f"{col_letter}{row}"]
-                    cell.border = border_box
-                    if isinstance(cell.value, (int, float)):
-                        header_text = str(cell_header.value).lower()
-                        if 's/' in header_text or 'costo' in header_text or 'gasto' in header_text or 'precio' in header_text:
-                            cell.number_format = currency_fmt
-                        else:
-                            cell.number_format = number_fmt
-                    else:
-                        cell.alignment = Alignment(horizontal='left')
-
-            ws.auto_filter.ref = f"A5:{get_column_letter(max_col)}{max_row}"
-            ws.freeze_panes = "A6"
-
-        formatear_hoja('Resumen Gerencial', "RESUMEN EJECUTIVO DE COSTOS")
-        formatear_hoja('Base de Datos Detallada', "REGISTRO DETALLADO DE CONSUMOS")
-        formatear_hoja('Análisis Gráfico', "ANÁLISIS POR CATEGORÍA")
-
-        ws_pivot = workbook['Análisis Gráfico']
-
-        # Gráfico de Barras
-        chart_bar = BarChart()
-        chart_bar.type = "bar"
-        chart_bar.style = 10
-        chart_bar.title = "Gasto Total por Categoría (Pareto)"
-        chart_bar.y_axis.title = "Soles (S/)"
-        chart_bar.x_axis.title = "Categoría"
-        data = Reference(ws_pivot, min_col=2, min_row=5, max_row=ws_pivot.max_row)
-        cats = Reference(ws_pivot, min_col=1, min_row=6, max_row=ws_pivot.max_row)
-        chart_bar.add_data(data, titles_from_data=True)
-        chart_bar.set_categories(cats)
-        ws_pivot.add_chart(chart_bar, "E5")
-
-        # Gráfico Circular
-        chart_pie = PieChart()
-        chart_pie.title = "Distribución de Costos por Categoría"
-        chart_pie.add_data(data, titles_from_data=True)
-        chart_pie.set_categories(cats)
-        ws_pivot.add_chart(chart_pie, "E20")
-
-        # Gráfico de Columnas
-        chart_col = BarChart()
-        chart_col.type = "col"
-        chart_col.style = 11
-        chart_col.title = "Comparación de Costos por Categoría"
-        chart_col.y_axis.title = "Soles (S/)"
-        chart_col.x_axis.title = "Categoría"
-        chart_col.add_data(data, titles_from_data=True)
-        chart_col.set_categories(cats)
-        ws_pivot.add_chart(chart_col, "M5")
-
-        # Gráfico de Líneas
-        chart_line = LineChart()
-        chart_line.title = "Tendencia de Costos"
-        chart_line.style = 13
-        chart_line.y_axis.title = "Soles (S/)"
-        chart_line.add_data(data, titles_from_data=True)
-        chart_line.set_categories(cats)
-        ws_pivot.add_chart(chart_line, "M20")
-
-    output.seek(0)
-    return output.getvalue()
\ No newline at end of file
+    pivot_chart = (
+        df_det_final.groupby('Rubro / Categoría', as_index=False, observed=True)['Costo Total (S/)'].sum()
+        .sort_values(by='Costo Total (S/)', ascending=False)
+    )
+
+    workbook = Workbook(write_only=True)
+    _registrar_estilos(workbook)
+    emision = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+
+    escribir_hoja(workbook, 'Resumen Gerencial', "RESUMEN EJECUTIVO DE COSTOS", df_res_final, usuario, rol, emision)
+    escribir_hoja(workbook, 'Base de Datos Detallada', "REGISTRO DETALLADO DE CONSUMOS", df_det_final, usuario, rol, emision)
+    ws_pivot, max_row_pivot = escribir_hoja(workbook, 'Análisis Gráfico', "ANÁLISIS POR CATEGORÍA", pivot_chart, usuario, rol, emision)
+
+    data = Reference(ws_pivot, min_col=2, min_row=5, max_row=max_row_pivot)
+    cats = Reference(ws_pivot, min_col=1, min_row=6, max_row=max_row_pivot)
+
+    # Gráfico de Barras
+    chart_bar = BarChart()
+    chart_bar.type = "bar"
+    chart_bar.style = 10
+    chart_bar.title = "Gasto Total por Categoría (Pareto)"
+    chart_bar.y_axis.title = "Soles (S/)"
+    chart_bar.x_axis.title = "Categoría"
+    chart_bar.add_data(data, titles_from_data=True)
+    chart_bar.set_categories(cats)
+    ws_pivot.add_chart(chart_bar, "E5")
+
+    # Gráfico Circular
+    chart_pie = PieChart()
+    chart_pie.title = "Distribución de Costos por Categoría"
+    chart_pie.add_data(data, titles_from_data=True)
+    chart_pie.set_categories(cats)
+    ws_pivot.add_chart(chart_pie, "E20")
+
+    # Gráfico de Columnas
+    chart_col = BarChart()
+    chart_col.type = "col"
+    chart_col.style = 11
+    chart_col.title = "Comparación de Costos por Categoría"
+    chart_col.y_axis.title = "Soles (S/)"
+    chart_col.x_axis.title = "Categoría"
+    chart_col.add_data(data, titles_from_data=True)
+    chart_col.set_categories(cats)
+    ws_pivot.add_chart(chart_col, "M5")
+
+    # Gráfico de Líneas
+    chart_line = LineChart()
+    chart_line.title = "Tendencia de Costos"
+    chart_line.style = 13
+    chart_line.y_axis.title = "Soles (S/)"
+    chart_line.add_data(data, titles_from_data=True)
+    chart_line.set_categories(cats)
+    ws_pivot.add_chart(chart_line, "M20")
+
+    workbook.save(output)
+    return output.getvalue()
@@ -0,0 +1,189 @@
+# revaluacion.py
+"""
+Revaluación de costos cuando se corrige el precio de un insumo.
+
+Cada consumo guarda el precio con que se registró (consumo_diario.precio_unitario).
+Si Finanzas corrige un precio con fecha de vigencia (tabla insumos_precios), este
+comando recalcula el precio de los consumos del rango con el precio vigente en su
+fecha: una sola sentencia UPDATE por lote de ids, cada lote en su propia
+transacción (bloqueos cortos). La vista costos y el resumen costos_diarios
+(triggers) quedan al día solos. Solo toca filas cuyo precio cambia, así que se
+puede volver a correr si se interrumpe. Los consumos anteriores al primer precio
+fechado de su insumo no se tocan.
+
+Uso:
+    python revaluacion.py precio --insumo 12 --desde 2026-01-01 --precio 14.50
+    python revaluacion.py revaluar --desde 2026-01-01 [--hasta ...] [--insumos 12,15] [--simular]
+"""
+import argparse
+import sys
+import time
+from datetime import date
+
+import psycopg2
+
+from database import get_db_connection, get_cache, run_batch, run_query, tablas_escritas
+
+# Precio vigente en la fecha del consumo (usa la PK insumo_id, vigente_desde).
+# La fila '-infinity' (semilla de la migración 0007 y de cada insumo nuevo) no es un
+# precio con fecha: los consumos anteriores al primer precio fechado conservan el
+# precio con que se registraron (p. ej. el recuperado de costos_legado).
+SQL_PRECIO_VIGENTE = """
+    JOIN LATERAL (
+        SELECT p.precio FROM insumos_precios p
+        WHERE p.insumo_id = c.insumo_id AND p.vigente_desde <= c.fecha
+          AND p.vigente_desde > '-infinity'
+        ORDER BY p.vigente_desde DESC LIMIT 1
+    ) n ON true
+"""
+
+SQL_SIMULAR = f"""
+    SELECT c.insumo_id, i.nombre, COUNT(*) AS filas,
+           SUM(c.cantidad * c.precio_unitario)::float8 AS total_actual,
+           SUM(c.cantidad * n.precio)::float8 AS total_nuevo
+    FROM consumo_diario c
+    {SQL_PRECIO_VIGENTE}
+    JOIN insumos i ON i.id = c.insumo_id
+    WHERE {{filtro}} AND n.precio IS DISTINCT FROM c.precio_unitario
+    GROUP BY c.insumo_id, i.nombre
+    ORDER BY abs(SUM(c.cantidad * n.precio) - SUM(c.cantidad * c.precio_unitario)) DESC
+"""
+
+SQL_REVALUAR_LOTE = f"""
+    UPDATE consumo_diario AS d SET precio_unitario = v.precio
+    FROM (
+        SELECT c.id, n.precio
+        FROM consumo_diario c
+        {SQL_PRECIO_VIGENTE}
+        WHERE c.id BETWEEN %s AND %s AND {{filtro}} AND n.precio IS DISTINCT FROM c.precio_unitario
+    ) v
+    WHERE d.id = v.id
+"""
+
+SQL_RANGO_IDS = "SELECT MIN(id) AS desde, MAX(id) AS hasta FROM consumo_diario c WHERE {filtro}"
+
+SQL_REGISTRAR_PRECIO = """
+    INSERT INTO insumos_precios (insumo_id, vigente_desde, precio) VALUES (%s, %s, %s)
+    ON CONFLICT (insumo_id, vigente_desde) DO UPDATE SET precio = EXCLUDED.precio, registrado_en = now()
+"""
+
+# Si el precio corregido es el vigente hoy, también pasa a ser insumos.precio
+SQL_PRECIO_ACTUAL = """
+    UPDATE insumos i SET precio = p.precio
+    FROM (SELECT precio FROM insumos_precios WHERE insumo_id = %s AND vigente_desde <= CURRENT_DATE
+          ORDER BY vigente_desde DESC LIMIT 1) p
+    WHERE i.id = %s AND i.precio IS DISTINCT FROM p.precio
+"""
+
+
+def _filtro(desde, hasta, insumos):
+    condiciones = ["c.insumo_id IS NOT NULL", "c.fecha BETWEEN %s AND %s"]
+    params = [desde or date.min, hasta or date.max]
+    if insumos:
+        condiciones.append("c.insumo_id = ANY(%s)")
+        params.append(list(insumos))
+    return " AND ".join(condiciones), params
+
+
+def registrar_precio(insumo_id, vigente_desde, precio):
+    """
+    Anota un precio con fecha de vigencia y, si es el de hoy, actualiza insumos.precio,
+    todo en una transacción. Devuelve True o None si falló.
+    """
+    return run_batch([
+        (SQL_REGISTRAR_PRECIO, (insumo_id, vigente_desde, precio)),
+        (SQL_PRECIO_ACTUAL, (insumo_id, insumo_id)),
+    ])
+
+
+def simular(desde=None, hasta=None, insumos=None):
+    """Qué cambiaría, por insumo, sin escribir nada. Lista de dicts o None si falló."""
+    filtro, params = _filtro(desde, hasta, insumos)
+    return run_query(SQL_SIMULAR.format(filtro=filtro), params, cache=False)
+
+
+def revaluar(desde=None, hasta=None, insumos=None, lote=50_000, lock_timeout=5, avance=print):
+    """
+    Aplica los precios vigentes por lotes de `lote` ids. Devuelve las filas
+    actualizadas o None si un lote falló (los anteriores quedan guardados).
+    """
+    filtro, params = _filtro(desde, hasta, insumos)
+    rango = run_query(SQL_RANGO_IDS.format(filtro=filtro), params, cache=False)
+    if not rango or rango[0]['desde'] is None:
+        return 0 if rango is not None else None
+    id_min, id_max = rango[0]['desde'], rango[0]['hasta']
+
+    sql = SQL_REVALUAR_LOTE.format(filtro=filtro)
+    total = 0
+    with get_db_connection() as conn:
+        conn.autocommit = False
+        for inicio in range(id_min, id_max + 1, lote):
+            fin = min(inicio + lote - 1, id_max)
+            t0 = time.perf_counter()
+            try:
+                with conn:  # un lote = una transacción
+                    with conn.cursor() as cur:
+                        # Ante un bloqueo largo, mejor fallar y reintentar que hacer esperar a la app
+                        cur.execute("SET LOCAL lock_timeout = %s", (f"{int(lock_timeout * 1000)}ms",))
+                        cur.execute(sql, [inicio, fin] + params)
+                        cambiadas = cur.rowcount
+            except psycopg2.Error as e:
+                avance(f"❌ Lote {inicio}-{fin}: {e}")
+                get_cache().invalidar(tablas_escritas(sql))
+                return None
+            total += cambiadas
+            avance(f"   ids {inicio:,}-{fin:,}: {cambiadas:,} filas ({time.perf_counter() - t0:.2f} s)")
+    get_cache().invalidar(tablas_escritas(sql))
+    return total
+
+
+def _lista_ids(texto):
+    return [int(x) for x in texto.split(",") if x.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Revaluación de costos por cambios de precio de insumos")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_pre = sub.add_parser("precio", help="Registra un precio con fecha de vigencia")
+    p_pre.add_argument("--insumo", type=int, required=True)
+    p_pre.add_argument("--desde", type=date.fromisoformat, required=True, help="Vigente desde (AAAA-MM-DD)")
+    p_pre.add_argument("--precio", type=float, required=True)
+
+    p_rev = sub.add_parser("revaluar", help="Recalcula los consumos con el precio vigente en su fecha")
+    p_rev.add_argument("--desde", type=date.fromisoformat)
+    p_rev.add_argument("--hasta", type=date.fromisoformat)
+    p_rev.add_argument("--insumos", type=_lista_ids, help="ids separados por coma (por defecto, todos)")
+    p_rev.add_argument("--lote", type=int, default=50_000, help="ids por transacción")
+    p_rev.add_argument("--simular", action="store_true", help="Solo muestra la diferencia, no escribe")
+    args = parser.parse_args(argv)
+
+    if args.comando == "precio":
+        ok = registrar_precio(args.insumo, args.desde, args.precio)
+        print("✅ Precio registrado. Ejecute 'revaluar' para aplicarlo a los consumos." if ok else "❌ Falló (ver error arriba)")
+        return 0 if ok else 1
+
+    cambios = simular(args.desde, args.hasta, args.insumos)
+    if cambios is None:
+        print("❌ Falló (ver error arriba)")
+        return 1
+    filas = sum(c['filas'] for c in cambios)
+    actual = sum(c['total_actual'] for c in cambios)
+    nuevo = sum(c['total_nuevo'] for c in cambios)
+    print(f"🧮 {filas:,} consumos cambian de precio en {len(cambios)} insumos")
+    for c in cambios[:15]:
+        print(f"   {c['nombre'][:30]:30} {c['filas']:>9,} filas   S/ {c['total_actual']:>14,.2f} → {c['total_nuevo']:>14,.2f}")
+    print(f"   {'TOTAL':30} {filas:>9,} filas   S/ {actual:>14,.2f} → {nuevo:>14,.2f}   (Δ {nuevo - actual:+,.2f})")
+    if args.simular or not filas:
+        return 0
+
+    total = revaluar(args.desde, args.hasta, args.insumos, lote=args.lote)
+    if total is None:
+        print("❌ Se detuvo en un lote (los anteriores quedaron guardados; puede volver a ejecutarse)")
+        return 1
+    print(f"✅ {total:,} consumos revaluados")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
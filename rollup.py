@@ -0,0 +1,67 @@
+# rollup.py
+"""
+Resumen diario de costos: una fila por fecha × labor × guardia × categoría con
+los totales de precio_total, avance, mineral_tm, cantidad y el número de registros.
+
+`costos` es una vista sobre consumo_diario (+ frentes, insumos, usuarios) y el
+resumen lo mantienen al día triggers por sentencia sobre `consumo_diario` (un
+solo UPSERT agrupado por cada INSERT/UPDATE/DELETE, aunque toque muchas filas).
+Renombrar una labor o cambiar la categoría de un insumo también mueve su historia.
+
+La tabla, la vista y los triggers los instala solo `python migraciones.py aplicar`
+(0002 y 0004); un cambio en ellos va en una migración nueva, no acá.
+
+Uso:
+    python rollup.py reconstruir [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]
+"""
+import argparse
+import sys
+from datetime import date
+
+from database import run_batch
+
+TABLA_ROLLUP = "costos_diarios"
+
+SQL_BORRAR_RANGO = "DELETE FROM costos_diarios WHERE fecha BETWEEN %s AND %s"
+
+SQL_RECALCULAR_RANGO = """
+    INSERT INTO costos_diarios
+        (fecha, labor, guardia, categoria, precio_total, avance, mineral_tm, cantidad, registros)
+    SELECT fecha, labor, guardia, categoria,
+           SUM(COALESCE(precio_total, 0)), SUM(COALESCE(avance, 0)),
+           SUM(COALESCE(mineral_tm, 0)), SUM(COALESCE(cantidad, 0)), COUNT(*)
+    FROM costos
+    WHERE fecha BETWEEN %s AND %s
+    GROUP BY 1, 2, 3, 4
+"""
+
+
+def reconstruir(desde=None, hasta=None):
+    """
+    Recalcula el resumen desde `costos` para el rango indicado (por defecto, todo).
+    Bloquea escrituras sobre consumo_diario mientras dura para no contar dos veces
+    lo que se inserte en paralelo.
+    """
+    rango = (desde or date.min, hasta or date.max)
+    return run_batch([
+        ("LOCK TABLE consumo_diario IN SHARE MODE", None),
+        (SQL_BORRAR_RANGO, rango),
+        (SQL_RECALCULAR_RANGO, rango),
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumen diario de costos (costos_diarios)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_rec = sub.add_parser("reconstruir", help="Rellena el resumen a partir de costos")
+    p_rec.add_argument("--desde", type=date.fromisoformat)
+    p_rec.add_argument("--hasta", type=date.fromisoformat)
+    args = parser.parse_args(argv)
+
+    ok = reconstruir(args.desde, args.hasta)
+    print("✅ Listo" if ok else "❌ Falló (ver error arriba)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())